@@ -7,10 +7,61 @@ A utility to convert static HTML files or HTML strings to PDF documents
 import os
 import sys
 import argparse
+import asyncio
+import base64
+import collections
+import contextlib
+import copy
+import fnmatch
+import gzip
+import hashlib
+import heapq
+import http.client
+import io
+import itertools
+import json
 import logging
-from typing import Optional, Dict, Any
+import mimetypes
+import multiprocessing
+import multiprocessing.connection
+import pickle
+import posixpath
+import re
+import shutil
+import signal
+import string
+import tarfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import zipfile
+import zlib
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from html import escape, unescape
+from typing import (Optional, Dict, Any, BinaryIO, Callable, Deque, IO, Iterable, Iterator, List, NamedTuple,
+                    Set, Tuple, Union)
 from pathlib import Path
 
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; worker memory limits are then skipped
+    resource = None
+
+try:
+    import jinja2
+except ImportError:
+    # Optional; templates then use string.Template ($name placeholders)
+    jinja2 = None
+
+try:
+    import pypdfium2
+except ImportError:
+    # Optional; only needed to rasterise page thumbnails
+    pypdfium2 = None
+
 # Set up logging
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,6 +70,14 @@ logger = logging.getLogger(__name__)
 # PDF generation imports
 try:
     from weasyprint import HTML, CSS
+    from weasyprint.text.fonts import FontConfiguration
+    from weasyprint import __version__ as PDF_BACKEND_VERSION
+    try:
+        from weasyprint.urls import URLFetcher, URLFetcherResponse
+    except ImportError:
+        # WeasyPrint releases before the URLFetcher class only accept
+        # fetcher functions; CachingURLFetcher is unavailable there
+        URLFetcher = URLFetcherResponse = None
     PDF_GENERATION_AVAILABLE = True
     PDF_METHOD = "weasyprint"
     logger.info("Using WeasyPrint for PDF generation")
@@ -30,227 +89,3888 @@ except ImportError:
         from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
         from reportlab.lib import colors
         from reportlab.pdfgen import canvas
+        from reportlab import Version as PDF_BACKEND_VERSION
+        URLFetcher = URLFetcherResponse = FontConfiguration = None
         PDF_GENERATION_AVAILABLE = True
         PDF_METHOD = "reportlab"
         logger.info("Using ReportLab for PDF generation")
     except ImportError:
         PDF_GENERATION_AVAILABLE = False
         PDF_METHOD = None
+        PDF_BACKEND_VERSION = None
+        URLFetcher = URLFetcherResponse = FontConfiguration = None
         logger.error(
             "No PDF generation library available. Install weasyprint or reportlab.")
 
 
-class HTMLToPDFConverter:
-    """Convert HTML files or strings to PDF documents"""
+class BatchResult(NamedTuple):
+    """Outcome of converting one batch document"""
+    input: str
+    output: str
+    # 'converted', 'cached' (served by the render cache), 'skipped'
+    # (up to date in incremental mode) or 'error'
+    status: str
+    duration: float
+    bytes: int
+    pages: Optional[int]
+    error: Optional[str]
+    # Remote URLs rejected by a RestrictedURLFetcher
+    blocked: int = 0
+    # StylesheetCache hits and misses, and parse time the hits saved
+    css_hits: int = 0
+    css_misses: int = 0
+    css_saved: float = 0.0
+    # Resources loaded by the document, see ResourceRecorder
+    resources: Optional[List[Dict[str, Any]]] = None
+
+
+class BatchSummary:
+    """Running totals over BatchResult records, in constant memory"""
+
+    def __init__(self):
+        self.total = 0
+        self.status_counts: Dict[str, int] = collections.Counter()
+        self.duration = 0.0
+        self.bytes = 0
+        self.pages = 0
+        self.blocked = 0
+        self.css_hits = 0
+        self.css_misses = 0
+        self.css_saved = 0.0
+
+    def add(self, result: BatchResult):
+        """Fold one record into the totals"""
+        self.total += 1
+        self.status_counts[result.status] += 1
+        self.duration += result.duration
+        self.bytes += result.bytes
+        self.pages += result.pages or 0
+        self.blocked += result.blocked
+        self.css_hits += result.css_hits
+        self.css_misses += result.css_misses
+        self.css_saved += result.css_saved
+
+    @property
+    def succeeded(self) -> int:
+        return self.total - self.status_counts['error']
+
+    def describe(self) -> str:
+        """One-line human readable summary"""
+        statuses = ", ".join(f"{count} {status}"
+                             for status, count in sorted(self.status_counts.items()))
+        extras = ""
+        if self.blocked:
+            extras += f", {self.blocked} blocked URL(s)"
+        css_lookups = self.css_hits + self.css_misses
+        if css_lookups:
+            extras += (f", stylesheet cache {self.css_hits}/{css_lookups} hits "
+                       f"({self.css_saved:.2f}s saved)")
+        return (f"{statuses or 'nothing converted'}; {self.pages} page(s), "
+                f"{self.bytes / 1024:.0f} KB, {self.duration:.1f}s render time{extras}")
+
+
+class RenderedArtifacts(NamedTuple):
+    """Outputs derived from one laid-out document, see HTMLToPDFConverter.render_artifacts"""
+    # The whole document, if requested
+    pdf: Optional[bytes]
+    # The requested page range, if any
+    page_range_pdf: Optional[bytes]
+    # One entry per page of the document, see page_metadata()
+    pages: List[Dict[str, Any]]
+    # PNG thumbnails of the page range (or every page), if requested
+    thumbnails: List[bytes]
+
+
+class OptimizationProfile(NamedTuple):
+    """Trade-off between render time and PDF size, see OPTIMIZATION_PROFILES"""
+    description: str
+    # Compress content streams (WeasyPrint and ReportLab page compression)
+    compress: bool
+    # Embed only the glyphs used instead of whole font files (WeasyPrint)
+    subset_fonts: bool
+    # Losslessly recompress embedded images (WeasyPrint)
+    optimize_images: bool
+    # Defaults for the converter's max_dpi and jpeg_quality
+    max_dpi: Optional[int] = None
+    jpeg_quality: Optional[int] = None
+
+
+OPTIMIZATION_PROFILES = {
+    'fast': OptimizationProfile(
+        "no stream compression or font subsetting: least CPU, largest files",
+        compress=False, subset_fonts=False, optimize_images=False),
+    'balanced': OptimizationProfile(
+        "backend defaults: compressed streams and subset fonts",
+        compress=True, subset_fonts=True, optimize_images=False),
+    'smallest': OptimizationProfile(
+        "also optimises images, downsampled to 150 DPI at JPEG quality 80",
+        compress=True, subset_fonts=True, optimize_images=True, max_dpi=150, jpeg_quality=80),
+}
+DEFAULT_PROFILE = 'balanced'
+
+# Tasks per worker the largest-first scheduler looks ahead by default when
+# input is streamed; see order_by_cost()
+COST_WINDOW_PER_WORKER = 8
+
+
+class HTMLToPDFConverter:
+    """Convert HTML files or strings to PDF documents"""
+
+    # Settings a single job may override, e.g. from a JSONL manifest
+    JOB_OPTIONS = ('stylesheets', 'max_dpi', 'jpeg_quality', 'profile')
+
+    def __init__(self, output_directory: str = "./pdf_outputs",
+                 max_concurrency: Optional[int] = None,
+                 stylesheets: Optional[List[str]] = None,
+                 render_cache: Optional["RenderCache"] = None,
+                 url_fetcher: Optional[Any] = None,
+                 inline_images: Optional["InlineImageCache"] = None,
+                 max_dpi: Optional[int] = None,
+                 jpeg_quality: Optional[int] = None,
+                 stylesheet_cache: Optional["StylesheetCache"] = None,
+                 record_resources: bool = False,
+                 profile: str = DEFAULT_PROFILE):
+        """
+        Args:
+            output_directory: Default directory for generated PDFs
+            max_concurrency: Renders the async API runs at once.
+                Defaults to the CPU count.
+            stylesheets: Extra CSS files applied to every document (WeasyPrint)
+            render_cache: Optional cache of previously rendered PDFs
+            url_fetcher: WeasyPrint URL fetcher for linked resources,
+                e.g. a CachingURLFetcher or RestrictedURLFetcher. Defaults to
+                WeasyPrint's own.
+            inline_images: Optional cache sharing decoded data: URI images
+                between documents (WeasyPrint)
+            max_dpi: Downsample raster images above this resolution at
+                their printed size (WeasyPrint)
+            jpeg_quality: Re-encode JPEG images at this quality, 1-95 (WeasyPrint)
+            stylesheet_cache: Optional cache of parsed <style> blocks shared
+                between documents (WeasyPrint), see StylesheetCache
+            record_resources: Record every resource each document loads,
+                see ResourceRecorder (WeasyPrint)
+            profile: Name of an OPTIMIZATION_PROFILES entry trading render
+                time against PDF size. Explicit max_dpi and jpeg_quality
+                take precedence over the profile's.
+        """
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+        self.output_directory = output_directory
+        self.max_concurrency = max_concurrency
+        self.stylesheets = list(stylesheets or [])
+        self.render_cache = render_cache
+        self.url_fetcher = url_fetcher
+        self.inline_images = inline_images
+        self.max_dpi = max_dpi
+        self.jpeg_quality = jpeg_quality
+        self.stylesheet_cache = stylesheet_cache
+        self.record_resources = record_resources
+        self.profile = profile
+        self.image_options()
+        self._async_pool = None
+        self._async_semaphore = None
+        # Details of the latest conversion ('pages', 'cached') for batch records
+        self._last_render: Dict[str, Any] = {}
+        self.ensure_output_directory()
+
+    def __getstate__(self):
+        # The async pool owns processes; worker processes build their own
+        # on first use.
+        state = self.__dict__.copy()
+        state['_async_pool'] = None
+        state['_async_semaphore'] = None
+        return state
+
+    def close(self):
+        """Shut down the worker pool used by the async API, if started"""
+        if self._async_pool is not None:
+            self._async_pool.close()
+            self._async_pool = None
+
+    def with_options(self, **options) -> "HTMLToPDFConverter":
+        """
+        Return a copy of this converter with some JOB_OPTIONS overridden
+
+        The copy shares font state and caches with this converter.
+        """
+        unknown = sorted(set(options) - set(self.JOB_OPTIONS))
+        if unknown:
+            raise ValueError(f"Unknown job option(s): {', '.join(unknown)}")
+        if not options:
+            return self
+        if 'stylesheets' in options:
+            # A single path is a common shorthand in manifests
+            stylesheets = options['stylesheets'] or []
+            options['stylesheets'] = ([stylesheets] if isinstance(stylesheets, str)
+                                      else list(stylesheets))
+        converter = copy.copy(self)
+        for name, value in options.items():
+            setattr(converter, name, value)
+        converter.image_options()
+        return converter
+
+    def conversion_options(self) -> Dict[str, Any]:
+        """Return the settings that influence the generated PDF bytes"""
+        return {
+            'pdf_method': PDF_METHOD,
+            'backend_version': PDF_BACKEND_VERSION,
+            'stylesheets': [file_sha256(path) for path in self.stylesheets],
+            'max_dpi': self.max_dpi,
+            'jpeg_quality': self.jpeg_quality,
+            'profile': self.profile,
+            # Resource policies replace images with placeholders or local
+            # files, swap fonts and change the cascade
+            'url_policy': self._url_policy_options(),
+            'hoist_styles': self.stylesheet_cache is not None,
+        }
+
+    def _url_policy_options(self) -> Dict[str, Any]:
+        """Return the URL fetcher settings that change which resources a document gets"""
+        return url_policy_options(self.url_fetcher)
+
+    def options_fingerprint(self) -> str:
+        """Return a stable hash of conversion_options()"""
+        options = json.dumps(self.conversion_options(), sort_keys=True, default=str)
+        return hashlib.sha256(options.encode('utf-8')).hexdigest()
+
+    def optimization_profile(self) -> OptimizationProfile:
+        """Return the OptimizationProfile selected by ``profile``"""
+        try:
+            return OPTIMIZATION_PROFILES[self.profile]
+        except KeyError:
+            raise ValueError(f"Unknown optimization profile {self.profile!r}, expected one of "
+                             f"{', '.join(OPTIMIZATION_PROFILES)}") from None
+
+    def image_options(self) -> Dict[str, Any]:
+        """Return the WeasyPrint render options for image downsampling and recompression"""
+        profile = self.optimization_profile()
+        max_dpi = self.max_dpi if self.max_dpi is not None else profile.max_dpi
+        jpeg_quality = self.jpeg_quality if self.jpeg_quality is not None else profile.jpeg_quality
+        options = {}
+        if max_dpi is not None:
+            if max_dpi <= 0:
+                raise ValueError(f"max_dpi must be positive, got {max_dpi}")
+            options['dpi'] = max_dpi
+        if jpeg_quality is not None:
+            if not 1 <= jpeg_quality <= 95:
+                raise ValueError(f"jpeg_quality must be between 1 and 95, got {jpeg_quality}")
+            options['jpeg_quality'] = jpeg_quality
+        if options or profile.optimize_images:
+            options['optimize_images'] = True
+        return options
+
+    def pdf_options(self) -> Dict[str, Any]:
+        """Return the WeasyPrint write_pdf options of the optimization profile"""
+        # Only non-default values, so older WeasyPrint versions keep working
+        # with the default profile
+        profile = self.optimization_profile()
+        options = {}
+        if not profile.compress:
+            options['uncompressed_pdf'] = True
+        if not profile.subset_fonts:
+            options['full_fonts'] = True
+        return options
+
+    def get_font_config(self) -> Any:
+        """Return the font configuration shared by every WeasyPrint conversion in the process"""
+        if PDF_METHOD == "weasyprint":
+            return shared_font_config()
+        return None
+
+    def get_stylesheets(self, font_config: Optional[Any] = None,
+                        url_fetcher: Optional[Any] = None) -> List[Any]:
+        """Return the extra stylesheets as WeasyPrint CSS objects, fetched through ``url_fetcher``"""
+        if font_config is None:
+            font_config = self.get_font_config()
+        return [CSS(filename=path, font_config=font_config,
+                    url_fetcher=url_fetcher or self.url_fetcher)
+                for path in self.stylesheets]
+
+    def warm_up(self):
+        """Pay first-use costs (font setup, layout caches) before real work"""
+        if PDF_METHOD == "weasyprint":
+            font_mirror = find_url_fetcher(self.url_fetcher, LocalFontMirror)
+            font_config = self.get_font_config()
+            if font_mirror is not None:
+                font_mirror.register(font_config)
+            HTML(string="<p>warm-up</p>").write_pdf(font_config=font_config)
+        elif PDF_METHOD == "reportlab":
+            from bs4 import BeautifulSoup  # noqa: F401
+        logger.info(f"Converter warmed up (pid {os.getpid()})")
+
+    def ensure_output_directory(self):
+        """Create output directory if it doesn't exist"""
+        os.makedirs(self.output_directory, exist_ok=True)
+        logger.info(f"Output directory: {self.output_directory}")
+
+    def convert_html_file_to_pdf(self, html_file_path: str, output_pdf_path: Optional[str] = None) -> str:
+        """
+        Convert an HTML file to PDF
+
+        Args:
+            html_file_path: Path to the HTML file
+            output_pdf_path: Optional output PDF path. If None, auto-generated.
+
+        Returns:
+            Path to the generated PDF file
+        """
+        if not PDF_GENERATION_AVAILABLE:
+            raise RuntimeError(
+                "PDF generation not available. Install weasyprint or reportlab.")
+
+        # Check if HTML file exists
+        if not os.path.exists(html_file_path):
+            raise FileNotFoundError(f"HTML file not found: {html_file_path}")
+
+        # Generate output path if not provided
+        if output_pdf_path is None:
+            output_pdf_path = os.path.join(
+                self.output_directory, pdf_filename_for(html_file_path))
+
+        if html_file_path.lower().endswith('.gz'):
+            # Decompress in memory; relative resources still resolve
+            # against the file's location
+            with gzip.open(html_file_path, 'rt', encoding='utf-8') as f:
+                html_content = f.read()
+            return self.convert_html_string_to_pdf(
+                html_content, output_pdf_path,
+                base_url=os.path.abspath(html_file_path))
+
+        logger.info(f"Converting HTML file: {html_file_path}")
+        logger.info(f"Output PDF: {output_pdf_path}")
+
+        try:
+            self._last_render = {}
+            cache_key = None
+            if self.render_cache is not None:
+                with open(html_file_path, 'rb') as f:
+                    cache_key = self._render_cache_key(
+                        f.read(), os.path.abspath(html_file_path))
+                if self._fetch_cached_pdf(cache_key, output_pdf_path):
+                    return output_pdf_path
+
+            if PDF_METHOD == "weasyprint":
+                convert = self._convert_with_weasyprint_file
+            elif PDF_METHOD == "reportlab":
+                convert = self._convert_with_reportlab_file
+            else:
+                raise RuntimeError(f"Unknown PDF method: {PDF_METHOD}")
+
+            return self._render_into_place(
+                lambda path: convert(html_file_path, path), output_pdf_path, cache_key)
+        except Exception as e:
+            logger.error(f"PDF conversion failed: {e}")
+            raise
+
+    def convert_html_string_to_pdf(self, html_content: str, output_pdf_path: str,
+                                   base_url: Optional[str] = None) -> str:
+        """
+        Convert HTML string content to PDF
+
+        Args:
+            html_content: HTML content as string
+            output_pdf_path: Output PDF file path
+            base_url: Optional URL or path relative links are resolved against
+
+        Returns:
+            Path to the generated PDF file
+        """
+        if not PDF_GENERATION_AVAILABLE:
+            raise RuntimeError(
+                "PDF generation not available. Install weasyprint or reportlab.")
+
+        logger.info(
+            f"Converting HTML content ({len(html_content)} characters)")
+        logger.info(f"Output PDF: {output_pdf_path}")
+
+        try:
+            self._last_render = {}
+            cache_key = None
+            if self.render_cache is not None:
+                cache_key = self._render_cache_key(html_content.encode('utf-8'), base_url)
+                if self._fetch_cached_pdf(cache_key, output_pdf_path):
+                    return output_pdf_path
+
+            if PDF_METHOD == "weasyprint":
+                def convert(path: str) -> str:
+                    return self._convert_with_weasyprint_string(html_content, path, base_url)
+            elif PDF_METHOD == "reportlab":
+                def convert(path: str) -> str:
+                    return self._convert_with_reportlab_string(html_content, path)
+            else:
+                raise RuntimeError(f"Unknown PDF method: {PDF_METHOD}")
+
+            return self._render_into_place(convert, output_pdf_path, cache_key)
+        except Exception as e:
+            logger.error(f"PDF conversion failed: {e}")
+            raise
+
+    def convert_html_to_stream(self, html_content: str, target: BinaryIO,
+                               base_url: Optional[str] = None) -> BinaryIO:
+        """
+        Convert HTML string content to PDF written straight to a stream
+
+        No temporary file is involved, so ``target`` may be a ``BytesIO``,
+        an open file or a socket's ``makefile('wb')``. With a render cache
+        the PDF is buffered in memory to be stored before it is written.
+
+        Args:
+            html_content: HTML content as string
+            target: Writable binary file object receiving the PDF
+            base_url: Optional URL or path relative links are resolved against
+
+        Returns:
+            The ``target`` stream
+        """
+        if not PDF_GENERATION_AVAILABLE:
+            raise RuntimeError(
+                "PDF generation not available. Install weasyprint or reportlab.")
+
+        logger.info(
+            f"Converting HTML content ({len(html_content)} characters) to stream")
+
+        try:
+            self._last_render = {}
+            cache_key = None
+            if self.render_cache is not None:
+                cache_key = self._render_cache_key(html_content.encode('utf-8'), base_url)
+                if self.render_cache.fetch(cache_key, target):
+                    logger.info("✅ PDF served from render cache")
+                    self._last_render['cached'] = True
+                    return target
+
+            sink = io.BytesIO() if cache_key is not None else target
+            if PDF_METHOD == "weasyprint":
+                self._write_weasyprint_pdf(sink, string=html_content, base_url=base_url)
+            elif PDF_METHOD == "reportlab":
+                self._write_reportlab_pdf(html_content, sink)
+            else:
+                raise RuntimeError(f"Unknown PDF method: {PDF_METHOD}")
+
+            if cache_key is not None:
+                if self._cacheable_render():
+                    self.render_cache.store(cache_key, sink.getvalue())
+                target.write(sink.getvalue())
+            logger.info(f"✅ PDF generated successfully using {PDF_METHOD}")
+            return target
+        except Exception as e:
+            logger.error(f"PDF conversion failed: {e}")
+            raise
+
+    def convert_html_string_to_bytes(self, html_content: str,
+                                     base_url: Optional[str] = None) -> bytes:
+        """
+        Convert HTML string content to PDF bytes in memory
+
+        Args:
+            html_content: HTML content as string
+            base_url: Optional URL or path relative links are resolved against
+
+        Returns:
+            The PDF document
+        """
+        return self.convert_html_to_stream(html_content, io.BytesIO(), base_url).getvalue()
+
+    def convert_html_file_to_stream(self, html_file_path: str, target: BinaryIO) -> BinaryIO:
+        """
+        Convert an HTML file (optionally gzipped) to PDF written straight to a stream
+
+        Args:
+            html_file_path: Path to the HTML file; relative links resolve
+                against its location
+            target: Writable binary file object receiving the PDF
+
+        Returns:
+            The ``target`` stream
+        """
+        if not os.path.exists(html_file_path):
+            raise FileNotFoundError(f"HTML file not found: {html_file_path}")
+        opener = gzip.open if html_file_path.lower().endswith('.gz') else open
+        with opener(html_file_path, 'rt', encoding='utf-8') as f:
+            html_content = f.read()
+        return self.convert_html_to_stream(html_content, target, os.path.abspath(html_file_path))
+
+    def render_artifacts(self, html_content: str, base_url: Optional[str] = None,
+                         full_pdf: bool = True,
+                         page_range: Optional[Tuple[int, int]] = None,
+                         thumbnail_width: Optional[int] = None) -> RenderedArtifacts:
+        """
+        Lay out a document once and derive several outputs from it (WeasyPrint)
+
+        Parsing, styling and layout run a single time: the full PDF, the
+        page-range PDF and the page metadata all come from the same
+        Document, and thumbnails are rasterised from the PDF it wrote. The
+        render cache is not consulted.
+
+        Args:
+            html_content: HTML content as string
+            base_url: Optional URL or path relative links are resolved against
+            full_pdf: Write the whole document as PDF
+            page_range: Optional 1-based inclusive (first, last) pages written
+                as a separate PDF, e.g. (1, 1) for a first-page preview;
+                clamped to the document's length
+            thumbnail_width: Also produce PNG thumbnails this many pixels
+                wide of the page range, or of every page without one.
+                Requires pypdfium2.
+
+        Returns:
+            RenderedArtifacts
+        """
+        if PDF_METHOD != "weasyprint":
+            raise RuntimeError("Rendering several artifacts from one layout requires WeasyPrint")
+        if page_range is not None and not 1 <= page_range[0] <= page_range[1]:
+            raise ValueError(f"Invalid page range {page_range[0]}-{page_range[1]}")
+        if thumbnail_width is not None:
+            if pypdfium2 is None:
+                raise RuntimeError("Thumbnails require pypdfium2 (pip install pypdfium2)")
+            if thumbnail_width <= 0:
+                raise ValueError(f"thumbnail_width must be positive, got {thumbnail_width}")
+
+        logger.info(
+            f"Rendering artifacts of HTML content ({len(html_content)} characters)")
+        self._last_render = {}
+        pdf = page_range_pdf = None
+        with self._weasyprint_document(string=html_content, base_url=base_url) as document:
+            pdf_options = self.pdf_options()
+            if full_pdf or (thumbnail_width and page_range is None):
+                pdf = document.write_pdf(**pdf_options)
+            if page_range is not None:
+                # Pages are already laid out; copy() only selects them
+                selected = document.pages[page_range[0] - 1:page_range[1]]
+                if not selected:
+                    raise ValueError(f"Page range starts after the last page ({len(document.pages)})")
+                page_range_pdf = document.copy(selected).write_pdf(**pdf_options)
+            pages = page_metadata(document)
+
+        thumbnails = []
+        if thumbnail_width:
+            thumbnails = render_thumbnails(page_range_pdf if page_range else pdf,
+                                           thumbnail_width)
+        logger.info(f"✅ Derived artifacts from one layout of {len(pages)} page(s)")
+        return RenderedArtifacts(pdf if full_pdf else None, page_range_pdf, pages, thumbnails)
+
+    def _render_cache_key(self, html: bytes, base_url: Optional[str]) -> str:
+        """Return the render cache key of a document"""
+        # Local stylesheets, images and fonts (also those of --stylesheet
+        # files) are part of the output; editing a shared one must miss
+        documents = [(html.decode('utf-8', 'replace'), base_url)]
+        for stylesheet in self.stylesheets:
+            with open(stylesheet, 'r', encoding='utf-8', errors='replace') as f:
+                documents.append((f.read(), os.path.abspath(stylesheet)))
+        dependencies = local_resources_digest(documents)
+        # Relative references make the output depend on where the document
+        # lives; otherwise identical documents share an entry everywhere
+        if not has_relative_references(html):
+            base_url = None
+        return self.render_cache.key_for(html, base_url, self.options_fingerprint(), dependencies)
+
+    def _fetch_cached_pdf(self, cache_key: str, output_pdf_path: str) -> bool:
+        """Materialise a cached PDF at ``output_pdf_path`` if there is one"""
+        if self.render_cache.fetch(cache_key, output_pdf_path):
+            logger.info(f"✅ PDF served from render cache: {output_pdf_path}")
+            self._last_render['cached'] = True
+            return True
+        return False
+
+    def _cacheable_render(self) -> bool:
+        """Whether the latest render may go into the render cache"""
+        # A font that failed to load, maybe transiently, degrades the PDF;
+        # don't serve that copy to later runs
+        if self._last_render.get('font_failures'):
+            logger.info("Not caching a PDF rendered without some of its fonts")
+            return False
+        return True
+
+    def _render_into_place(self, convert: Callable[[str], str], output_pdf_path: str,
+                           cache_key: Optional[str]) -> str:
+        """Run ``convert`` for ``output_pdf_path`` and add the PDF to the render cache"""
+        if os.path.exists(output_pdf_path) and not os.path.isfile(output_pdf_path):
+            # Devices and pipes (e.g. /dev/stdout) cannot be replaced
+            pdf_path = convert(output_pdf_path)
+            if cache_key is not None and self._cacheable_render():
+                self.render_cache.store(cache_key, pdf_path)
+            return pdf_path
+        # Render beside the output and move it into place, with or without
+        # a render cache: a failed render leaves the previous PDF alone, and
+        # an output hardlinked to a cache entry (RenderCache link=True) is
+        # replaced rather than rewritten
+        temp_path = f"{output_pdf_path}.{os.getpid()}.tmp"
+        try:
+            convert(temp_path)
+            if cache_key is not None and self._cacheable_render():
+                self.render_cache.store(cache_key, temp_path)
+            os.replace(temp_path, output_pdf_path)
+        finally:
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+        return output_pdf_path
+
+    def _convert_with_weasyprint_file(self, html_file_path: str, output_pdf_path: str) -> str:
+        """Convert HTML file to PDF using WeasyPrint"""
+        if PDF_METHOD != "weasyprint":
+            raise RuntimeError("WeasyPrint not available")
+
+        # Ensure output directory exists
+        os.makedirs(os.path.dirname(output_pdf_path), exist_ok=True)
+
+        # Convert using WeasyPrint
+        if self.inline_images is not None or self.stylesheet_cache is not None:
+            # Inline images and style blocks are rewritten in the markup,
+            # so read it here
+            with open(html_file_path, 'r', encoding='utf-8') as f:
+                self._write_weasyprint_pdf(output_pdf_path, string=f.read(),
+                                           base_url=os.path.abspath(html_file_path))
+        else:
+            self._write_weasyprint_pdf(output_pdf_path, filename=html_file_path)
+
+        logger.info(
+            f"✅ PDF generated successfully using WeasyPrint: {output_pdf_path}")
+        return output_pdf_path
+
+    def _convert_with_weasyprint_string(self, html_content: str, output_pdf_path: str,
+                                        base_url: Optional[str] = None) -> str:
+        """Convert HTML string to PDF using WeasyPrint"""
+        if PDF_METHOD != "weasyprint":
+            raise RuntimeError("WeasyPrint not available")
+
+        # Ensure output directory exists
+        os.makedirs(os.path.dirname(output_pdf_path), exist_ok=True)
+
+        # Convert using WeasyPrint
+        self._write_weasyprint_pdf(output_pdf_path, string=html_content, base_url=base_url)
+
+        logger.info(
+            f"✅ PDF generated successfully using WeasyPrint: {output_pdf_path}")
+        return output_pdf_path
+
+    def _write_weasyprint_pdf(self, target: Union[str, BinaryIO], **source):
+        """Render an HTML source (``filename=`` or ``string=``) and write the PDF to a path or stream"""
+        with self._weasyprint_document(**source) as document:
+            document.write_pdf(target, **self.pdf_options())
+
+    @contextlib.contextmanager
+    def _weasyprint_document(self, **source) -> Iterator[Any]:
+        """Lay out an HTML source (``filename=`` or ``string=``), yielding the WeasyPrint Document"""
+        url_fetcher = self.url_fetcher
+        restricted = find_url_fetcher(url_fetcher, RestrictedURLFetcher)
+        prefetcher = find_url_fetcher(url_fetcher, PrefetchingURLFetcher)
+        blocked = restricted.blocked if restricted else 0
+        options = self.image_options()
+        # One configuration for the whole document, even if font sources
+        # change and the shared one is replaced meanwhile
+        font_config = self.get_font_config()
+        font_failures = getattr(font_config, 'failures', 0)
+        if self.inline_images is not None:
+            source['string'] = self.inline_images.rewrite(source['string'])
+            url_fetcher = self.inline_images.url_fetcher(url_fetcher)
+            options['cache'] = self.inline_images.image_cache(self.options_fingerprint())
+        recorder = None
+        if self.record_resources:
+            url_fetcher = recorder = ResourceRecorder(url_fetcher or URLFetcher())
+        # After the recorder, which also lists what the extra stylesheets load
+        stylesheets = self.get_stylesheets(font_config, url_fetcher)
+        # Before hoisting, so that resources of <style> blocks download in
+        # parallel while the hoist parses them
+        if prefetcher is not None:
+            if 'string' in source:
+                prefetcher.prefetch(source['string'], source.get('base_url'))
+            else:
+                with open(source['filename'], 'r', encoding='utf-8', errors='replace') as f:
+                    prefetcher.prefetch(f.read(), source.get('base_url')
+                                        or os.path.abspath(source['filename']))
+        # Extra stylesheets share the user origin with hoisted blocks,
+        # which would let them override the document's own styles
+        if self.stylesheet_cache is not None and not stylesheets:
+            cache = self.stylesheet_cache
+            counters = (cache.hits, cache.misses, cache.time_saved)
+            source['string'], stylesheets = cache.hoist(
+                source['string'], source.get('base_url'), font_config, url_fetcher)
+            self._last_render.update(css_hits=cache.hits - counters[0],
+                                     css_misses=cache.misses - counters[1],
+                                     css_saved=cache.time_saved - counters[2])
+        try:
+            document = HTML(url_fetcher=url_fetcher, **source).render(
+                stylesheets=stylesheets, font_config=font_config, **options)
+            self._last_render['pages'] = len(document.pages)
+            yield document
+        finally:
+            if 'cache' in options:
+                options['cache'].release()
+            if prefetcher is not None:
+                prefetcher.discard()
+            if restricted:
+                self._last_render['blocked'] = restricted.blocked - blocked
+            if getattr(font_config, 'failures', 0) != font_failures:
+                self._last_render['font_failures'] = font_config.failures - font_failures
+            if recorder is not None:
+                self._last_render['resources'] = recorder.records
+
+    def _convert_with_reportlab_file(self, html_file_path: str, output_pdf_path: str) -> str:
+        """Convert HTML file to PDF using ReportLab (basic conversion)"""
+        # Read HTML content
+        with open(html_file_path, 'r', encoding='utf-8') as f:
+            html_content = f.read()
+
+        return self._convert_with_reportlab_string(html_content, output_pdf_path)
+
+    def _convert_with_reportlab_string(self, html_content: str, output_pdf_path: str) -> str:
+        """Convert HTML string to PDF using ReportLab (basic conversion)"""
+        # Ensure output directory exists
+        os.makedirs(os.path.dirname(output_pdf_path), exist_ok=True)
+
+        self._write_reportlab_pdf(html_content, output_pdf_path)
+
+        logger.info(
+            f"✅ PDF generated successfully using ReportLab: {output_pdf_path}")
+        return output_pdf_path
+
+    def _write_reportlab_pdf(self, html_content: str, target: Union[str, BinaryIO]):
+        """Lay out the text of an HTML string and write the PDF to a path or stream"""
+        try:
+            from bs4 import BeautifulSoup
+            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+            from reportlab.lib.styles import getSampleStyleSheet
+            from reportlab.lib.pagesizes import letter
+        except ImportError as e:
+            raise RuntimeError(
+                f"Required libraries not available for ReportLab conversion: {e}")
+
+        # Parse HTML to extract text content
+        soup = BeautifulSoup(html_content, 'html.parser')
+
+        # Remove script and style elements
+        for script in soup(["script", "style"]):
+            script.decompose()
+
+        # Get text content
+        text_content = soup.get_text()
+
+        # Create PDF using ReportLab
+        doc = SimpleDocTemplate(target, pagesize=letter,
+                                pageCompression=int(self.optimization_profile().compress))
+        styles = getSampleStyleSheet()
+        story = []
+
+        # Add title if available
+        title_tag = soup.find('title')
+        if title_tag:
+            story.append(Paragraph(title_tag.get_text(), styles['Title']))
+            story.append(Spacer(1, 12))
+
+        # Split content into paragraphs and add to story
+        paragraphs = text_content.split('\n\n')
+        for para in paragraphs:
+            if para.strip():
+                story.append(Paragraph(para.strip(), styles['Normal']))
+                story.append(Spacer(1, 6))
+
+        # Build PDF
+        doc.build(story)
+        self._last_render['pages'] = doc.page
+
+    def batch_convert_html_files(self, html_directory: str, output_directory: Optional[str] = None,
+                                 jobs: Optional[int] = None,
+                                 pool: Optional["ConverterWorkerPool"] = None,
+                                 largest_first: bool = True,
+                                 include: Optional[Iterable[str]] = None,
+                                 exclude: Optional[Iterable[str]] = None,
+                                 recursive: bool = True,
+                                 incremental: bool = False,
+                                 sink: Optional["OutputSink"] = None,
+                                 cost_window: Optional[int] = COST_WINDOW_PER_WORKER) -> Dict[str, str]:
+        """
+        Convert multiple HTML files in a directory to PDFs
+
+        Collects the records of iter_batch_convert(); see there for the
+        arguments.
+
+        Returns:
+            Dictionary mapping HTML file paths to PDF file paths (archive
+            member names with an archive sink), or to "Error: ..." strings
+            for failed files
+        """
+        results = {}
+        for result in self.iter_batch_convert(html_directory, output_directory, jobs, pool,
+                                              largest_first, include, exclude, recursive,
+                                              incremental, sink, cost_window):
+            results[result.input] = (f"Error: {result.error}" if result.status == 'error'
+                                     else result.output)
+        return results
+
+    def iter_batch_convert(self, html_directory: str, output_directory: Optional[str] = None,
+                           jobs: Optional[int] = None,
+                           pool: Optional["ConverterWorkerPool"] = None,
+                           largest_first: bool = True,
+                           include: Optional[Iterable[str]] = None,
+                           exclude: Optional[Iterable[str]] = None,
+                           recursive: bool = True,
+                           incremental: bool = False,
+                           sink: Optional["OutputSink"] = None,
+                           cost_window: Optional[int] = COST_WINDOW_PER_WORKER) -> Iterator["BatchResult"]:
+        """
+        Convert the HTML files in a directory, yielding a record per file as it finishes
+
+        Files are discovered lazily, so conversions start while the
+        directory tree is still being walked, and nothing is kept per file
+        once its record is yielded. PDFs mirror the input's sub-directory
+        layout under the output directory; inputs that would share a PDF
+        name (a.html, a.htm) keep their extension in it (a.html.pdf). Closing the generator early
+        cancels conversions that have not started.
+
+        Args:
+            html_directory: Directory containing HTML files
+            output_directory: Optional output directory for PDFs
+            jobs: Number of worker processes. Defaults to the CPU count;
+                1 converts serially in this process.
+            pool: Optional running ConverterWorkerPool to reuse; it is left
+                open afterwards and ``jobs`` is ignored.
+            largest_first: Dispatch parallel work in descending estimated
+                render cost instead of discovery order.
+            cost_window: Tasks per worker that ``largest_first`` looks
+                ahead. A large file discovered after the window has moved
+                on still starts late; None sorts every file first, which
+                delays the first conversion until discovery has finished.
+            include: Glob patterns of files to convert
+                (default: DEFAULT_HTML_PATTERNS)
+            exclude: Glob patterns of files or directories to skip
+            recursive: Descend into sub-directories
+            incremental: Skip files whose PDF exists and whose content and
+                conversion options match the batch manifest kept in the
+                output directory
+            sink: Optional OutputSink receiving the PDFs instead of the
+                output directory, e.g. a ZipSink. The caller closes it.
+
+        Yields:
+            BatchResult records in completion order
+        """
+        output_directory = self._sink_directory(sink, output_directory)
+        if incremental and sink is not None and sink.directory is None:
+            raise ValueError("Incremental batches need a directory output, not an archive")
+
+        # Records produced outside of conversion (skipped files)
+        finished = collections.deque()
+        manifest = None
+        tasks = self._iter_batch_tasks(html_directory, output_directory,
+                                       include, exclude, recursive)
+        if incremental:
+            manifest = BatchManifest(os.path.join(output_directory, BatchManifest.FILENAME))
+            tasks = manifest.filter_stale(tasks, self.options_fingerprint(), finished)
+
+        try:
+            yield from self._run_batch(tasks, finished, html_directory, jobs, pool,
+                                       largest_first, manifest, '_convert_batch_job', sink,
+                                       cost_window=cost_window)
+        finally:
+            if manifest is not None:
+                manifest.save()
+
+    def _run_batch(self, tasks: Iterator[tuple], finished: Deque["BatchResult"],
+                   source: str, jobs: Optional[int],
+                   pool: Optional["ConverterWorkerPool"], largest_first: bool,
+                   manifest: Optional["BatchManifest"], method: str,
+                   sink: Optional["OutputSink"] = None,
+                   task_cost: Optional[Callable[[tuple], float]] = None,
+                   cost_window: Optional[int] = COST_WINDOW_PER_WORKER) -> Iterator["BatchResult"]:
+        """
+        Convert a stream of batch tasks, yielding their records
+
+        Each task is an (input, output, ...) tuple passed as arguments to
+        the worker method ``method``, which returns a BatchResult. With an
+        archive ``sink`` the jobs render into memory and their PDFs are
+        added to the sink here as they complete. ``task_cost`` estimates a
+        task's render cost for ``largest_first`` (default: the cost of the
+        HTML file named by its input), looking ``cost_window`` tasks per
+        worker ahead (None: all of them).
+        """
+        in_memory = sink is not None and sink.directory is None
+        # Don't start workers when there is nothing to convert
+        first_task = next(tasks, None)
+        if first_task is None:
+            if finished:
+                logger.info(f"All {len(finished)} PDFs are up to date")
+            else:
+                logger.warning(f"No HTML files found in {source}")
+            while finished:
+                yield finished.popleft()
+            return
+        tasks = itertools.chain([first_task], tasks)
+
+        if pool is not None:
+            jobs = pool.jobs
+        elif jobs is None:
+            jobs = os.cpu_count() or 1
+
+        logger.info(
+            f"Converting HTML files from {source} ({jobs} worker(s))")
+
+        def record(outcome) -> BatchResult:
+            if in_memory:
+                result, pdf = outcome
+                if pdf is not None:
+                    result = result._replace(output=sink.add(result.output, pdf))
+            else:
+                result = outcome
+            if manifest is not None and result.status != 'error':
+                manifest.mark_converted(result.input)
+            return result
+
+        # With an archive sink jobs send each PDF back instead of writing
+        # a file; at most max_pending of them are held in memory at once
+        run_method, prefix = ('_convert_job_to_bytes', (method,)) if in_memory else (method, ())
+
+        if jobs == 1 and pool is None:
+            # Look one task ahead so that its downloads overlap this render
+            upcoming = next(tasks, None)
+            while upcoming is not None:
+                task, upcoming = upcoming, next(tasks, None)
+                if upcoming is not None:
+                    self.prefetch_job(run_method, *prefix, *upcoming)
+                while finished:
+                    yield finished.popleft()
+                yield record(getattr(self, run_method)(*prefix, *task))
+            while finished:
+                yield finished.popleft()
+            return
+
+        if largest_first:
+            tasks = order_by_cost(tasks, cost=task_cost,
+                                  window=None if cost_window is None else jobs * cost_window)
+
+        owns_pool = pool is None
+        if owns_pool:
+            pool = ConverterWorkerPool(self, jobs=jobs)
+        # Keep a bounded number of jobs queued so discovery, scheduling
+        # and conversion overlap without materialising the whole tree
+        max_pending = jobs * 2
+        pending = {}
+        try:
+            for task in tasks:
+                future = pool.submit(run_method, *prefix, *task)
+                pending[future] = (task[0], task[1], time.perf_counter())
+                while finished:
+                    yield finished.popleft()
+                if len(pending) >= max_pending:
+                    for result in self._collect_batch_results(pending, FIRST_COMPLETED, in_memory):
+                        yield record(result)
+            while finished:
+                yield finished.popleft()
+            for result in self._collect_batch_results(pending, in_memory=in_memory):
+                yield record(result)
+        finally:
+            # Only non-empty if the consumer stopped early or we failed
+            for future in pending:
+                future.cancel()
+            if owns_pool:
+                pool.close()
+
+    @staticmethod
+    def _collect_batch_results(pending: Dict[Future, Tuple[str, str, float]],
+                               return_when: str = ALL_COMPLETED,
+                               in_memory: bool = False) -> List[Any]:
+        """
+        Remove finished futures from ``pending`` and return their records
+
+        With ``in_memory`` the results are (record, PDF bytes or None) pairs.
+        """
+        done, _ = wait(pending, return_when=return_when)
+        results = []
+        for future in done:
+            html_path, pdf_path, submitted = pending.pop(future)
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # The worker itself died, was killed or timed out
+                logger.error(
+                    f"❌ Failed to convert {os.path.basename(html_path)}: {e}")
+                failed = BatchResult(html_path, pdf_path, 'error',
+                                     time.perf_counter() - submitted, 0, None, str(e))
+                results.append((failed, None) if in_memory else failed)
+        return results
+
+    def _sink_directory(self, sink: Optional["OutputSink"], output_directory: Optional[str]) -> str:
+        """Return the directory batch PDF paths are built under for ``sink``"""
+        if sink is None:
+            return self.output_directory if output_directory is None else output_directory
+        # Archive sinks get paths relative to the archive root
+        return '' if sink.directory is None else sink.directory
+
+    def _convert_job_to_bytes(self, method: str, *task) -> Tuple["BatchResult", Optional[bytes]]:
+        """Run batch job ``method`` rendering into memory; return its record and PDF"""
+        buffer = io.BytesIO()
+        result = getattr(self, method)(*task, target=buffer)
+        return result, (None if result.status == 'error' else buffer.getvalue())
+
+    def prefetch_job(self, method: str, *task):
+        """
+        Start the remote downloads of the batch job this converter runs next
+
+        They overlap the render in progress (see
+        PrefetchingURLFetcher.prefetch_ahead). Does nothing without a
+        prefetching URL fetcher. Template rows are skipped: they share
+        their template's resources, which the first row already fetched.
+        """
+        prefetcher = find_url_fetcher(self.url_fetcher, PrefetchingURLFetcher)
+        if prefetcher is None:
+            return
+        if method == '_convert_job_to_bytes':
+            method, *task = task
+        try:
+            if method == '_convert_batch_job':
+                prefetcher.prefetch_ahead(*read_html_input(task[0]))
+            elif method == '_convert_manifest_job' and 'html' in task[2]:
+                prefetcher.prefetch_ahead(*read_html_input(task[2]['html']))
+            elif method == '_convert_manifest_job':
+                prefetcher.prefetch_ahead(task[2]['html_string'], task[2].get('base_url'))
+        except (OSError, ValueError) as e:
+            # The job reports the problem when it runs
+            logger.debug(f"🔁 Could not prefetch the next job: {e}")
+
+    def _iter_batch_tasks(self, html_directory: str, output_directory: Optional[str] = None,
+                          include: Optional[Iterable[str]] = None,
+                          exclude: Optional[Iterable[str]] = None,
+                          recursive: bool = True) -> Iterator[Tuple[str, str]]:
+        """Lazily yield the (HTML path, PDF path) pairs of a batch directory"""
+        if output_directory is None:
+            output_directory = self.output_directory
+
+        if not os.path.exists(html_directory):
+            raise FileNotFoundError(
+                f"HTML directory not found: {html_directory}")
+
+        # A directory's files arrive together. Files whose PDF names would
+        # collide (a.html, a.htm, a.html.gz) keep their full name instead:
+        # a.html.pdf, a.htm.pdf, a.html.gz.pdf
+        files = discover_html_files(html_directory, include, exclude, recursive)
+        for directory, group in itertools.groupby(files, key=os.path.dirname):
+            html_paths = list(group)
+            names = [pdf_filename_for(html_path) for html_path in html_paths]
+            # Case-insensitively, for case-insensitive filesystems
+            counts = collections.Counter(name.lower() for name in names)
+            relative_dir = os.path.relpath(directory, html_directory)
+            for html_path, name in zip(html_paths, names):
+                if counts[name.lower()] > 1:
+                    name = f"{os.path.basename(html_path)}.pdf"
+                yield html_path, os.path.normpath(os.path.join(output_directory, relative_dir, name))
+
+    def _convert_batch_job(self, html_path: str, pdf_path: str,
+                           target: Optional[BinaryIO] = None) -> "BatchResult":
+        """
+        Convert one batch entry, returning its record instead of raising
+
+        The PDF goes to ``target`` instead of ``pdf_path`` if given; the
+        other job methods follow the same convention.
+        """
+        started = time.perf_counter()
+        try:
+            if target is not None:
+                self.convert_html_file_to_stream(html_path, target)
+            else:
+                pdf_path = self.convert_html_file_to_pdf(html_path, pdf_path)
+        except Exception as e:
+            return self._error_record(html_path, pdf_path, started, e)
+        return self._success_record(html_path, pdf_path, started, target)
+
+    def _convert_manifest_job(self, label: str, pdf_path: str, job: Dict[str, Any],
+                              target: Optional[BinaryIO] = None) -> "BatchResult":
+        """Convert one parsed JSONL manifest job, returning its record"""
+        started = time.perf_counter()
+        try:
+            converter = self.with_options(**job.get('options', {}))
+            if target is not None and 'html' in job:
+                converter.convert_html_file_to_stream(job['html'], target)
+            elif target is not None:
+                converter.convert_html_to_stream(job['html_string'], target, job.get('base_url'))
+            elif 'html' in job:
+                pdf_path = converter.convert_html_file_to_pdf(job['html'], pdf_path)
+            else:
+                pdf_path = converter.convert_html_string_to_pdf(
+                    job['html_string'], pdf_path, base_url=job.get('base_url'))
+        except Exception as e:
+            return self._error_record(label, pdf_path, started, e)
+        return converter._success_record(label, pdf_path, started, target)
+
+    def last_resources(self) -> List[Dict[str, Any]]:
+        """Return the resources the latest conversion loaded, if ``record_resources`` is set"""
+        return self._last_render.get('resources') or []
+
+    def _success_record(self, label: str, pdf_path: str, started: float,
+                        target: Optional[BinaryIO] = None) -> "BatchResult":
+        """Build the record of a conversion this converter just finished"""
+        logger.info(
+            f"✅ Converted: {os.path.basename(label)} -> {os.path.basename(pdf_path)}")
+        size = target.tell() if target is not None else os.path.getsize(pdf_path)
+        return BatchResult(label, pdf_path,
+                           'cached' if self._last_render.get('cached') else 'converted',
+                           time.perf_counter() - started, size,
+                           self._last_render.get('pages'), None,
+                           self._last_render.get('blocked', 0),
+                           self._last_render.get('css_hits', 0),
+                           self._last_render.get('css_misses', 0),
+                           self._last_render.get('css_saved', 0.0),
+                           self._last_render.get('resources'))
+
+    @staticmethod
+    def _error_record(label: str, pdf_path: str, started: float, error: Exception) -> "BatchResult":
+        """Build the record of a failed conversion"""
+        logger.error(f"❌ Failed to convert {os.path.basename(label)}: {error}")
+        return BatchResult(label, pdf_path, 'error',
+                           time.perf_counter() - started, 0, None, str(error))
+
+    def iter_manifest_convert(self, manifest_path: str, output_directory: Optional[str] = None,
+                              jobs: Optional[int] = None,
+                              pool: Optional["ConverterWorkerPool"] = None,
+                              largest_first: bool = True,
+                              sink: Optional["OutputSink"] = None,
+                              cost_window: Optional[int] = COST_WINDOW_PER_WORKER) -> Iterator["BatchResult"]:
+        """
+        Run the jobs of a JSONL manifest, yielding a record per job as it finishes
+
+        Each line is a JSON object with either ``html`` (path to an HTML
+        file) or ``html_string`` (inline HTML, optionally with
+        ``base_url``), plus optional ``output`` (PDF path; relative paths
+        are placed under the output directory), ``id`` (label used in
+        records) and ``options`` (per-job overrides, see JOB_OPTIONS).
+        Relative ``html`` paths and file system ``base_url`` values resolve
+        against the manifest's directory. Jobs without ``output`` are named
+        after their HTML file, keeping its location relative to the
+        manifest, or after their ``id``; names already used in the run get
+        the full file name (a.htm.pdf) or a number instead. Lines are read
+        lazily, so arbitrarily large manifests stream through the workers.
+        Invalid lines produce 'error' records.
+
+        Args:
+            manifest_path: Path to the JSONL job manifest
+            output_directory: Directory for PDFs without an absolute output
+            jobs: Number of worker processes. Defaults to the CPU count;
+                1 converts serially in this process.
+            pool: Optional running ConverterWorkerPool to reuse
+            largest_first: Dispatch file jobs in descending estimated cost
+            cost_window: Jobs per worker ``largest_first`` looks ahead, see
+                iter_batch_convert()
+            sink: Optional OutputSink receiving the PDFs, see iter_batch_convert()
+
+        Yields:
+            BatchResult records in completion order
+        """
+        output_directory = self._sink_directory(sink, output_directory)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"Job manifest not found: {manifest_path}")
+
+        finished = collections.deque()
+        tasks = self._iter_manifest_tasks(manifest_path, output_directory, finished)
+        yield from self._run_batch(tasks, finished, manifest_path, jobs, pool,
+                                   largest_first, None, '_convert_manifest_job', sink,
+                                   self._manifest_task_cost, cost_window)
+
+    @staticmethod
+    def _manifest_task_cost(task: Tuple[str, str, Dict[str, Any]]) -> float:
+        """Estimate the render cost of a manifest task from its job, not its label"""
+        job = task[2]
+        if 'html' in job:
+            return estimate_html_cost(job['html'])
+        return estimate_markup_cost(job['html_string'].encode('utf-8'))
+
+    def _iter_manifest_tasks(self, manifest_path: str, output_directory: str,
+                             invalid: Deque["BatchResult"]) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """Lazily parse manifest lines into (label, PDF path, job) tasks"""
+        manifest_directory = os.path.dirname(os.path.abspath(manifest_path))
+        # Relative PDF paths handed out so far, case-insensitively
+        used_outputs = set()
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                label = f"{manifest_path}:{line_number}"
+                try:
+                    job = json.loads(line)
+                    if not isinstance(job, dict):
+                        raise ValueError("job must be a JSON object")
+                    if ('html' in job) == ('html_string' in job):
+                        raise ValueError("job needs exactly one of 'html' or 'html_string'")
+                    for key in ('html', 'html_string', 'base_url', 'output', 'id'):
+                        if key in job and not isinstance(job[key], str):
+                            raise ValueError(f"'{key}' must be a string")
+                    if not isinstance(job.get('options', {}), dict):
+                        raise ValueError("'options' must be a JSON object")
+                    label = job.get('id') or job.get('html') or label
+                    if 'html' in job:
+                        job['html'] = os.path.join(manifest_directory, job['html'])
+                    elif job.get('base_url') and not urllib.parse.urlsplit(job['base_url']).scheme:
+                        job['base_url'] = os.path.join(manifest_directory, job['base_url'])
+
+                    output = job.get('output')
+                    if output is None:
+                        if 'html' not in job and 'id' not in job:
+                            raise ValueError("inline jobs need an 'output' or 'id'")
+                        output = self._manifest_output_name(job, manifest_directory, used_outputs)
+                    elif not os.path.isabs(output):
+                        used_outputs.add(os.path.normpath(output).lower())
+                    pdf_path = os.path.join(output_directory, output)
+                    # Reject unknown options before the job reaches a worker
+                    self.with_options(**job.get('options', {}))
+                except (ValueError, TypeError) as e:
+                    logger.error(f"❌ Invalid manifest job at {manifest_path}:{line_number}: {e}")
+                    invalid.append(BatchResult(label, '', 'error', 0.0, 0, None,
+                                               f"Invalid job: {e}"))
+                    continue
+                yield label, pdf_path, job
+
+    @staticmethod
+    def _manifest_output_name(job: Dict[str, Any], manifest_directory: str,
+                              used_outputs: Set[str]) -> str:
+        """Derive a relative PDF path for a manifest job without 'output' that is not used yet"""
+        if 'html' in job:
+            relative = os.path.relpath(job['html'], manifest_directory)
+            if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+                # Outside the manifest's tree; never write above the output directory
+                relative = os.path.basename(job['html'])
+            directory = os.path.dirname(relative)
+            names = [pdf_filename_for(relative), f"{os.path.basename(relative)}.pdf"]
+        else:
+            directory, names = '', [pdf_filename_for(f"{job['id']}.html")]
+        stem = names[0][:-len('.pdf')]
+        numbered = (f"{stem}-{number}.pdf" for number in itertools.count(2))
+        for name in itertools.chain(names, numbered):
+            output = os.path.join(directory, name)
+            if output.lower() not in used_outputs:
+                used_outputs.add(output.lower())
+                return output
+
+    def iter_template_convert(self, template_path: str, data_path: str,
+                              output_directory: Optional[str] = None,
+                              jobs: Optional[int] = None,
+                              pool: Optional["ConverterWorkerPool"] = None,
+                              sink: Optional["OutputSink"] = None) -> Iterator["BatchResult"]:
+        """
+        Render a template once per JSONL data row and convert each result
+
+        The template is compiled once per process (see HTMLTemplate) and
+        every row is rendered straight into the converter; no HTML files are
+        written. Relative links in the template resolve against its
+        location. A row's optional ``output`` (PDF path; relative paths are
+        placed under the output directory) or ``id`` names its PDF; other
+        rows are numbered after the template. Invalid lines produce 'error'
+        records.
+
+        Args:
+            template_path: Path to the HTML template
+            data_path: Path to the JSONL data, one JSON object per document
+            output_directory: Directory for PDFs without an absolute output
+            jobs: Number of worker processes. Defaults to the CPU count;
+                1 converts serially in this process.
+            pool: Optional running ConverterWorkerPool to reuse
+            sink: Optional OutputSink receiving the PDFs, see iter_batch_convert()
+
+        Yields:
+            BatchResult records in completion order
+        """
+        output_directory = self._sink_directory(sink, output_directory)
+        for path, kind in ((template_path, "Template"), (data_path, "Template data")):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"{kind} not found: {path}")
+        # Fail on template syntax errors before any worker starts
+        load_template(template_path)
+
+        finished = collections.deque()
+        tasks = self._iter_template_tasks(template_path, data_path, output_directory, finished)
+        # Rows have no file to estimate their cost from
+        yield from self._run_batch(tasks, finished, data_path, jobs, pool,
+                                   False, None, '_convert_template_job', sink)
+
+    def _iter_template_tasks(self, template_path: str, data_path: str, output_directory: str,
+                             invalid: Deque["BatchResult"]) -> Iterator[Tuple[str, str, str, Dict[str, Any]]]:
+        """Lazily parse data lines into (label, PDF path, template path, row) tasks"""
+        stem = os.path.basename(template_path).split('.', 1)[0]
+        with open(data_path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                label = f"{data_path}:{line_number}"
+                try:
+                    row = json.loads(line)
+                    if not isinstance(row, dict):
+                        raise ValueError("row must be a JSON object")
+                    if 'output' in row and not isinstance(row['output'], str):
+                        raise ValueError("'output' must be a string")
+                    if 'id' in row and not isinstance(row['id'], (str, int)):
+                        raise ValueError("'id' must be a string or number")
+                    for key in ('output', 'id'):
+                        if row.get(key) == '':
+                            raise ValueError(f"'{key}' must not be empty")
+                    if 'id' in row:
+                        label = str(row['id'])
+                    output = row.get('output')
+                    if output is None:
+                        name = f"{stem}-{line_number}" if row.get('id') is None else row['id']
+                        output = f"{name}.pdf"
+                    pdf_path = os.path.join(output_directory, output)
+                except ValueError as e:
+                    logger.error(f"❌ Invalid data row at {data_path}:{line_number}: {e}")
+                    invalid.append(BatchResult(label, '', 'error', 0.0, 0, None,
+                                               f"Invalid row: {e}"))
+                    continue
+                yield label, pdf_path, template_path, row
+
+    def _convert_template_job(self, label: str, pdf_path: str, template_path: str,
+                              row: Dict[str, Any],
+                              target: Optional[BinaryIO] = None) -> "BatchResult":
+        """Render one data row through the template and convert it, returning its record"""
+        started = time.perf_counter()
+        try:
+            template = load_template(template_path)
+            if target is not None:
+                self.convert_html_to_stream(template.render(row), target, template.base_url)
+            else:
+                pdf_path = self.convert_html_string_to_pdf(
+                    template.render(row), pdf_path, base_url=template.base_url)
+        except Exception as e:
+            return self._error_record(label, pdf_path, started, e)
+        return self._success_record(label, pdf_path, started, target)
+
+    async def aconvert_html_file_to_pdf(self, html_file_path: str,
+                                        output_pdf_path: Optional[str] = None) -> str:
+        """
+        Async counterpart of convert_html_file_to_pdf
+
+        The render runs in a worker process; at most ``max_concurrency``
+        renders run at once and the rest wait without blocking the loop.
+        Cancelling the awaiting task drops a render that has not started.
+
+        Returns:
+            Path to the generated PDF file
+        """
+        return await self._run_async('convert_html_file_to_pdf', html_file_path, output_pdf_path)
+
+    async def aconvert_html_string_to_pdf(self, html_content: str, output_pdf_path: str,
+                                          base_url: Optional[str] = None) -> str:
+        """
+        Async counterpart of convert_html_string_to_pdf
+
+        Returns:
+            Path to the generated PDF file
+        """
+        return await self._run_async('convert_html_string_to_pdf', html_content, output_pdf_path,
+                                     base_url)
+
+    async def abatch_convert(self, html_directory: str,
+                             output_directory: Optional[str] = None,
+                             largest_first: bool = True,
+                             include: Optional[Iterable[str]] = None,
+                             exclude: Optional[Iterable[str]] = None,
+                             recursive: bool = True,
+                             cost_window: Optional[int] = COST_WINDOW_PER_WORKER) -> Dict[str, str]:
+        """
+        Async counterpart of batch_convert_html_files
+
+        Returns:
+            Dictionary mapping HTML file paths to PDF paths or error strings
+        """
+        limit = self.max_concurrency or os.cpu_count() or 1
+        tasks = self._iter_batch_tasks(html_directory, output_directory,
+                                       include, exclude, recursive)
+        if largest_first:
+            tasks = order_by_cost(tasks, window=None if cost_window is None else limit * cost_window)
+
+        async def convert(html_path: str, pdf_path: str) -> Tuple[str, str]:
+            try:
+                result = await self._run_async('_convert_batch_job', html_path, pdf_path)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The worker itself died, was killed or timed out
+                logger.error(
+                    f"❌ Failed to convert {os.path.basename(html_path)}: {e}")
+                return html_path, f"Error: {str(e)}"
+            if result.status == 'error':
+                return html_path, f"Error: {result.error}"
+            return html_path, result.output
+
+        # Walk the tree off the event loop and keep a bounded number of
+        # conversions in flight
+        loop = asyncio.get_running_loop()
+        results = {}
+        pending = set()
+        try:
+            while True:
+                task = await loop.run_in_executor(None, next, tasks, None)
+                if task is None:
+                    break
+                pending.add(asyncio.ensure_future(convert(*task)))
+                if len(pending) >= limit * 2:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED)
+                    results.update(future.result() for future in done)
+            if pending:
+                done, pending = await asyncio.wait(pending)
+                results.update(future.result() for future in done)
+        finally:
+            for future in pending:
+                future.cancel()
+        return results
+
+    async def _run_async(self, method: str, *args):
+        """Run a converter method in the async worker pool"""
+        # Semaphores bind to one event loop, so make a new one per loop
+        loop = asyncio.get_running_loop()
+        if self._async_semaphore is None or self._async_semaphore[0] is not loop:
+            limit = self.max_concurrency or os.cpu_count() or 1
+            self._async_semaphore = (loop, asyncio.Semaphore(limit))
+
+        async with self._async_semaphore[1]:
+            if self._async_pool is None:
+                self._async_pool = ConverterWorkerPool(self, jobs=self.max_concurrency)
+            # Cancelling the wrapper cancels the pool job if still queued
+            return await asyncio.wrap_future(self._async_pool.submit(method, *args))
+
+
+class ConverterWorkerPool:
+    """
+    Long-lived pool of worker processes that each keep a warm converter
+
+    Every worker imports the PDF backend once, holds a single
+    SharedFontConfiguration and serves many conversions, so only the first job
+    per worker pays start-up costs.
+
+    The pool also guards long batch runs: a job running past
+    ``job_timeout`` has its worker killed and fails with TimeoutError, a
+    worker that dies fails its job with RuntimeError, and workers are
+    recycled after ``max_jobs_per_worker`` jobs or once their resident
+    memory passes ``max_worker_rss_mb``. Replacement workers are started
+    automatically, so one bad document never takes down the run. Workers
+    that keep dying before they are ready (e.g. an unpicklable converter
+    or a too small ``worker_memory_limit_mb``) are not replaced forever:
+    after MAX_STARTUP_FAILURES in a row every queued and later job fails
+    with RuntimeError.
+
+    With a prefetching URL fetcher each worker is also told which queued
+    job it takes next, so that job's downloads overlap the current render
+    (see HTMLToPDFConverter.prefetch_job). A worker that falls idle while
+    its job is still queued takes it ahead of the queue; other jobs are
+    taken in order.
+    """
+
+    # Consecutive workers dying during start-up before the pool gives up
+    MAX_STARTUP_FAILURES = 3
+
+    # Converter methods that may be called through the pool
+    WORKER_METHODS = ('convert_html_file_to_pdf', 'convert_html_string_to_pdf',
+                      'convert_html_string_to_bytes', '_convert_batch_job',
+                      '_convert_manifest_job', '_convert_template_job', '_convert_job_to_bytes')
+
+    def __init__(self, converter: Optional[HTMLToPDFConverter] = None,
+                 jobs: Optional[int] = None, warm_up: bool = True,
+                 job_timeout: Optional[float] = None,
+                 max_jobs_per_worker: Optional[int] = None,
+                 max_worker_rss_mb: Optional[int] = None,
+                 worker_memory_limit_mb: Optional[int] = None,
+                 mp_context: Optional[multiprocessing.context.BaseContext] = None):
+        """
+        Args:
+            converter: Converter whose settings every worker copies.
+                Defaults to a converter writing to ./pdf_outputs.
+            jobs: Maximum number of worker processes, started as work
+                arrives. Defaults to the CPU count.
+            warm_up: Render a tiny document in each worker on start-up
+            job_timeout: Wall-clock seconds a single job may run
+            max_jobs_per_worker: Recycle a worker after this many jobs
+            max_worker_rss_mb: Recycle a worker once its RSS exceeds this
+            worker_memory_limit_mb: Hard address-space limit of each worker
+                (RLIMIT_AS, Unix only); allocations beyond it fail the job
+            mp_context: multiprocessing context used to start workers.
+                Defaults to forkserver where available, else spawn, so
+                workers never fork from a process holding font state or
+                the dispatcher's locks.
+        """
+        if jobs is not None and jobs < 1:
+            raise ValueError(f"jobs must be at least 1, got {jobs}")
+        self.converter = converter or HTMLToPDFConverter()
+        self.jobs = jobs or os.cpu_count() or 1
+        self.job_timeout = job_timeout
+        self._context = mp_context or multiprocessing.get_context(
+            'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+        # Workers unpickle their own converter and, should a fork context
+        # be passed in, drop the font configuration they inherited (see
+        # _pool_worker_main), so none shares native font state with this
+        # process
+        self._worker_args = (pickle.dumps(self.converter), warm_up,
+                             max_jobs_per_worker, max_worker_rss_mb,
+                             worker_memory_limit_mb)
+        self._prefetch_next = find_url_fetcher(
+            getattr(self.converter, 'url_fetcher', None), PrefetchingURLFetcher) is not None
+
+        self._lock = threading.Lock()
+        self._queue = collections.deque()
+        self._job_ids = itertools.count()
+        self._workers: List[_PoolWorker] = []
+        self._closing = False
+        self._startup_failures = 0
+        # Set once workers cannot start; fails every job from then on
+        self._broken: Optional[RuntimeError] = None
+        # At most one wake-up message is ever in the pipe, so sending
+        # never blocks on a full pipe buffer
+        self._wakeup_reader, self._wakeup_writer = self._context.Pipe(duplex=False)
+        self._wakeup_lock = threading.Lock()
+        self._wakeup_pending = False
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True,
+                                            name="ConverterWorkerPool")
+        self._dispatcher.start()
+        logger.info(f"Started converter worker pool with up to {self.jobs} worker(s)")
+
+    def submit(self, method: str, *args) -> Future:
+        """Run a converter method in a worker and return its Future"""
+        if method not in self.WORKER_METHODS:
+            raise ValueError(f"Unsupported worker method: {method}")
+        future = Future()
+        with self._lock:
+            if self._closing:
+                raise RuntimeError("Cannot submit jobs to a closed worker pool")
+            self._queue.append((next(self._job_ids), method, args, future))
+        self._wake()
+        return future
+
+    def submit_html_file(self, html_file_path: str, output_pdf_path: Optional[str] = None) -> Future:
+        """Queue an HTML file conversion; the Future resolves to the PDF path"""
+        return self.submit('convert_html_file_to_pdf', html_file_path, output_pdf_path)
+
+    def submit_html_string(self, html_content: str, output_pdf_path: str,
+                           base_url: Optional[str] = None) -> Future:
+        """Queue an HTML string conversion; the Future resolves to the PDF path"""
+        return self.submit('convert_html_string_to_pdf', html_content, output_pdf_path, base_url)
+
+    def submit_html_bytes(self, html_content: str, base_url: Optional[str] = None) -> Future:
+        """Queue an in-memory HTML string conversion; the Future resolves to the PDF bytes"""
+        return self.submit('convert_html_string_to_bytes', html_content, base_url)
+
+    def convert_html_file_to_pdf(self, html_file_path: str, output_pdf_path: Optional[str] = None) -> str:
+        """Convert an HTML file in a worker and wait for the PDF path"""
+        return self.submit_html_file(html_file_path, output_pdf_path).result()
+
+    def convert_html_string_to_pdf(self, html_content: str, output_pdf_path: str,
+                                   base_url: Optional[str] = None) -> str:
+        """Convert HTML content in a worker and wait for the PDF path"""
+        return self.submit_html_string(html_content, output_pdf_path, base_url).result()
+
+    def convert_html_string_to_bytes(self, html_content: str, base_url: Optional[str] = None) -> bytes:
+        """Convert HTML content in a worker and wait for the PDF bytes"""
+        return self.submit_html_bytes(html_content, base_url).result()
+
+    def close(self, wait: bool = True):
+        """
+        Shut down the worker processes
+
+        Args:
+            wait: Finish queued jobs and wait for the workers to exit.
+                Otherwise queued jobs are cancelled and running ones are
+                left to finish in the background.
+        """
+        with self._lock:
+            self._closing = True
+            if not wait:
+                while self._queue:
+                    self._queue.popleft()[3].cancel()
+        self._wake()
+        if wait:
+            self._dispatcher.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _wake(self):
+        """Interrupt the dispatcher's wait"""
+        with self._wakeup_lock:
+            if not self._wakeup_pending:
+                self._wakeup_pending = True
+                self._wakeup_writer.send(None)
+
+    def _dispatch(self):
+        """Dispatcher thread: feed workers, collect results, enforce limits"""
+        try:
+            while True:
+                with self._lock:
+                    idle = not self._queue and not any(w.job for w in self._workers)
+                    if self._closing and idle:
+                        break
+                    if self._broken is not None:
+                        self._fail_queued(self._broken)
+                    # Start workers as work arrives, one per queued job
+                    # no idle or starting worker will take, up to jobs
+                    missing = 0
+                    if self._broken is None:
+                        free = sum(1 for w in self._workers if w.job is None)
+                        missing = min(self.jobs - len(self._workers), len(self._queue) - free)
+                # Start processes without holding the lock, which a forked
+                # child would otherwise inherit locked
+                started = [_PoolWorker(self._context, self._worker_args)
+                           for _ in range(missing)]
+                with self._lock:
+                    self._workers.extend(started)
+                    self._assign_jobs()
+
+                deadlines = [w.deadline for w in self._workers if w.deadline is not None]
+                timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                workers = {w.connection: w for w in self._workers}
+                ready = multiprocessing.connection.wait(
+                    list(workers) + [self._wakeup_reader], timeout)
+                for connection in ready:
+                    if connection is self._wakeup_reader:
+                        with self._wakeup_lock:
+                            while self._wakeup_reader.poll():
+                                self._wakeup_reader.recv()
+                            self._wakeup_pending = False
+                    else:
+                        self._receive(workers[connection])
+                self._expire_jobs()
+        finally:
+            for worker in self._workers:
+                # Only set if the dispatcher itself failed
+                future = worker.finish_job()
+                if future is not None:
+                    future.set_exception(RuntimeError("Worker pool shut down"))
+                worker.stop(kill=future is not None)
+            # Anything still queued can no longer run
+            self._fail_queued(RuntimeError("Worker pool shut down"))
+
+    def _fail_queued(self, error: RuntimeError):
+        """Fail every queued job with ``error``"""
+        while self._queue:
+            future = self._queue.popleft()[3]
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+    def _assign_jobs(self):
+        """Hand queued jobs to idle workers (called with the lock held)"""
+        for worker in self._workers:
+            while worker.ready and worker.job is None and self._queue:
+                job_id, method, args, future = self._take_job(worker)
+                if not future.set_running_or_notify_cancel():
+                    continue
+                worker.start_job(job_id, method, args, future, self.job_timeout,
+                                 self._next_job_for(worker))
+
+    def _take_job(self, worker: "_PoolWorker") -> tuple:
+        """Dequeue the job announced to ``worker``, else the oldest one (lock held)"""
+        for index, queued in enumerate(self._queue):
+            if queued[0] == worker.next_job_id:
+                del self._queue[index]
+                return queued
+        return self._queue.popleft()
+
+    def _next_job_for(self, worker: "_PoolWorker") -> Optional[tuple]:
+        """Announce to ``worker`` the first queued job no other worker expects (lock held)"""
+        worker.next_job_id = None
+        if not self._prefetch_next:
+            return None
+        announced = {w.next_job_id for w in self._workers}
+        for job_id, method, args, _ in self._queue:
+            if job_id not in announced:
+                worker.next_job_id = job_id
+                return (method,) + args
+        return None
+
+    def _receive(self, worker: "_PoolWorker"):
+        """Handle a message from a worker"""
+        try:
+            message = worker.connection.recv()
+        except (EOFError, OSError):
+            exitcode = worker.exitcode()
+            self._replace_worker(worker, RuntimeError(
+                f"Worker process died (exit code {exitcode})"))
+            if not worker.ready:
+                self._startup_failures += 1
+                logger.error(f"Worker process died during start-up (exit code {exitcode})")
+                if self._broken is None and self._startup_failures >= self.MAX_STARTUP_FAILURES:
+                    self._broken = RuntimeError(
+                        f"Worker processes keep dying during start-up "
+                        f"(last exit code {exitcode}); giving up")
+                    logger.error(f"❌ {self._broken}")
+            return
+
+        if message[0] == 'ready':
+            worker.ready = True
+            self._startup_failures = 0
+            return
+
+        _, ok, value, retire = message
+        future = worker.finish_job()
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+        if retire:
+            logger.info(f"Recycling worker process {worker.process.pid}")
+            self._replace_worker(worker, None)
+
+    def _expire_jobs(self):
+        """Kill workers whose job ran past its deadline"""
+        now = time.monotonic()
+        for worker in list(self._workers):
+            if worker.deadline is not None and worker.deadline <= now:
+                logger.error(f"Job exceeded {self.job_timeout}s; killing worker {worker.process.pid}")
+                self._replace_worker(worker, TimeoutError(
+                    f"Conversion timed out after {self.job_timeout}s"))
+
+    def _replace_worker(self, worker: "_PoolWorker", error: Optional[BaseException]):
+        """Stop a worker, failing its current job with ``error``"""
+        with self._lock:
+            self._workers.remove(worker)
+        future = worker.finish_job()
+        if future is not None:
+            future.set_exception(error or RuntimeError("Worker process exited"))
+        worker.stop(kill=error is not None)
+
+
+class _PoolWorker:
+    """Parent-side handle of one ConverterWorkerPool process"""
+
+    def __init__(self, context: multiprocessing.context.BaseContext, worker_args: tuple):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_pool_worker_main,
+                                       args=(child_connection,) + worker_args,
+                                       daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.ready = False
+        self.job = None
+        self.deadline = None
+        # Queued job this worker was told to prefetch
+        self.next_job_id = None
+
+    def start_job(self, job_id: int, method: str, args: tuple, future: Future,
+                  timeout: Optional[float], next_job: Optional[tuple] = None):
+        self.job = (job_id, future)
+        self.deadline = time.monotonic() + timeout if timeout else None
+        try:
+            self.connection.send((job_id, method, args, next_job))
+        except (OSError, ValueError):
+            # Dead worker; the dispatcher sees EOF and fails the job
+            pass
+
+    def finish_job(self) -> Optional[Future]:
+        future = self.job[1] if self.job else None
+        self.job = None
+        self.deadline = None
+        return future
+
+    def exitcode(self) -> Optional[int]:
+        self.process.join(timeout=1)
+        return self.process.exitcode
+
+    def stop(self, kill: bool = False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.connection.send(None)
+            except (OSError, ValueError):
+                pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+def _current_rss_mb() -> float:
+    """Return this process's resident set size in MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        if resource is None:
+            return 0.0
+        # Peak rather than current RSS; reported in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Converter used by pool worker processes, set by _pool_worker_main
+_worker_converter: Optional[HTMLToPDFConverter] = None
+
+
+def _pool_worker_main(connection, converter_payload: bytes, warm_up: bool,
+                      max_jobs: Optional[int], max_rss_mb: Optional[int],
+                      memory_limit_mb: Optional[int]):
+    """Entry point of a ConverterWorkerPool process"""
+    global _worker_converter, _shared_font_config, _shared_font_config_lock
+    # A forked worker inherits the parent's font configuration, whose
+    # native Pango/fontconfig handles must not be shared, and possibly its
+    # lock held by another thread; start from scratch
+    _shared_font_config = None
+    _shared_font_config_lock = threading.Lock()
+    # Ctrl+C is handled by the parent, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if memory_limit_mb and resource is not None:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    _worker_converter = pickle.loads(converter_payload)
+    if warm_up:
+        try:
+            _worker_converter.warm_up()
+        except Exception as e:
+            logger.warning(f"Worker warm-up failed: {e}")
+    connection.send(('ready',))
+
+    jobs_done = 0
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        job_id, method, args, next_job = message
+        if next_job is not None:
+            _worker_converter.prefetch_job(*next_job)
+        try:
+            ok, value = True, getattr(_worker_converter, method)(*args)
+        except Exception as e:
+            ok, value = False, e
+        jobs_done += 1
+
+        retire = (isinstance(value, MemoryError)
+                  or (max_jobs is not None and jobs_done >= max_jobs)
+                  or (max_rss_mb is not None and _current_rss_mb() > max_rss_mb))
+        try:
+            connection.send(('result', ok, value, retire))
+        except Exception:
+            # Result or exception could not be pickled
+            connection.send(('result', False, RuntimeError(repr(value)), retire))
+        if retire:
+            break
+
+
+# Rough per-signal weights used to rank documents by expected render time,
+# expressed in "bytes of plain markup" equivalents
+COST_PER_TABLE = 20_000
+COST_PER_EXTERNAL_URL = 50_000
+COST_BASE64_FACTOR = 0.25
+
+_TABLE_RE = re.compile(rb'<table\b', re.IGNORECASE)
+_BASE64_RE = re.compile(rb'data:[^;,"\'\s]*;base64,([A-Za-z0-9+/=]+)', re.IGNORECASE)
+_EXTERNAL_URL_RE = re.compile(
+    rb'<(?:img|link|script|source|iframe|embed|object)\b[^>]*?\b(?:src|href|data)\s*=\s*["\']?https?://'
+    rb'|url\(\s*["\']?https?://'
+    rb'|@import\s+["\']https?://', re.IGNORECASE)
+
+
+def estimate_html_cost(html_path: str) -> float:
+    """
+    Estimate the relative render cost of an HTML file without rendering it
+
+    Combines the file size, the number of tables, the bytes of inline
+    base64 data and the number of external resources to fetch.
+
+    Args:
+        html_path: Path to the HTML file
+
+    Returns:
+        A unitless cost; only comparisons between documents are meaningful
+    """
+    opener = gzip.open if html_path.lower().endswith('.gz') else open
+    with opener(html_path, 'rb') as f:
+        return estimate_markup_cost(f.read())
+
+
+def estimate_markup_cost(content: bytes) -> float:
+    """Estimate the relative render cost of HTML markup, see estimate_html_cost()"""
+    base64_bytes = sum(len(m.group(1)) for m in _BASE64_RE.finditer(content))
+    return ((len(content) - base64_bytes)
+            + base64_bytes * COST_BASE64_FACTOR
+            + len(_TABLE_RE.findall(content)) * COST_PER_TABLE
+            + len(_EXTERNAL_URL_RE.findall(content)) * COST_PER_EXTERNAL_URL)
+
+
+def order_by_cost(tasks: Iterable[tuple], window: Optional[int] = None,
+                  cost: Optional[Callable[[tuple], float]] = None) -> Iterator[tuple]:
+    """
+    Reorder batch tasks most expensive first
+
+    Dispatching the longest renders first keeps one large document from
+    finishing last and stretching a parallel batch.
+
+    Args:
+        tasks: Batch tasks, possibly a lazy stream
+        window: Look-ahead size. The most expensive of the next ``window``
+            tasks is released each time, so streaming input keeps flowing,
+            but a task more than ``window`` places behind cheaper ones may
+            still be released after them. None sorts the whole input
+            first, delaying the first task until the input is exhausted.
+        cost: Estimates a task's cost. Defaults to estimate_html_cost() of
+            the task's first item, an (HTML path, PDF path) pair's input.
+    """
+    def safe_cost(task: tuple) -> float:
+        try:
+            return cost(task) if cost is not None else estimate_html_cost(task[0])
+        except OSError:
+            # Unreadable files fail fast; let them run last
+            return 0.0
+
+    # Max-heap of (-cost, arrival order, task)
+    heap = []
+    for order, task in enumerate(tasks):
+        heapq.heappush(heap, (-safe_cost(task), order, task))
+        if window is not None and len(heap) > window:
+            yield heapq.heappop(heap)[2]
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+
+# File patterns picked up by batch discovery
+DEFAULT_HTML_PATTERNS = ('*.html', '*.htm', '*.xhtml', '*.html.gz')
+
+
+def discover_html_files(root: str, include: Optional[Iterable[str]] = None,
+                        exclude: Optional[Iterable[str]] = None,
+                        recursive: bool = True) -> Iterator[str]:
+    """
+    Lazily walk a directory tree and yield matching HTML file paths
+
+    Uses os.scandir so that no directory listing is held in memory beyond
+    the directories still to visit. Patterns are case-insensitive globs;
+    excludes are matched against both the entry name and its path relative
+    to ``root``, and an excluded directory is not descended into.
+
+    Args:
+        root: Directory to walk
+        include: Glob patterns of files to yield (default: DEFAULT_HTML_PATTERNS)
+        exclude: Glob patterns of files or directories to skip
+        recursive: Descend into sub-directories
+    """
+    include = [p.lower() for p in (include or DEFAULT_HTML_PATTERNS)]
+    exclude = [p.lower() for p in (exclude or ())]
+
+    def excluded(name: str, relative_path: str) -> bool:
+        return any(fnmatch.fnmatchcase(name, p) or fnmatch.fnmatchcase(relative_path, p)
+                   for p in exclude)
+
+    directories = [root]
+    while directories:
+        directory = directories.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = entry.name.lower()
+                    relative_path = os.path.relpath(entry.path, root).replace(os.sep, '/').lower()
+                    if excluded(name, relative_path):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            directories.append(entry.path)
+                    elif any(fnmatch.fnmatchcase(name, p) for p in include):
+                        yield entry.path
+        except OSError as e:
+            logger.warning(f"Skipping unreadable directory {directory}: {e}")
+
+
+def pdf_filename_for(html_path: str) -> str:
+    """Return the PDF file name for an HTML file, e.g. a.html.gz -> a.pdf"""
+    name = os.path.basename(html_path)
+    if name.lower().endswith('.gz'):
+        name = name[:-3]
+    return f"{Path(name).stem}.pdf"
+
+
+def page_metadata(document: Any) -> List[Dict[str, Any]]:
+    """
+    Describe each page of a laid-out WeasyPrint Document
+
+    Returns:
+        One dict per page with its 1-based 'number', 'width' and 'height'
+        in points, the 'bookmarks' (heading labels) starting on it, its
+        number of 'links' and the 'anchors' it defines
+    """
+    pages = []
+    for number, page in enumerate(document.pages, 1):
+        pages.append({
+            'number': number,
+            # Page boxes are measured in CSS pixels, 96 per inch
+            'width': round(page.width * 0.75, 2),
+            'height': round(page.height * 0.75, 2),
+            'bookmarks': [bookmark[1] for bookmark in getattr(page, 'bookmarks', [])],
+            'links': len(getattr(page, 'links', [])),
+            'anchors': sorted(getattr(page, 'anchors', {})),
+        })
+    return pages
+
+
+def render_thumbnails(pdf: bytes, width: int) -> List[bytes]:
+    """Rasterise every page of a PDF into a PNG ``width`` pixels wide (requires pypdfium2)"""
+    if pypdfium2 is None:
+        raise RuntimeError("Thumbnails require pypdfium2 (pip install pypdfium2)")
+    thumbnails = []
+    document = pypdfium2.PdfDocument(pdf)
+    try:
+        for page in document:
+            bitmap = page.render(scale=width / page.get_width())
+            buffer = io.BytesIO()
+            bitmap.to_pil().save(buffer, format='PNG', optimize=True)
+            thumbnails.append(buffer.getvalue())
+            page.close()
+    finally:
+        document.close()
+    return thumbnails
+
+
+def file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    """Return a file's (size, mtime in ns), or None if it cannot be read"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def file_sha256(path: str) -> str:
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BatchManifest:
+    """
+    Record of converted batch inputs, used to skip up-to-date PDFs
+
+    Each entry stores the input's mtime, size and SHA-256 together with the
+    PDF path and the converter's options fingerprint. A file whose mtime
+    and size are unchanged is trusted without reading it; otherwise its
+    hash decides, so touched-but-identical files are still skipped.
+    """
+
+    FILENAME = '.html_to_pdf_manifest.json'
+    # Save progress every this many recorded conversions
+    SAVE_EVERY = 100
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._unsaved = 0
+        self._stale: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get('entries', {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable batch manifest {path}: {e}")
+
+    def check(self, html_path: str, pdf_path: str, options_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Check whether ``pdf_path`` is up to date for ``html_path``
+
+        Returns:
+            None if the conversion can be skipped, otherwise the entry to
+            pass to record() once the conversion succeeded
+        """
+        key = os.path.abspath(html_path)
+        stat = os.stat(html_path)
+        entry = {'output': os.path.abspath(pdf_path), 'options': options_key,
+                 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': None}
+
+        previous = self.entries.get(key)
+        if (previous is None or previous.get('options') != options_key
+                or previous.get('output') != entry['output']
+                or not os.path.exists(pdf_path)):
+            return entry
+
+        # Fast path: unchanged metadata means unchanged content
+        if previous.get('mtime_ns') == stat.st_mtime_ns and previous.get('size') == stat.st_size:
+            return None
+
+        entry['sha256'] = file_sha256(html_path)
+        if entry['sha256'] == previous.get('sha256'):
+            # Same content, new metadata: refresh so the fast path hits next time
+            self.record(html_path, entry)
+            return None
+        return entry
+
+    def record(self, html_path: str, entry: Dict[str, Any]):
+        """Store the entry returned by check() after a successful conversion"""
+        if entry['sha256'] is None:
+            entry['sha256'] = file_sha256(html_path)
+        self.entries[os.path.abspath(html_path)] = entry
+        self._unsaved += 1
+        if self._unsaved >= self.SAVE_EVERY:
+            self.save()
+
+    def filter_stale(self, tasks: Iterable[Tuple[str, str]], options_key: str,
+                     skipped: Deque[BatchResult]) -> Iterator[Tuple[str, str]]:
+        """
+        Yield only tasks that need converting
+
+        A 'skipped' record is appended to ``skipped`` for each up-to-date
+        task. Stale tasks are remembered until mark_converted() is called
+        for them.
+        """
+        for html_path, pdf_path in tasks:
+            try:
+                entry = self.check(html_path, pdf_path, options_key)
+            except OSError:
+                # Let the conversion report the problem
+                yield html_path, pdf_path
+                continue
+            if entry is None:
+                logger.info(f"⏭️  Up to date: {os.path.basename(html_path)}")
+                skipped.append(BatchResult(html_path, pdf_path, 'skipped', 0.0,
+                                           os.path.getsize(pdf_path), None, None))
+            else:
+                self._stale[html_path] = entry
+                yield html_path, pdf_path
+
+    def mark_converted(self, html_path: str):
+        """Record a task yielded by filter_stale() as successfully converted"""
+        entry = self._stale.pop(html_path, None)
+        if entry is not None:
+            self.record(html_path, entry)
+
+    def save(self):
+        """Atomically write the manifest to disk"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'entries': self.entries}, f)
+        os.replace(temp_path, self.path)
+        self._unsaved = 0
+
+
+class OutputSink:
+    """
+    Destination of the PDFs of a batch
+
+    Sinks with a ``directory`` let workers write each PDF there in place.
+    Other sinks (archives) receive every PDF's bytes through add() in the
+    parent process as its conversion completes, so they have a single
+    writer and never see intermediate files. Sinks are context managers;
+    closing one finishes its output.
+    """
+
+    # Directory workers write PDFs into, or None to deliver them to add()
+    directory: Optional[str] = None
+
+    def add(self, name: str, pdf: bytes) -> str:
+        """Store the PDF for the relative path ``name``; return where it went"""
+        raise NotImplementedError
+
+    def close(self):
+        """Finish the output"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def member_name(name: str) -> str:
+        """Normalise a PDF path into a relative, forward-slash archive member name"""
+        member = posixpath.normpath(name.replace(os.sep, '/')).lstrip('/')
+        if member in ('', '.', '..') or member.startswith('../'):
+            raise ValueError(f"Invalid output name for an archive: {name}")
+        return member
+
+
+class DirectorySink(OutputSink):
+    """Output sink placing PDFs in a directory tree (the default)"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def add(self, name: str, pdf: bytes) -> str:
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(pdf)
+        os.replace(temp_path, path)
+        return path
+
+
+class ZipSink(OutputSink):
+    """
+    Output sink streaming PDFs into a ZIP archive
+
+    PDFs are stored uncompressed by default since their streams are
+    already compressed. ``target`` may be a non-seekable stream such as
+    stdout; zipfile then writes data descriptors instead of seeking back.
+    """
+
+    def __init__(self, target: Union[str, BinaryIO], compression: int = zipfile.ZIP_STORED):
+        """
+        Args:
+            target: Archive path or writable binary stream (left open)
+            compression: zipfile compression method of the members
+        """
+        self.compression = compression
+        self._archive = zipfile.ZipFile(target, 'w', compression=compression)
+
+    def add(self, name: str, pdf: bytes) -> str:
+        member = self.member_name(name)
+        info = zipfile.ZipInfo(member, time.localtime()[:6])
+        info.compress_type = self.compression
+        info.external_attr = 0o644 << 16
+        self._archive.writestr(info, pdf)
+        return member
+
+    def close(self):
+        self._archive.close()
+
+
+class TarSink(OutputSink):
+    """Output sink streaming PDFs into a (optionally compressed) TAR archive"""
+
+    def __init__(self, target: Union[str, BinaryIO], compression: str = ''):
+        """
+        Args:
+            target: Archive path or writable binary stream (left open)
+            compression: '', 'gz', 'bz2' or 'xz'
+        """
+        mode = f"w|{compression}"
+        if isinstance(target, str):
+            self._archive = tarfile.open(target, mode)
+        else:
+            self._archive = tarfile.open(fileobj=target, mode=mode)
+
+    def add(self, name: str, pdf: bytes) -> str:
+        member = self.member_name(name)
+        info = tarfile.TarInfo(member)
+        info.size = len(pdf)
+        info.mtime = int(time.time())
+        info.mode = 0o644
+        self._archive.addfile(info, io.BytesIO(pdf))
+        return member
+
+    def close(self):
+        self._archive.close()
+
+
+ARCHIVE_FORMATS = {'.zip': 'zip', '.tar': 'tar', '.tar.gz': 'tar.gz', '.tgz': 'tar.gz',
+                   '.tar.bz2': 'tar.bz2', '.tar.xz': 'tar.xz'}
+
+
+def open_archive_sink(target: Union[str, BinaryIO], archive_format: Optional[str] = None) -> OutputSink:
+    """
+    Open a ZIP or TAR output sink
+
+    Args:
+        target: Archive path or writable binary stream
+        archive_format: 'zip', 'tar', 'tar.gz', 'tar.bz2' or 'tar.xz';
+            by default inferred from the path's extension
+
+    Returns:
+        ZipSink or TarSink writing to ``target``
+    """
+    if archive_format is None and isinstance(target, str):
+        lower = target.lower()
+        archive_format = next((fmt for suffix, fmt in ARCHIVE_FORMATS.items()
+                               if lower.endswith(suffix)), None)
+    if archive_format == 'zip':
+        return ZipSink(target)
+    if archive_format in ('tar', 'tar.gz', 'tar.bz2', 'tar.xz'):
+        return TarSink(target, archive_format[4:])
+    raise ValueError(f"Unknown archive format for {target}: use one of "
+                     f"{', '.join(sorted(set(ARCHIVE_FORMATS.values())))}")
+
+
+_REFERENCE_RE = re.compile(
+    rb'(?:\b(?:src|href|data)\s*=\s*["\']?|url\(\s*["\']?|@import\s+["\'])([^"\'\s)>]*)',
+    re.IGNORECASE)
+_ABSOLUTE_URL_RE = re.compile(rb'^(?:[a-z][a-z0-9+.\-]*:|#)', re.IGNORECASE)
+
+
+def has_relative_references(html: bytes) -> bool:
+    """Return True if the document links anything relative to its location"""
+    return any(not _ABSOLUTE_URL_RE.match(m.group(1))
+               for m in _REFERENCE_RE.finditer(html))
+
+
+class RenderCache:
+    """
+    Content-addressed on-disk cache of rendered PDFs
+
+    Entries are keyed by a hash of the HTML, the converter's options
+    fingerprint (backend, backend version, stylesheets, ...), the contents
+    of the local stylesheets, images and fonts it references and, for
+    documents with relative links, their base URL. Remote resources are
+    not part of the key. Hits touch the entry so
+    that eviction removes the least recently used PDFs first once the cache
+    grows past ``max_bytes``. The directory may be shared between worker
+    processes; hit/miss counters are per process. Each process tracks the
+    cache size from its own stores and rescans the directory at most every
+    RESCAN_SECONDS, so a shared cache overshoots ``max_bytes`` by no more
+    than what all processes store in that interval.
+    """
+
+    # Evict down to this fraction of max_bytes so every store doesn't evict
+    EVICT_TO = 0.9
+    # Pick up other processes' stores and evictions this often
+    RESCAN_SECONDS = 10.0
+
+    def __init__(self, directory: str, max_bytes: int = 1024 ** 3, link: bool = False):
+        """
+        Args:
+            directory: Cache directory, created if missing
+            max_bytes: Size above which least recently used entries are evicted
+            link: Hardlink hits into place instead of copying them. Linked
+                outputs share storage with the cache, so they must be
+                replaced rather than rewritten in place; the converter
+                always replaces its outputs, and entries are made read-only
+                so that other programs writing in place fail instead of
+                corrupting them.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.link = link
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = None
+        self._scanned_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key_for(html: bytes, base_url: Optional[str], options_key: str,
+                dependencies: str = '') -> str:
+        """Return the cache key of a document, ``dependencies`` hashing its local resources"""
+        digest = hashlib.sha256()
+        for part in (options_key.encode('utf-8'), (base_url or '').encode('utf-8'), html,
+                     dependencies.encode('utf-8')):
+            # Length-prefix each part so boundaries are unambiguous
+            digest.update(len(part).to_bytes(8, 'big'))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.pdf")
+
+    def fetch(self, key: str, output_pdf_path: Union[str, BinaryIO]) -> bool:
+        """Copy or link the cached PDF for ``key`` to a path, or copy it to a stream"""
+        entry_path = self._entry_path(key)
+        if not os.path.exists(entry_path):
+            self.misses += 1
+            return False
+
+        if not isinstance(output_pdf_path, str):
+            try:
+                with open(entry_path, 'rb') as f:
+                    shutil.copyfileobj(f, output_pdf_path)
+                os.utime(entry_path)
+            except FileNotFoundError:
+                self.misses += 1
+                return False
+            self.hits += 1
+            return True
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_pdf_path)), exist_ok=True)
+        if os.path.lexists(output_pdf_path):
+            os.remove(output_pdf_path)
+        try:
+            if self.link:
+                try:
+                    os.link(entry_path, output_pdf_path)
+                except OSError:
+                    # Different filesystem or no hardlink support
+                    shutil.copyfile(entry_path, output_pdf_path)
+            else:
+                shutil.copyfile(entry_path, output_pdf_path)
+            os.utime(entry_path)
+        except FileNotFoundError:
+            # Evicted by another process in the meantime
+            self.misses += 1
+            return False
+
+        self.hits += 1
+        return True
+
+    def store(self, key: str, pdf: Union[str, bytes]):
+        """Add a freshly rendered PDF, given by path or content, to the cache"""
+        entry_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        temp_path = f"{entry_path}.{os.getpid()}.tmp"
+        if isinstance(pdf, bytes):
+            with open(temp_path, 'wb') as f:
+                f.write(pdf)
+        else:
+            shutil.copyfile(pdf, temp_path)
+        if self.link:
+            os.chmod(temp_path, 0o444)
+        os.replace(temp_path, entry_path)
+
+        if self._size is None or time.monotonic() - self._scanned_at >= self.RESCAN_SECONDS:
+            self._size = self._scan_size()
+            self._scanned_at = time.monotonic()
+        else:
+            self._size += os.path.getsize(entry_path)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _iter_entries(self) -> Iterator[os.DirEntry]:
+        for bucket in os.scandir(self.directory):
+            if bucket.is_dir():
+                for entry in os.scandir(bucket.path):
+                    if entry.name.endswith('.pdf'):
+                        yield entry
+
+    def _scan_size(self) -> int:
+        size = 0
+        for entry in self._iter_entries():
+            try:
+                size += entry.stat().st_size
+            except FileNotFoundError:
+                # Evicted by another process during the scan
+                pass
+        return size
+
+    def evict(self):
+        """Remove least recently used entries until under the size limit"""
+        entries = []
+        for entry in self._iter_entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+
+        size = sum(entry[1] for entry in entries)
+        target = self.max_bytes * self.EVICT_TO
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+        self._size = size
+        self._scanned_at = time.monotonic()
+
+    def stats(self) -> Dict[str, int]:
+        """Return this process's hit, miss and eviction counters"""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+_MAX_AGE_RE = re.compile(r'\bmax-age\s*=\s*"?(\d+)', re.IGNORECASE)
+
+
+# Where the latest response fetched on this thread came from, see
+# ThreadSafeURLFetcher._report_origin()
+_fetch_origin = threading.local()
+
+
+def pop_fetch_origin() -> Tuple[Optional[str], Optional[str]]:
+    """
+    Return and reset the origin reported for this thread's latest fetch
+
+    Returns:
+        (source, cache): e.g. ('cache', 'hit'), ('prefetch', 'miss') or
+        (None, None) if no fetcher in the chain reported one
+    """
+    origin = (getattr(_fetch_origin, 'source', None), getattr(_fetch_origin, 'cache', None))
+    _fetch_origin.source = _fetch_origin.cache = None
+    return origin
+
+
+class ThreadSafeURLFetcher(URLFetcher or object):
+    """
+    Base of this module's URL fetchers, safe to share between threads
+
+    WeasyPrint's URLFetcher hands a redirected request from ``open()`` to
+    ``fetch()`` through an instance attribute. It is kept per thread here,
+    so concurrent fetches through one fetcher (PrefetchingURLFetcher
+    downloads next to the render) cannot pick up each other's requests.
+    Statistics counters are updated through ``_count()``, and fetchers
+    that answer from somewhere other than the network say so through
+    ``_report_origin()`` for ResourceRecorder.
+    """
+
+    _counter_lock = threading.Lock()
+
+    @property
+    def _request(self) -> Any:
+        return getattr(self._thread_state(), 'request', None)
+
+    @_request.setter
+    def _request(self, request: Any):
+        self._thread_state().request = request
+
+    def _thread_state(self) -> threading.local:
+        state = self.__dict__.get('_thread_local')
+        if state is None:
+            # setdefault is atomic: racing threads end up sharing one object
+            state = self.__dict__.setdefault('_thread_local', threading.local())
+        return state
+
+    def _count(self, counter: str, amount: int = 1):
+        """Add ``amount`` to the statistics counter attribute ``counter``"""
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    @staticmethod
+    def _report_origin(source: str, cache: Optional[str] = None):
+        """Record where the response of the current fetch came from, see pop_fetch_origin()"""
+        _fetch_origin.source = source
+        _fetch_origin.cache = cache
+
+
+class CachingURLFetcher(ThreadSafeURLFetcher):
+    """
+    WeasyPrint URL fetcher backed by an on-disk HTTP cache
+
+    Remote fonts, stylesheets and images are stored on disk with their
+    ETag and Last-Modified validators. Entries are served without any
+    request while fresh (Cache-Control max-age, else ``max_age``), then
+    revalidated with a conditional request; a 304 answer serves the stored
+    body again. If the network or the server fails (5xx), a stale entry is
+    served instead of an error. In offline replay mode only the cache is used: misses fail
+    like any unreachable resource and nothing goes over the network.
+
+    Non-HTTP URLs (file:, data:) are fetched as usual. The cache directory
+    may be shared between worker processes; counters are per process.
+    """
+
+    # Response headers kept with a cached body
+    STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Cache-Control')
+
+    def __init__(self, cache_directory: str, offline: bool = False,
+                 max_age: int = 24 * 60 * 60, **options):
+        """
+        Args:
+            cache_directory: Cache directory, created if missing
+            offline: Serve only from the cache, never touch the network
+            max_age: Seconds an entry is fresh when the server sets no max-age
+            **options: Passed to weasyprint.urls.URLFetcher (timeout, ...)
+        """
+        if URLFetcher is None:
+            raise RuntimeError("CachingURLFetcher requires WeasyPrint with URLFetcher support")
+        super().__init__(**options)
+        self.cache_directory = cache_directory
+        self.offline = offline
+        self.max_age = max_age
+        self._options = options
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.stale = 0
+        os.makedirs(cache_directory, exist_ok=True)
+
+    def __reduce__(self):
+        # The urllib handlers hold SSL contexts and sockets; rebuild them
+        # in the receiving process (e.g. pool workers) instead of pickling
+        return (_rebuild_caching_url_fetcher,
+                (self.cache_directory, self.offline, self.max_age, self._options))
+
+    def _entry_path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_directory, key[:2], key)
+
+    def _load_entry(self, url: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(f"{self._entry_path(url)}.json", encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if os.path.exists(f"{self._entry_path(url)}.body") else None
+
+    def _save_entry(self, url: str, entry: Dict[str, Any], body: Optional[bytes] = None):
+        path = self._entry_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Body first, so metadata never points at a missing or older body
+        files = [('.body', body)] if body is not None else []
+        files.append(('.json', json.dumps(entry).encode('utf-8')))
+        for suffix, data in files:
+            temp_path = f"{path}{suffix}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, f"{path}{suffix}")
+
+    def _freshness(self, headers) -> Optional[int]:
+        """Return how long a response stays fresh, or None if it must not be stored"""
+        cache_control = (headers.get('Cache-Control') or '').lower()
+        if 'no-store' in cache_control:
+            return None
+        if 'no-cache' in cache_control:
+            return 0
+        match = _MAX_AGE_RE.search(cache_control)
+        return int(match.group(1)) if match else self.max_age
+
+    def _cached_response(self, url: str, entry: Dict[str, Any]) -> "URLFetcherResponse":
+        with open(f"{self._entry_path(url)}.body", 'rb') as f:
+            body = f.read()
+        return URLFetcherResponse(entry['url'], body, entry['headers'], 200)
+
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> "URLFetcherResponse":
+        if not url.lower().startswith(('http://', 'https://')):
+            return super().fetch(url, headers)
+
+        entry = self._load_entry(url)
+        if entry is not None and (
+                self.offline or time.time() < entry['stored_at'] + entry['max_age']):
+            self._count('hits')
+            self._report_origin('cache', 'hit')
+            return self._cached_response(url, entry)
+        if self.offline:
+            self._count('misses')
+            self._report_origin('network', 'miss')
+            raise ValueError(f"Not in URL cache (offline replay): {url}")
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            if entry['headers'].get('ETag'):
+                request_headers['If-None-Match'] = entry['headers']['ETag']
+            if entry['headers'].get('Last-Modified'):
+                request_headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        try:
+            response = super().fetch(url, request_headers)
+        except urllib.error.HTTPError as e:
+            if entry is None or (e.code != 304 and e.code < 500):
+                raise
+            if e.code >= 500:
+                logger.warning(f"⚠️ Serving stale cached copy of {url}: {e}")
+                self._count('stale')
+                self._report_origin('stale-cache', 'hit')
+                return self._cached_response(url, entry)
+            # Not modified: keep the body, restart its freshness lifetime
+            self._count('revalidations')
+            self._report_origin('revalidated', 'hit')
+            max_age = self._freshness(e.headers)
+            entry.update(stored_at=time.time(),
+                         max_age=entry['max_age'] if max_age is None else max_age)
+            self._save_entry(url, entry)
+            return self._cached_response(url, entry)
+        except OSError as e:
+            if entry is None:
+                raise
+            logger.warning(f"⚠️ Serving stale cached copy of {url}: {e}")
+            self._count('stale')
+            self._report_origin('stale-cache', 'hit')
+            return self._cached_response(url, entry)
+
+        self._count('misses')
+        self._report_origin('network', 'miss')
+        try:
+            body = response.read()
+        finally:
+            response.close()
+        max_age = self._freshness(response.headers)
+        stored_headers = {name: response.headers[name] for name in self.STORED_HEADERS
+                          if response.headers.get(name)}
+        if max_age is not None:
+            self._save_entry(url, {'url': response.url, 'headers': stored_headers,
+                                   'stored_at': time.time(), 'max_age': max_age}, body)
+        return URLFetcherResponse(response.url, body, response.headers, response.status)
+
+    def stats(self) -> Dict[str, int]:
+        """Return this process's hit, miss, revalidation and stale counters"""
+        return {'hits': self.hits, 'misses': self.misses,
+                'revalidations': self.revalidations, 'stale': self.stale}
+
+
+def _rebuild_caching_url_fetcher(cache_directory: str, offline: bool, max_age: int,
+                                 options: Dict[str, Any]) -> CachingURLFetcher:
+    return CachingURLFetcher(cache_directory, offline=offline, max_age=max_age, **options)
+
+
+# Base64 may be wrapped over several lines; only URIs running up to their
+# closing quote, parenthesis or tag end are rewritten, never a fragment of one
+_DATA_URI_RE = re.compile(
+    r'data:(image/[\w.+-]+)((?:;[\w.+-]+=[\w.+-]+)*);base64,([A-Za-z0-9+/\s]+=*\s*)(?=["\')>])')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+class InlineImageCache:
+    """
+    Decode inline images shared by many documents once per process
+
+    Before rendering, base64 ``data:image/...`` URIs of at least
+    ``min_bytes`` are replaced by short content-addressed
+    ``inline-image:<sha256>`` URLs served by a wrapping URL fetcher. As
+    those URLs never change meaning, WeasyPrint's image cache entries for
+    them are kept across documents, so a logo embedded in every report is
+    decoded and loaded by Pillow once instead of once per document, and the
+    parser no longer carries the base64 text.
+
+    The image caches also keep local (file:) images, including their
+    downsampled and recompressed data (see max_dpi and jpeg_quality), until
+    the file's size or mtime changes. Remote images are loaded again for
+    every document: WeasyPrint looks images up by URL before fetching
+    them, so a changed remote image could not be noticed without a
+    request.
+
+    Decoded images are kept in memory, or in ``directory`` when given. The
+    directory may be shared by worker processes and across runs: images
+    found there are not decoded again and do not stay in memory.
+    """
+
+    SCHEME = 'inline-image:'
+
+    def __init__(self, directory: Optional[str] = None, min_bytes: int = 1024,
+                 max_memory_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            directory: Optional directory for decoded images, created if missing
+            min_bytes: Smaller data URIs are left in the document
+            max_memory_bytes: Decoded images kept in memory before the
+                in-process caches are cleared
+        """
+        if URLFetcher is None:
+            raise RuntimeError("InlineImageCache requires WeasyPrint with URLFetcher support")
+        self.directory = directory
+        self.min_bytes = min_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.hits = 0
+        self.misses = 0
+        self._reset()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _reset(self):
+        # MIME type per key; payloads only in memory mode
+        self._types: Dict[str, str] = {}
+        self._payloads: Dict[str, bytes] = {}
+        self._memory_bytes = 0
+        # WeasyPrint image caches, one per converter options fingerprint
+        self._image_caches: Dict[str, "_InlineImageDict"] = {}
+        self._fetcher = None
+
+    def __getstate__(self):
+        # Worker processes start with empty caches
+        state = self.__dict__.copy()
+        state.update(_types={}, _payloads={}, _memory_bytes=0, _image_caches={}, _fetcher=None)
+        return state
+
+    def _payload_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def rewrite(self, html: str) -> str:
+        """Return ``html`` with large inline images replaced by cache URLs"""
+        # Only clear between documents: the previous one is fully written
+        in_memory = self._memory_bytes + sum(
+            cache.nbytes for cache in self._image_caches.values())
+        if in_memory > self.max_memory_bytes:
+            self._reset()
+        return _DATA_URI_RE.sub(self._replace, html)
+
+    def _replace(self, match: "re.Match") -> str:
+        data = _WHITESPACE_RE.sub('', match.group(3))
+        if len(data) < self.min_bytes:
+            return match.group(0)
+        mime_type = match.group(1)
+        # Hashing the base64 text avoids decoding already known images
+        key = hashlib.sha256(f"{mime_type};{data}".encode('ascii')).hexdigest()
+        if key in self._types or (self.directory and os.path.exists(self._payload_path(key))):
+            self.hits += 1
+        else:
+            try:
+                # Browsers accept data URIs without trailing padding
+                payload = base64.b64decode(data + '=' * (-len(data) % 4))
+            except ValueError:
+                return match.group(0)
+            self.misses += 1
+            if self.directory:
+                path = self._payload_path(key)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(payload)
+                os.replace(temp_path, path)
+            else:
+                self._payloads[key] = payload
+                self._memory_bytes += len(payload)
+        self._types[key] = mime_type
+        return f"{self.SCHEME}{key}"
+
+    def payload(self, url: str) -> Tuple[str, bytes]:
+        """Return the MIME type and decoded bytes behind a cache URL"""
+        key = url[len(self.SCHEME):]
+        if key not in self._types:
+            raise ValueError(f"Unknown inline image: {url}")
+        if key in self._payloads:
+            return self._types[key], self._payloads[key]
+        with open(self._payload_path(key), 'rb') as f:
+            return self._types[key], f.read()
+
+    def url_fetcher(self, fallback: Optional[Any] = None) -> Any:
+        """Return a URL fetcher serving cache URLs and delegating the rest to ``fallback``"""
+        if self._fetcher is None or self._fetcher.fallback is not fallback:
+            self._fetcher = _InlineImageFetcher(self, fallback)
+        return self._fetcher
+
+    def image_cache(self, options_key: str) -> "_InlineImageDict":
+        """Return the WeasyPrint image cache shared by documents rendered with ``options_key``"""
+        if options_key not in self._image_caches:
+            self._image_caches[options_key] = _InlineImageDict()
+        cache = self._image_caches[options_key]
+        cache.revalidate()
+        return cache
+
+    def stats(self) -> Dict[str, int]:
+        """Return this process's hit and miss counters"""
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class _InlineImageDict(dict):
+    """WeasyPrint image cache keeping InlineImageCache URLs and unchanged local images"""
+
+    # Size of the image data kept by the last release()
+    nbytes = 0
+
+    def __init__(self):
+        super().__init__()
+        # file: URL -> stamp of the file when its entry was kept
+        self.stamps: Dict[str, Optional[Tuple[int, int]]] = {}
+
+    @staticmethod
+    def _path(url: str) -> str:
+        return urllib.request.url2pathname(urllib.parse.urlsplit(url).path)
+
+    def _keeps(self, url: str) -> bool:
+        if url.startswith(InlineImageCache.SCHEME):
+            return True
+        if not url.startswith('file:'):
+            return False
+        stamp = file_stamp(self._path(url))
+        return stamp is not None and self.stamps.setdefault(url, stamp) == stamp
+
+    def _drop(self, urls: Iterable[str], keep: bool = False):
+        """Drop the entries of ``urls``, or with ``keep`` those of every other URL"""
+        urls = set(urls)
+        # Image data is stored under '<md5 of the URL>-<slot>-<dpi>' keys
+        ids = {hashlib.md5(url.encode()).hexdigest() for url in urls}
+        for key in list(self):
+            if (key in urls or key.split('-', 1)[0] in ids) != keep:
+                del self[key]
+        self.nbytes = sum(len(value) for value in self.values() if isinstance(value, bytes))
+
+    def revalidate(self):
+        """Drop local images whose file changed since they were kept"""
+        changed = [url for url, stamp in self.stamps.items()
+                   if file_stamp(self._path(url)) != stamp]
+        for url in changed:
+            del self.stamps[url]
+        if changed:
+            self._drop(changed)
+
+    def release(self):
+        """Drop the entries of other URLs, which may change between documents"""
+        self._drop([key for key in self if self._keeps(key)], keep=True)
+
+
+class _InlineImageFetcher(ThreadSafeURLFetcher):
+    """URL fetcher serving InlineImageCache URLs"""
+
+    def __init__(self, images: InlineImageCache, fallback: Optional[Any] = None):
+        super().__init__()
+        self.images = images
+        self.fallback = fallback
+        if fallback is not None:
+            self._fail_on_errors = getattr(fallback, '_fail_on_errors', False)
+
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> "URLFetcherResponse":
+        if url.startswith(InlineImageCache.SCHEME):
+            mime_type, body = self.images.payload(url)
+            return URLFetcherResponse(url, body, {'Content-Type': mime_type})
+        if self.fallback is not None:
+            return self.fallback.fetch(url, headers)
+        return super().fetch(url, headers)
+
+
+# 1x1 transparent PNG served in place of blocked resources
+TRANSPARENT_PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNgYGBgAAAABQABeqhXUAAAAABJRU5ErkJggg==')
+
+
+class RestrictedURLFetcher(ThreadSafeURLFetcher):
+    """
+    URL fetcher that only lets allowlisted hosts reach the network
+
+    Remote (http, https, ftp) URLs whose host matches none of the ``allow``
+    glob patterns never open a connection or resolve a name. They are
+    answered at once from ``url_map``, a mapping of URL prefixes to local
+    files or directories, or else with a transparent 1x1 PNG, which
+    WeasyPrint draws as nothing and ignores as a stylesheet or font. With
+    an empty allowlist nothing remote is fetched at all (offline mode).
+
+    Allowed URLs go to ``fallback`` (e.g. a CachingURLFetcher) if given.
+    ``blocked`` counts rejected URLs in this process.
+    """
+
+    REMOTE_SCHEMES = ('http', 'https', 'ftp')
+
+    def __init__(self, allow: Optional[Iterable[str]] = None,
+                 url_map: Optional[Dict[str, str]] = None,
+                 fallback: Optional[Any] = None, **options):
+        """
+        Args:
+            allow: Host glob patterns allowed to be fetched, e.g. ``*.example.com``
+            url_map: URL prefix -> local file, or directory the rest of the
+                URL path is resolved in
+            fallback: URL fetcher for allowed URLs
+            **options: Passed to weasyprint.urls.URLFetcher (timeout, ...)
+        """
+        if URLFetcher is None:
+            raise RuntimeError("RestrictedURLFetcher requires WeasyPrint with URLFetcher support")
+        super().__init__(**options)
+        self.allow = [pattern.lower() for pattern in allow or []]
+        # Longest prefix first so specific mappings win
+        self.url_map = dict(sorted((url_map or {}).items(), key=lambda item: -len(item[0])))
+        self.fallback = fallback
+        self._options = options
+        self.blocked = 0
+        self.mapped = 0
+        self._reported = set()
+
+    def __reduce__(self):
+        # See CachingURLFetcher.__reduce__
+        return (_rebuild_restricted_url_fetcher,
+                (self.allow, self.url_map, self.fallback, self._options))
+
+    def is_allowed(self, url: str) -> bool:
+        """Return True if ``url`` may be fetched over the network"""
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme.lower() not in self.REMOTE_SCHEMES:
+            return True
+        host = (parts.hostname or '').lower()
+        return any(fnmatch.fnmatchcase(host, pattern) for pattern in self.allow)
+
+    def _mapped_path(self, url: str) -> Optional[str]:
+        for prefix, local_path in self.url_map.items():
+            if url.startswith(prefix):
+                if os.path.isdir(local_path):
+                    rest = urllib.parse.unquote(urllib.parse.urlsplit(url[len(prefix):]).path)
+                    local_path = os.path.join(local_path, rest.lstrip('/'))
+                return local_path if os.path.isfile(local_path) else None
+        return None
+
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> "URLFetcherResponse":
+        if self.is_allowed(url):
+            if self.fallback is not None:
+                return self.fallback.fetch(url, headers)
+            return super().fetch(url, headers)
+
+        self._count('blocked')
+        self._report_origin('blocked')
+        local_path = self._mapped_path(url)
+        if url not in self._reported:
+            self._reported.add(url)
+            logger.warning(f"🚫 Blocked {url}" + (f" (using {local_path})" if local_path else ""))
+        if local_path is not None:
+            self._count('mapped')
+            with open(local_path, 'rb') as f:
+                body = f.read()
+            mime_type = mimetypes.guess_type(local_path)[0] or 'application/octet-stream'
+            return URLFetcherResponse(url, body, {'Content-Type': mime_type})
+        return URLFetcherResponse(url, TRANSPARENT_PNG, {'Content-Type': 'image/png'})
+
+    def stats(self) -> Dict[str, int]:
+        """Return this process's blocked and mapped counters"""
+        return {'blocked': self.blocked, 'mapped': self.mapped}
+
+
+def _rebuild_restricted_url_fetcher(allow: List[str], url_map: Dict[str, str],
+                                    fallback: Optional[Any],
+                                    options: Dict[str, Any]) -> RestrictedURLFetcher:
+    return RestrictedURLFetcher(allow, url_map, fallback, **options)
+
+
+def url_policy_options(url_fetcher: Optional[Any]) -> Dict[str, Any]:
+    """Return the settings of a fetcher chain that change which resources a document gets"""
+    options = {}
+    restricted = find_url_fetcher(url_fetcher, RestrictedURLFetcher)
+    if restricted is not None:
+        options['allow'] = sorted(restricted.allow)
+        options['url_map'] = {prefix: os.path.abspath(path)
+                              for prefix, path in sorted(restricted.url_map.items())}
+    font_mirror = find_url_fetcher(url_fetcher, LocalFontMirror)
+    if font_mirror is not None:
+        options['font_mirror'] = os.path.abspath(font_mirror.directory)
+    return options
+
+
+def find_url_fetcher(url_fetcher: Optional[Any], fetcher_class: type) -> Optional[Any]:
+    """Return the first ``fetcher_class`` instance in a chain of fallback fetchers"""
+    while url_fetcher is not None:
+        if isinstance(url_fetcher, fetcher_class):
+            return url_fetcher
+        url_fetcher = getattr(url_fetcher, 'fallback', None)
+    return None
+
+
+_RESOURCE_TAG_RE = re.compile(r'<(img|image|link|source)\b[^>]*>', re.IGNORECASE)
+_RESOURCE_ATTR_RE = re.compile(r'\b(?:src|href)\s*=\s*["\']?([^"\'\s>]+)', re.IGNORECASE)
+_CSS_URL_RE = re.compile(r'url\(\s*["\']?([^"\')\s]+)|@import\s+["\']([^"\']+)', re.IGNORECASE)
+
+
+def find_resource_urls(text: str, base_url: Optional[str] = None) -> List[str]:
+    """
+    Return the remote (http/https) resource URLs referenced by HTML or CSS
+
+    Covers stylesheet ``<link>``s, ``<img>``/``<image>``/``<source>``
+    sources, ``url(...)`` and ``@import``; links to other documents are
+    not resources and are left out.
+    """
+    urls = {}
+    for reference in _resource_references(text):
+        url = urllib.parse.urljoin(base_url, reference) if base_url else reference
+        if url.lower().startswith(('http://', 'https://')):
+            urls[url.split('#', 1)[0]] = None
+    return list(urls)
+
+
+def _resource_references(text: str) -> List[str]:
+    """Return the raw resource references of HTML or CSS, see find_resource_urls()"""
+    references = []
+    for tag in _RESOURCE_TAG_RE.finditer(text):
+        if tag.group(1).lower() == 'link' and 'stylesheet' not in tag.group(0).lower():
+            continue
+        references.extend(unescape(value) for value in _RESOURCE_ATTR_RE.findall(tag.group(0)))
+    for match in _CSS_URL_RE.finditer(text):
+        references.append(match.group(1) or match.group(2))
+    return references
+
 
-    def __init__(self, output_directory: str = "./pdf_outputs"):
-        self.output_directory = output_directory
-        self.ensure_output_directory()
+def find_local_resources(text: str, base_url: Optional[str] = None) -> List[str]:
+    """
+    Return the paths of the local files HTML or CSS uses as resources
 
-    def ensure_output_directory(self):
-        """Create output directory if it doesn't exist"""
-        os.makedirs(self.output_directory, exist_ok=True)
-        logger.info(f"Output directory: {self.output_directory}")
+    Relative references resolve against ``base_url`` when it is a path or
+    a file: URL; file: references are taken as they are. Remote and data:
+    references are left out.
+    """
+    base_path = None
+    if base_url:
+        if base_url.lower().startswith('file:'):
+            base_path = urllib.request.url2pathname(urllib.parse.urlsplit(base_url).path)
+        elif not re.match(r'^[a-zA-Z][a-zA-Z0-9+.-]+:', base_url):
+            base_path = base_url
 
-    def convert_html_file_to_pdf(self, html_file_path: str, output_pdf_path: Optional[str] = None) -> str:
-        """
-        Convert an HTML file to PDF
+    paths = {}
+    for reference in _resource_references(text):
+        reference = reference.split('#', 1)[0]
+        if reference.lower().startswith('file:'):
+            path = urllib.request.url2pathname(urllib.parse.urlsplit(reference).path)
+        elif reference and base_path and not re.match(r'^[a-zA-Z][a-zA-Z0-9+.-]+:', reference):
+            path = os.path.join(os.path.dirname(base_path),
+                                urllib.parse.unquote(reference.split('?', 1)[0]))
+        else:
+            continue
+        paths[os.path.normpath(path)] = None
+    return list(paths)
 
-        Args:
-            html_file_path: Path to the HTML file
-            output_pdf_path: Optional output PDF path. If None, auto-generated.
 
-        Returns:
-            Path to the generated PDF file
+def local_resources_digest(documents: Iterable[Tuple[str, Optional[str]]]) -> str:
+    """
+    Hash the contents of the local stylesheets, images and fonts documents use
+
+    Args:
+        documents: (HTML or CSS text, base URL) pairs. Local stylesheets
+            they reference are followed through their own ``url()`` and
+            ``@import`` references.
+
+    Returns:
+        A hex digest, or '' when no local file is referenced. Missing files
+        hash as missing, so creating one later changes the digest too.
+    """
+    digest = hashlib.sha256()
+    seen = set()
+    pending = list(documents)
+    while pending:
+        text, base_url = pending.pop(0)
+        for path in find_local_resources(text, base_url):
+            if path in seen:
+                continue
+            seen.add(path)
+            try:
+                content_hash = file_sha256(path)
+            except OSError:
+                content_hash = 'missing'
+            digest.update(f"{path}\0{content_hash}\0".encode('utf-8', 'surrogateescape'))
+            if content_hash != 'missing' and path.lower().endswith('.css'):
+                try:
+                    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                        pending.append((f.read(), path))
+                except OSError:
+                    pass
+    return digest.hexdigest() if seen else ''
+
+
+class PrefetchingURLFetcher(ThreadSafeURLFetcher):
+    """
+    URL fetcher that downloads a document's remote resources in parallel
+
+    WeasyPrint requests stylesheets, fonts and images one at a time while
+    it builds the document. ``prefetch()`` scans the markup first and
+    starts every remote download on a thread pool, following stylesheets
+    one level down to the fonts and images they reference. Rendering then
+    picks responses up from the prefetched set, waiting only for those
+    still in flight, so latencies overlap with each other and with parsing
+    and layout.
+
+    ``prefetch_ahead()`` names the document rendered after the current
+    one (e.g. the next batch job); its downloads start right after the
+    current document's and run while it renders. ``discard()`` at the end
+    of a document drops the responses it did not use but keeps those of
+    the next one.
+
+    Downloads go to ``fallback`` (e.g. a CachingURLFetcher or
+    RestrictedURLFetcher) when given, and otherwise over keep-alive HTTP
+    connections pooled per thread and host, or through urllib when a proxy
+    is configured for the URL. A failed prefetch is retried through the
+    regular path when rendering asks for the resource. URLs a
+    RestrictedURLFetcher in the chain would block are not prefetched.
+    """
+
+    MAX_REDIRECTS = 5
+    REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+    def __init__(self, fallback: Optional[Any] = None, max_workers: int = 8,
+                 timeout: float = 10, **options):
         """
-        if not PDF_GENERATION_AVAILABLE:
-            raise RuntimeError(
-                "PDF generation not available. Install weasyprint or reportlab.")
+        Args:
+            fallback: URL fetcher used for downloads and non-prefetched URLs
+            max_workers: Parallel downloads per process
+            timeout: Socket timeout of pooled connections in seconds
+            **options: Passed to weasyprint.urls.URLFetcher
+        """
+        if URLFetcher is None:
+            raise RuntimeError("PrefetchingURLFetcher requires WeasyPrint with URLFetcher support")
+        super().__init__(timeout=timeout, **options)
+        self.fallback = fallback
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._options = options
+        self._headers = {'User-Agent': f'WeasyPrint {PDF_BACKEND_VERSION}', 'Accept': '*/*',
+                         'Accept-Encoding': 'gzip, deflate'}
+        self._executor = None
+        # URL -> (generation of the document it is for, download)
+        self._pending: Dict[str, Tuple[int, Future]] = {}
+        self._generation = 0
+        self._ahead: Optional[List[str]] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.prefetched = 0
+        self.hits = 0
 
-        # Check if HTML file exists
-        if not os.path.exists(html_file_path):
-            raise FileNotFoundError(f"HTML file not found: {html_file_path}")
+    def __reduce__(self):
+        # See CachingURLFetcher.__reduce__; threads and sockets stay behind too
+        return (_rebuild_prefetching_url_fetcher,
+                (self.fallback, self.max_workers, self.timeout, self._options))
 
-        # Generate output path if not provided
-        if output_pdf_path is None:
-            html_filename = Path(html_file_path).stem
-            output_pdf_path = os.path.join(
-                self.output_directory, f"{html_filename}.pdf")
+    def prefetch(self, text: str, base_url: Optional[str] = None):
+        """Start downloading the remote resources referenced by ``text``, then those queued ahead"""
+        self._submit(find_resource_urls(text, base_url), True, self._generation)
+        with self._lock:
+            ahead, self._ahead = self._ahead, None
+        if ahead:
+            self._submit(ahead, True, self._generation + 1)
 
-        logger.info(f"Converting HTML file: {html_file_path}")
-        logger.info(f"Output PDF: {output_pdf_path}")
+    def prefetch_ahead(self, text: str, base_url: Optional[str] = None):
+        """Queue the resources of the document rendered after the current one"""
+        urls = find_resource_urls(text, base_url)
+        with self._lock:
+            self._ahead = urls
+
+    def _submit(self, urls: Iterable[str], follow_stylesheets: bool, generation: int):
+        restricted = find_url_fetcher(self.fallback, RestrictedURLFetcher)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers,
+                                                    thread_name_prefix='prefetch')
+            for url in urls:
+                if url in self._pending:
+                    # Keep it for the next document too
+                    started, future = self._pending[url]
+                    self._pending[url] = (max(started, generation), future)
+                    continue
+                if restricted and not restricted.is_allowed(url):
+                    continue
+                self._pending[url] = (generation, self._executor.submit(
+                    self._download, url, follow_stylesheets, generation))
+                self.prefetched += 1
 
+    def _download(self, url: str, follow_stylesheets: bool,
+                  generation: int) -> Tuple[Tuple[str, bytes, Dict[str, str], int], Optional[str]]:
+        # Runs on a download thread: keep the cache hit or miss reported
+        # there for the fetch that picks the response up
+        pop_fetch_origin()
+        if self.fallback is not None:
+            result = self._read(self.fallback.fetch(url))
+        elif self._can_pool(url):
+            result = self._http_get(url)
+        else:
+            result = self._read(super().fetch(url))
+        _, cache = pop_fetch_origin()
+
+        final_url, body, headers, _ = result
+        content_type = next((value for name, value in headers.items()
+                             if name.lower() == 'content-type'), '')
+        if follow_stylesheets and content_type.startswith('text/css'):
+            self._submit(find_resource_urls(body.decode('utf-8', 'replace'), final_url),
+                         False, generation)
+        return result, cache
+
+    @staticmethod
+    def _read(response: "URLFetcherResponse") -> Tuple[str, bytes, Dict[str, str], int]:
         try:
-            if PDF_METHOD == "weasyprint":
-                return self._convert_with_weasyprint_file(html_file_path, output_pdf_path)
-            elif PDF_METHOD == "reportlab":
-                return self._convert_with_reportlab_file(html_file_path, output_pdf_path)
+            body = response.read()
+        finally:
+            response.close()
+        return response.url, body, dict(response.headers.items()), response.status
+
+    @staticmethod
+    def _can_pool(url: str) -> bool:
+        """Whether ``url`` can go over a pooled connection rather than urllib"""
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ('http', 'https'):
+            return False
+        # Pooled connections talk to the origin directly; leave proxied
+        # requests to urllib, which honours HTTP(S)_PROXY and NO_PROXY
+        if scheme in urllib.request.getproxies():
+            return bool(parts.hostname) and bool(urllib.request.proxy_bypass(parts.hostname))
+        return True
+
+    def _connection(self, scheme: str, netloc: str, fresh: bool = False) -> http.client.HTTPConnection:
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        key = (scheme, netloc)
+        if fresh and key in connections:
+            connections.pop(key).close()
+        if key not in connections:
+            connection_class = (http.client.HTTPSConnection if scheme == 'https'
+                                else http.client.HTTPConnection)
+            connections[key] = connection_class(netloc, timeout=self.timeout)
+        return connections[key]
+
+    def _http_get(self, url: str) -> Tuple[str, bytes, Dict[str, str], int]:
+        """GET ``url`` over a pooled keep-alive connection, following redirects"""
+        for _ in range(self.MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+            for attempt in range(2):
+                connection = self._connection(parts.scheme, parts.netloc, fresh=attempt > 0)
+                try:
+                    connection.request('GET', path, headers=self._headers)
+                    response = connection.getresponse()
+                    body = response.read()
+                    break
+                except (http.client.HTTPException, OSError):
+                    # The server may have closed an idle kept-alive
+                    # connection; retry once on a fresh one
+                    if attempt:
+                        connection.close()
+                        raise
+
+            if response.status in self.REDIRECT_STATUSES and response.getheader('Location'):
+                url = urllib.parse.urljoin(url, response.getheader('Location'))
+                continue
+            if response.status >= 400:
+                raise urllib.error.HTTPError(url, response.status, response.reason,
+                                             response.headers, None)
+            encoding = (response.getheader('Content-Encoding') or '').lower()
+            if encoding == 'gzip':
+                body = gzip.decompress(body)
+            elif encoding == 'deflate':
+                try:
+                    body = zlib.decompress(body)
+                except zlib.error:
+                    body = zlib.decompress(body, -zlib.MAX_WBITS)
+            headers = {name: value for name, value in response.getheaders()
+                       if name.lower() not in ('content-encoding', 'content-length')}
+            return url, body, headers, response.status
+        raise ValueError(f"Too many redirects: {url}")
+
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> "URLFetcherResponse":
+        with self._lock:
+            generation, future = self._pending.get(url, (None, None))
+            # Responses prefetched for the next document stay for it
+            if future is not None and generation <= self._generation:
+                del self._pending[url]
+        if future is not None:
+            try:
+                (final_url, body, response_headers, status), cache = future.result()
+            except Exception as e:
+                # Retry through the regular path, which reports its own error
+                # if the resource is really unavailable
+                logger.debug(f"🔁 Prefetch of {url} failed ({e}); fetching it again")
             else:
-                raise RuntimeError(f"Unknown PDF method: {PDF_METHOD}")
-        except Exception as e:
-            logger.error(f"PDF conversion failed: {e}")
-            raise
+                self._count('hits')
+                self._report_origin('prefetch', cache)
+                return URLFetcherResponse(final_url, body, response_headers, status)
+        if self.fallback is not None:
+            return self.fallback.fetch(url, headers)
+        if future is None and self._can_pool(url):
+            final_url, body, response_headers, status = self._http_get(url)
+            return URLFetcherResponse(final_url, body, response_headers, status)
+        return super().fetch(url, headers)
 
-    def convert_html_string_to_pdf(self, html_content: str, output_pdf_path: str) -> str:
-        """
-        Convert HTML string content to PDF
+    def discard(self):
+        """Drop prefetched responses the last document did not use, keeping the next one's"""
+        with self._lock:
+            self._generation += 1
+            unused = [url for url, (generation, _) in self._pending.items()
+                      if generation < self._generation]
+            futures = [self._pending.pop(url)[1] for url in unused]
+        for future in futures:
+            future.cancel()
 
-        Args:
-            html_content: HTML content as string
-            output_pdf_path: Output PDF file path
+    def close(self):
+        """Stop the download threads"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._ahead = None
+        for _, future in pending.values():
+            future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
 
-        Returns:
-            Path to the generated PDF file
+    def stats(self) -> Dict[str, int]:
+        """Return this process's prefetched and used counters"""
+        return {'prefetched': self.prefetched, 'hits': self.hits}
+
+
+def _rebuild_prefetching_url_fetcher(fallback: Optional[Any], max_workers: int, timeout: float,
+                                     options: Dict[str, Any]) -> PrefetchingURLFetcher:
+    return PrefetchingURLFetcher(fallback, max_workers, timeout, **options)
+
+
+class LocalFontMirror(ThreadSafeURLFetcher):
+    """
+    URL fetcher answering Google Fonts stylesheet requests from local files
+
+    The mirror directory holds one folder per family (underscores read as
+    spaces) with static font files named after their style, as in Google
+    Fonts downloads (``Inter/Inter-Bold.ttf``, ``Open_Sans/OpenSans-
+    SemiBoldItalic.woff2``) or numerically (``Inter/700italic.ttf``).
+
+    A fonts.googleapis.com ``css``/``css2`` request whose families are all
+    mirrored is answered with generated ``@font-face`` rules pointing at
+    the local files, without touching the network. The rules are identical
+    for every document, so WeasyPrint registers each face once in the
+    converter's shared FontConfiguration and only looks it up afterwards;
+    ``register()`` does it up front. Other URLs go to ``fallback``.
+    """
+
+    GOOGLE_FONTS_HOST = 'fonts.googleapis.com'
+    # Preference order in generated src lists; TrueType needs no decoding
+    FONT_FORMATS = {'.ttf': 'truetype', '.otf': 'opentype', '.woff': 'woff', '.woff2': 'woff2'}
+    STYLE_WEIGHTS = {'thin': 100, 'extralight': 200, 'light': 300, 'regular': 400,
+                     'medium': 500, 'semibold': 600, 'bold': 700, 'extrabold': 800,
+                     'black': 900}
+
+    def __init__(self, directory: str, fallback: Optional[Any] = None, **options):
         """
-        if not PDF_GENERATION_AVAILABLE:
-            raise RuntimeError(
-                "PDF generation not available. Install weasyprint or reportlab.")
+        Args:
+            directory: Mirror directory, one folder per font family
+            fallback: URL fetcher for everything the mirror does not serve
+            **options: Passed to weasyprint.urls.URLFetcher
+        """
+        if URLFetcher is None:
+            raise RuntimeError("LocalFontMirror requires WeasyPrint with URLFetcher support")
+        super().__init__(**options)
+        self.directory = directory
+        self.fallback = fallback
+        self._options = options
+        self.served = 0
+        # Lowercase family -> (family, {(weight, style): [font paths]})
+        self.families: Dict[str, Tuple[str, Dict[Tuple[int, str], List[str]]]] = {}
+        self._scan()
 
-        logger.info(
-            f"Converting HTML content ({len(html_content)} characters)")
-        logger.info(f"Output PDF: {output_pdf_path}")
+    def __reduce__(self):
+        # See CachingURLFetcher.__reduce__
+        return (_rebuild_local_font_mirror, (self.directory, self.fallback, self._options))
 
-        try:
-            if PDF_METHOD == "weasyprint":
-                return self._convert_with_weasyprint_string(html_content, output_pdf_path)
-            elif PDF_METHOD == "reportlab":
-                return self._convert_with_reportlab_string(html_content, output_pdf_path)
-            else:
-                raise RuntimeError(f"Unknown PDF method: {PDF_METHOD}")
-        except Exception as e:
-            logger.error(f"PDF conversion failed: {e}")
-            raise
+    def _scan(self):
+        for family_entry in sorted(os.scandir(self.directory), key=lambda entry: entry.name):
+            if not family_entry.is_dir():
+                continue
+            family = family_entry.name.replace('_', ' ')
+            faces: Dict[Tuple[int, str], List[str]] = collections.defaultdict(list)
+            for font_entry in sorted(os.scandir(family_entry.path), key=lambda entry: entry.name):
+                stem, extension = os.path.splitext(font_entry.name)
+                face = self._parse_style(stem.rsplit('-', 1)[-1])
+                if extension.lower() not in self.FONT_FORMATS or face is None:
+                    logger.debug(f"Skipping unrecognised font file {font_entry.path}")
+                    continue
+                faces[face].append(os.path.abspath(font_entry.path))
+            if faces:
+                self.families[family.lower()] = (family, dict(faces))
+        logger.info(f"Font mirror {self.directory}: {len(self.families)} families")
 
-    def _convert_with_weasyprint_file(self, html_file_path: str, output_pdf_path: str) -> str:
-        """Convert HTML file to PDF using WeasyPrint"""
-        if PDF_METHOD != "weasyprint":
-            raise RuntimeError("WeasyPrint not available")
+    @classmethod
+    def _parse_style(cls, token: str) -> Optional[Tuple[int, str]]:
+        """Return (weight, style) of a 'SemiBoldItalic' or '600italic' style name"""
+        token = token.lower()
+        style = 'normal'
+        if token.endswith('italic'):
+            token, style = token[:-len('italic')], 'italic'
+        if token.isdigit():
+            return int(token), style
+        weight = cls.STYLE_WEIGHTS.get(token or 'regular')
+        return (weight, style) if weight is not None else None
 
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(output_pdf_path), exist_ok=True)
+    def requested_families(self, url: str) -> Optional[List[str]]:
+        """Return the families of a Google Fonts stylesheet URL, or None for other URLs"""
+        parts = urllib.parse.urlsplit(url)
+        if parts.hostname != self.GOOGLE_FONTS_HOST or parts.path not in ('/css', '/css2'):
+            return None
+        families = []
+        for value in urllib.parse.parse_qs(parts.query).get('family', []):
+            # css2 repeats 'family', css separates families with '|'
+            families.extend(family.split(':', 1)[0].strip() for family in value.split('|'))
+        return [family for family in families if family]
 
-        # Convert using WeasyPrint
-        HTML(filename=html_file_path).write_pdf(output_pdf_path)
+    def font_face_css(self, families: Optional[Iterable[str]] = None) -> str:
+        """Return @font-face rules for ``families`` (all mirrored ones by default)"""
+        keys = sorted(self.families) if families is None else [family.lower() for family in families]
+        rules = []
+        for key in keys:
+            family, faces = self.families[key]
+            for (weight, style), paths in sorted(faces.items()):
+                paths = sorted(paths, key=lambda path: list(self.FONT_FORMATS).index(
+                    os.path.splitext(path)[1].lower()))
+                sources = ", ".join(
+                    f"url('{Path(path).as_uri()}') "
+                    f"format('{self.FONT_FORMATS[os.path.splitext(path)[1].lower()]}')"
+                    for path in paths)
+                rules.append(f"@font-face {{ font-family: '{family}'; font-style: {style}; "
+                             f"font-weight: {weight}; src: {sources}; }}")
+        return "\n".join(rules) + "\n"
 
-        logger.info(
-            f"✅ PDF generated successfully using WeasyPrint: {output_pdf_path}")
-        return output_pdf_path
+    def register(self, font_config: Any):
+        """Load every mirrored face into ``font_config`` ahead of the first document"""
+        CSS(string=self.font_face_css(), font_config=font_config, url_fetcher=self)
 
-    def _convert_with_weasyprint_string(self, html_content: str, output_pdf_path: str) -> str:
-        """Convert HTML string to PDF using WeasyPrint"""
-        if PDF_METHOD != "weasyprint":
-            raise RuntimeError("WeasyPrint not available")
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> "URLFetcherResponse":
+        families = self.requested_families(url)
+        if families and all(family.lower() in self.families for family in families):
+            self._count('served')
+            self._report_origin('font-mirror')
+            return URLFetcherResponse(url, self.font_face_css(families),
+                                      {'Content-Type': 'text/css; charset=utf-8'})
+        if self.fallback is not None:
+            return self.fallback.fetch(url, headers)
+        return super().fetch(url, headers)
 
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(output_pdf_path), exist_ok=True)
 
-        # Convert using WeasyPrint
-        HTML(string=html_content).write_pdf(output_pdf_path)
+def _rebuild_local_font_mirror(directory: str, fallback: Optional[Any],
+                               options: Dict[str, Any]) -> LocalFontMirror:
+    return LocalFontMirror(directory, fallback, **options)
 
-        logger.info(
-            f"✅ PDF generated successfully using WeasyPrint: {output_pdf_path}")
-        return output_pdf_path
 
-    def _convert_with_reportlab_file(self, html_file_path: str, output_pdf_path: str) -> str:
-        """Convert HTML file to PDF using ReportLab (basic conversion)"""
-        # Read HTML content
-        with open(html_file_path, 'r', encoding='utf-8') as f:
-            html_content = f.read()
+class SharedFontConfiguration(FontConfiguration or object):
+    """
+    FontConfiguration shared by all conversions of a process
 
-        return self._convert_with_reportlab_string(html_content, output_pdf_path)
+    Remembers every ``@font-face`` rule it has loaded, per URL policy
+    (allowlist, URL map, font mirror) of the fetcher it was loaded with,
+    so later documents skip the fetch, WOFF decoding and fontconfig
+    registration of faces already seen. Rules none of whose sources could
+    be fetched are not remembered: a transient network error or a
+    restrictive policy only affects the document that hit it. Local
+    (file:) sources are stamped with their size and mtime; once one changes
+    or appears, ``is_stale()`` reports it and shared_font_config() starts a
+    fresh configuration. Remote sources are treated as immutable.
+    """
 
-    def _convert_with_reportlab_string(self, html_content: str, output_pdf_path: str) -> str:
-        """Convert HTML string to PDF using ReportLab (basic conversion)"""
-        try:
-            from bs4 import BeautifulSoup
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet
-            from reportlab.lib.pagesizes import letter
-        except ImportError as e:
-            raise RuntimeError(
-                f"Required libraries not available for ReportLab conversion: {e}")
+    def __init__(self):
+        super().__init__()
+        # (rule descriptors, URL policy) -> add_font_face() result of loaded faces
+        self.font_faces: Dict[Tuple[str, str], Any] = {}
+        # Local font path -> (size, mtime) or None if missing when seen
+        self.font_sources: Dict[str, Optional[Tuple[int, int]]] = {}
+        self.hits = 0
+        self.misses = 0
+        # Faces none of whose sources could be fetched
+        self.failures = 0
+        self._lock = threading.Lock()
 
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(output_pdf_path), exist_ok=True)
+    def add_font_face(self, rule_descriptors: Dict[str, Any], url_fetcher: Any) -> Any:
+        key = (str(rule_descriptors),
+               json.dumps(url_policy_options(url_fetcher), sort_keys=True))
+        with self._lock:
+            if key in self.font_faces:
+                self.hits += 1
+                return self.font_faces[key]
+            self.misses += 1
+            for font_type, url in rule_descriptors.get('src', ()):
+                if font_type == 'external' and url and url.startswith('file:'):
+                    path = urllib.request.url2pathname(urllib.parse.urlsplit(url).path)
+                    self.font_sources[path] = file_stamp(path)
+            tracker = _FetchTracker(url_fetcher)
+            result = super().add_font_face(rule_descriptors, tracker)
+            if tracker.succeeded:
+                self.font_faces[key] = result
+            else:
+                self.failures += 1
+            return result
 
-        # Parse HTML to extract text content
-        soup = BeautifulSoup(html_content, 'html.parser')
+    def is_stale(self) -> bool:
+        """Return True if a local font source changed since it was loaded"""
+        return any(file_stamp(path) != stamp for path, stamp in self.font_sources.items())
 
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
+    def stats(self) -> Dict[str, int]:
+        """Return face cache counters"""
+        return {'faces': len(self.font_faces), 'hits': self.hits, 'misses': self.misses}
 
-        # Get text content
-        text_content = soup.get_text()
 
-        # Create PDF using ReportLab
-        doc = SimpleDocTemplate(output_pdf_path, pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
+class _FetchTracker:
+    """URL fetcher wrapper noting whether any fetch through it succeeded"""
 
-        # Add title if available
-        title_tag = soup.find('title')
-        if title_tag:
-            story.append(Paragraph(title_tag.get_text(), styles['Title']))
-            story.append(Spacer(1, 12))
+    def __init__(self, url_fetcher: Any):
+        self.url_fetcher = url_fetcher
+        self.succeeded = False
 
-        # Split content into paragraphs and add to story
-        paragraphs = text_content.split('\n\n')
-        for para in paragraphs:
-            if para.strip():
-                story.append(Paragraph(para.strip(), styles['Normal']))
-                story.append(Spacer(1, 6))
+    def __call__(self, url: str) -> Any:
+        response = self.url_fetcher(url)
+        self.succeeded = True
+        return response
 
-        # Build PDF
-        doc.build(story)
+    def __getattr__(self, name: str) -> Any:
+        # weasyprint.urls.fetch() reads settings such as _fail_on_errors
+        return getattr(self.url_fetcher, name)
 
-        logger.info(
-            f"✅ PDF generated successfully using ReportLab: {output_pdf_path}")
-        return output_pdf_path
 
-    def batch_convert_html_files(self, html_directory: str, output_directory: Optional[str] = None) -> Dict[str, str]:
-        """
-        Convert multiple HTML files in a directory to PDFs
+_shared_font_config: Optional[SharedFontConfiguration] = None
+_shared_font_config_lock = threading.Lock()
+
+
+def shared_font_config() -> SharedFontConfiguration:
+    """Return this process's SharedFontConfiguration, replacing it if stale"""
+    global _shared_font_config
+    with _shared_font_config_lock:
+        if _shared_font_config is not None and _shared_font_config.is_stale():
+            logger.info("🔄 Local font files changed, starting a new font configuration")
+            _shared_font_config = None
+        if _shared_font_config is None:
+            _shared_font_config = SharedFontConfiguration()
+        return _shared_font_config
+
+
+_STYLE_BLOCK_RE = re.compile(r'<style\b([^>]*)>(.*?)</style\s*>', re.IGNORECASE | re.DOTALL)
+# Markup in which a <style> element is not a plain document stylesheet
+_NON_DOCUMENT_STYLE_RE = re.compile(
+    r'<!--.*?-->|<(svg|math|noscript|template|script)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_STYLE_TYPE_RE = re.compile(r'\btype\s*=\s*["\']?([^"\'\s>]*)', re.IGNORECASE)
+_STYLESHEET_LINK_RE = re.compile(r'<link\b[^>]*\bstylesheet\b[^>]*>', re.IGNORECASE)
+
+
+class StylesheetCache:
+    """
+    Parse each distinct ``<style>`` block once per process
+
+    Documents generated from the same template repeat the same style
+    block. ``hoist()`` takes the blocks out of the markup and returns them
+    as WeasyPrint CSS objects, kept by a hash of their text (and of the
+    base URL when they contain relative references), so tokenizing,
+    selector compilation and @font-face processing happen once per unique
+    block; the objects are passed to the render as extra stylesheets.
+
+    Stylesheets passed that way belong to the *user* cascade origin, not
+    the author origin of ``<style>``. Documents where that could change
+    the result are left alone and counted as bypassed: ones with
+    stylesheet ``<link>``s, ``media`` or non-CSS ``type`` attributes on
+    their blocks, or blocks that are not plain document stylesheets
+    (inside inline ``<svg>``, comments, ``<noscript>``, ``<template>``
+    ...), and (see HTMLToPDFConverter) conversions with extra stylesheets. One
+    difference remains: ``!important`` declarations of a hoisted block
+    now win over ``!important`` ones in ``style`` attributes. Hence the
+    cache is opt-in.
+    """
 
+    def __init__(self, max_entries: int = 256):
+        """
         Args:
-            html_directory: Directory containing HTML files
-            output_directory: Optional output directory for PDFs
+            max_entries: Parsed stylesheets kept, least recently used
+                ones are dropped first
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        # Parse time of the cached stylesheets served by hits
+        self.time_saved = 0.0
+        # Key -> (CSS object, seconds it took to parse)
+        self._entries: "collections.OrderedDict[str, Tuple[Any, float]]" = collections.OrderedDict()
+        self._font_config = None
+
+    def __getstate__(self):
+        # Parsed stylesheets hold native font state; workers parse their own
+        state = self.__dict__.copy()
+        state.update(_entries=collections.OrderedDict(), _font_config=None)
+        return state
+
+    def hoist(self, html: str, base_url: Optional[str], font_config: Any,
+              url_fetcher: Optional[Any] = None) -> Tuple[str, List[Any]]:
+        """
+        Move the ``<style>`` blocks of ``html`` into cached CSS objects
 
         Returns:
-            Dictionary mapping HTML file paths to PDF file paths
+            The markup without its style blocks and the stylesheets to pass
+            to the render, or the unchanged markup and no stylesheets if
+            the document cannot be hoisted safely
         """
-        if output_directory is None:
-            output_directory = self.output_directory
+        blocks = list(_STYLE_BLOCK_RE.finditer(html))
+        if not blocks:
+            return html, []
+        nested = [match.span() for match in _NON_DOCUMENT_STYLE_RE.finditer(html)]
+        if _STYLESHEET_LINK_RE.search(html) or not all(
+                self._is_document_stylesheet(block, nested) for block in blocks):
+            self.bypassed += 1
+            return html, []
 
-        if not os.path.exists(html_directory):
-            raise FileNotFoundError(
-                f"HTML directory not found: {html_directory}")
+        # @font-face rules were registered into a specific configuration
+        if font_config is not self._font_config:
+            self._entries.clear()
+            self._font_config = font_config
 
-        html_files = [f for f in os.listdir(
-            html_directory) if f.lower().endswith('.html')]
+        stylesheets = []
+        for block in blocks:
+            text = block.group(2)
+            relative = has_relative_references(text.encode('utf-8'))
+            key = hashlib.sha256(
+                f"{base_url if relative else ''}\0{text}".encode('utf-8')).hexdigest()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.time_saved += entry[1]
+            else:
+                started = time.perf_counter()
+                css = CSS(string=text, base_url=base_url, font_config=font_config,
+                          url_fetcher=url_fetcher)
+                entry = self._entries[key] = (css, time.perf_counter() - started)
+                self.misses += 1
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            stylesheets.append(entry[0])
+        return _STYLE_BLOCK_RE.sub('', html), stylesheets
 
-        if not html_files:
-            logger.warning(f"No HTML files found in {html_directory}")
-            return {}
+    @staticmethod
+    def _is_document_stylesheet(block: "re.Match", nested: List[Tuple[int, int]]) -> bool:
+        """Whether a ``<style>`` block applies as it is to the whole document"""
+        attributes = block.group(1)
+        if re.search(r'\bmedia\s*=', attributes, re.IGNORECASE):
+            return False
+        style_type = _STYLE_TYPE_RE.search(attributes)
+        if style_type and style_type.group(1).lower() not in ('', 'text/css'):
+            return False
+        return not any(start <= block.start() < end for start, end in nested)
 
-        logger.info(f"Found {len(html_files)} HTML files to convert")
+    def stats(self) -> Dict[str, Any]:
+        """Return this process's hit, miss, bypass and time saved counters"""
+        return {'hits': self.hits, 'misses': self.misses, 'bypassed': self.bypassed,
+                'time_saved': self.time_saved}
 
-        results = {}
-        for html_file in html_files:
-            html_path = os.path.join(html_directory, html_file)
-            pdf_filename = f"{Path(html_file).stem}.pdf"
-            pdf_path = os.path.join(output_directory, pdf_filename)
 
+class HTMLTemplate:
+    """
+    HTML template compiled once and rendered for many data rows
+
+    Uses Jinja2 when installed: autoescaping is on, undefined variables are
+    errors, and the template may extend or include files next to it.
+    Otherwise falls back to string.Template with ``$name`` placeholders,
+    whose values are HTML-escaped.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Path to the template file
+        """
+        self.path = path
+        # Relative links in rendered documents resolve against the template
+        self.base_url = os.path.abspath(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        if jinja2 is not None:
+            environment = jinja2.Environment(
+                loader=jinja2.FileSystemLoader(os.path.dirname(self.base_url)),
+                autoescape=True, undefined=jinja2.StrictUndefined)
+            self._template = environment.from_string(source)
+            self.engine = 'jinja2'
+        else:
+            self._template = string.Template(source)
+            self.engine = 'string.Template'
+
+    def render(self, row: Dict[str, Any]) -> str:
+        """Return the HTML of one data row"""
+        if self.engine == 'jinja2':
+            return self._template.render(**row)
+        try:
+            return self._template.substitute(
+                {key: escape(str(value)) for key, value in row.items()})
+        except KeyError as e:
+            raise ValueError(f"Missing template variable: {e.args[0]}") from None
+
+
+# Absolute template path -> (mtime, compiled template), per process
+_templates: Dict[str, Tuple[int, HTMLTemplate]] = {}
+
+
+def load_template(path: str) -> HTMLTemplate:
+    """Return the compiled template at ``path``, compiling it on first use or change"""
+    key = os.path.abspath(path)
+    mtime = os.stat(key).st_mtime_ns
+    cached = _templates.get(key)
+    if cached is None or cached[0] != mtime:
+        _templates[key] = (mtime, HTMLTemplate(path))
+        logger.info(f"Compiled template {path} ({_templates[key][1].engine})")
+    return _templates[key][1]
+
+
+def short_url(url: str, limit: int = 100) -> str:
+    """Shorten ``url`` for reports; data: URIs keep only their media type"""
+    if url.startswith('data:'):
+        return f"{url.split(',', 1)[0]},… ({len(url)} chars)"
+    return url if len(url) <= limit else f"{url[:limit - 1]}…"
+
+
+class ResourceRecorder(URLFetcher or object):
+    """
+    URL fetcher that records every resource a document loads
+
+    Wraps the document's fetcher chain and appends one entry per fetch to
+    ``records``: URL, seconds until the body was read, bytes, error, where
+    the response came from and, with a CachingURLFetcher in the chain,
+    whether it was a cache hit. Each fetcher reports the source of its
+    own response (see pop_fetch_origin()): 'prefetch' (waited for a
+    prefetched download, whose cache hit or miss is kept), 'blocked',
+    'font-mirror', 'cache' / 'revalidated' / 'stale-cache' or 'network';
+    unreported fetches are 'inline' (data: and inline images), 'local'
+    (file:) or 'network'.
+    """
+
+    def __init__(self, fallback: Any):
+        super().__init__()
+        self.fallback = fallback
+        self._fail_on_errors = getattr(fallback, '_fail_on_errors', False)
+        self.records: List[Dict[str, Any]] = []
+
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> "URLFetcherResponse":
+        pop_fetch_origin()
+        started = time.perf_counter()
+        record = {'url': short_url(url), 'seconds': 0.0, 'bytes': 0,
+                  'source': None, 'cache': None, 'error': None}
+        self.records.append(record)
+        try:
+            response = self.fallback.fetch(url, headers)
             try:
-                converted_path = self.convert_html_file_to_pdf(
-                    html_path, pdf_path)
-                results[html_path] = converted_path
-                logger.info(f"✅ Converted: {html_file} -> {pdf_filename}")
-            except Exception as e:
-                logger.error(f"❌ Failed to convert {html_file}: {e}")
-                results[html_path] = f"Error: {str(e)}"
+                body = response.read()
+            finally:
+                response.close()
+        except Exception as e:
+            record['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record['seconds'] = time.perf_counter() - started
+            source, record['cache'] = pop_fetch_origin()
+            if url.startswith(('data:', InlineImageCache.SCHEME)):
+                record['source'] = 'inline'
+            elif source is not None:
+                record['source'] = source
+            else:
+                record['source'] = 'local' if url.startswith('file:') else 'network'
+        record['bytes'] = len(body)
+        return URLFetcherResponse(response.url, body, response.headers, response.status)
 
-        return results
+
+class ResourceReport:
+    """
+    Batch-wide summary of the resources recorded by ResourceRecorder
+
+    Keeps totals per source and per host plus the slowest and largest
+    individual loads, in memory bounded by ``top``.
+    """
+
+    def __init__(self, top: int = 10):
+        self.top = top
+        self.fetches = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.sources: Dict[str, int] = collections.Counter()
+        self.cache: Dict[str, int] = collections.Counter()
+        self.hosts: Dict[str, Dict[str, Any]] = {}
+        # Min-heaps of (key, order, entry) holding the ``top`` largest keys
+        self._slowest: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._largest: List[Tuple[int, int, Dict[str, Any]]] = []
+        self._order = itertools.count()
+
+    def add(self, result: BatchResult):
+        """Fold the resources of one batch record into the report"""
+        self.add_records(result.input, result.resources)
+
+    def add_records(self, document: str, records: Optional[Iterable[Dict[str, Any]]]):
+        """Fold the resources ``document`` loaded (ResourceRecorder.records) into the report"""
+        for record in records or ():
+            entry = dict(record, document=document)
+            self.fetches += 1
+            self.failures += record['error'] is not None
+            self.seconds += record['seconds']
+            self.bytes += record['bytes']
+            self.sources[record['source']] += 1
+            if record['cache']:
+                self.cache[record['cache']] += 1
+
+            host = urllib.parse.urlsplit(record['url']).hostname or record['url'].split(':', 1)[0]
+            totals = self.hosts.setdefault(host, {'fetches': 0, 'seconds': 0.0,
+                                                  'bytes': 0, 'failures': 0})
+            totals['fetches'] += 1
+            totals['seconds'] += record['seconds']
+            totals['bytes'] += record['bytes']
+            totals['failures'] += record['error'] is not None
+
+            order = next(self._order)
+            for heap, key in ((self._slowest, record['seconds']), (self._largest, record['bytes'])):
+                if len(heap) < self.top:
+                    heapq.heappush(heap, (key, order, entry))
+                else:
+                    heapq.heappushpop(heap, (key, order, entry))
+
+    def track(self, results: Iterable[BatchResult]) -> Iterator[BatchResult]:
+        """Add each record to the report and pass it on"""
+        for result in results:
+            self.add(result)
+            yield result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the report as JSON-serialisable data"""
+        return {
+            'fetches': self.fetches,
+            'failures': self.failures,
+            'seconds': self.seconds,
+            'bytes': self.bytes,
+            'sources': dict(self.sources),
+            'cache': dict(self.cache),
+            'hosts': dict(sorted(self.hosts.items(), key=lambda item: -item[1]['seconds'])),
+            'slowest': [entry for _, _, entry in sorted(self._slowest, reverse=True)],
+            'largest': [entry for _, _, entry in sorted(self._largest, reverse=True)],
+        }
+
+    def format_table(self) -> str:
+        """Return a short plain-text summary for the terminal"""
+        lines = [f"📦 {self.fetches} resource fetch(es), {self.failures} failed, "
+                 f"{self.bytes / 1024:.0f} KB, {self.seconds:.2f}s fetching"]
+        if self.sources:
+            lines.append("   by source: " + ", ".join(
+                f"{count} {source}" for source, count in self.sources.most_common()))
+        for title, heap in (("Slowest", self._slowest), ("Largest", self._largest)):
+            if not heap:
+                continue
+            lines.append(f"   {title}:")
+            for _, _, entry in sorted(heap, reverse=True)[:5]:
+                status = "failed" if entry['error'] else entry['source']
+                lines.append(f"   {entry['seconds']:8.3f}s {entry['bytes'] / 1024:9.1f} KB  "
+                             f"{status:<12} {short_url(entry['url'], 60)}")
+        return "\n".join(lines)
 
 
 def create_sample_html_file(filename: str = "sample_report.html") -> str:
@@ -414,25 +4134,401 @@ def create_sample_html_file(filename: str = "sample_report.html") -> str:
     return filename
 
 
-def main():
+def write_results_jsonl(results: Iterable[BatchResult], target: IO[str]) -> Iterator[BatchResult]:
+    """Write each record as a JSON line to ``target`` and pass it on"""
+    for result in results:
+        target.write(json.dumps(result._asdict()) + "\n")
+        target.flush()
+        yield result
+
+
+def compare_profiles(converter: HTMLToPDFConverter, html_paths: Iterable[str],
+                     profiles: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Convert documents under each optimization profile and measure the outcome
+
+    PDFs are rendered in memory and discarded; the render cache is bypassed
+    so every timing is a real render.
+
+    Args:
+        converter: Converter whose other settings apply to every profile
+        html_paths: HTML files to convert
+        profiles: Profile names to compare (default: all)
+
+    Returns:
+        One dict per profile with 'profile', 'documents', 'failed',
+        'bytes' and 'seconds' totals
+    """
+    html_paths = list(html_paths)
+    converter = copy.copy(converter)
+    converter.render_cache = None
+    converter.warm_up()
+    rows = []
+    for name in profiles or OPTIMIZATION_PROFILES:
+        profiled = converter.with_options(profile=name)
+        row = {'profile': name, 'documents': 0, 'failed': 0, 'bytes': 0, 'seconds': 0.0}
+        for html_path in html_paths:
+            buffer = io.BytesIO()
+            started = time.perf_counter()
+            try:
+                profiled.convert_html_file_to_stream(html_path, buffer)
+            except Exception:
+                row['failed'] += 1
+                continue
+            row['seconds'] += time.perf_counter() - started
+            row['bytes'] += buffer.tell()
+            row['documents'] += 1
+        rows.append(row)
+    return rows
+
+
+def format_profile_comparison(rows: List[Dict[str, Any]]) -> str:
+    """Format compare_profiles() rows as a table relative to the default profile"""
+    baseline = next((row for row in rows if row['profile'] == DEFAULT_PROFILE), rows[0])
+    lines = [f"{'profile':<10} {'docs':>5} {'size':>10} {'time':>8}  vs {baseline['profile']}"]
+    for row in rows:
+        size_ratio = row['bytes'] / baseline['bytes'] if baseline['bytes'] else 0.0
+        time_ratio = row['seconds'] / baseline['seconds'] if baseline['seconds'] else 0.0
+        failed = f", {row['failed']} failed" if row['failed'] else ""
+        lines.append(f"{row['profile']:<10} {row['documents']:>5} "
+                     f"{row['bytes'] / 1024:>7.0f} KB {row['seconds']:>7.2f}s  "
+                     f"size x{size_ratio:.2f}, time x{time_ratio:.2f}{failed}")
+    return "\n".join(lines)
+
+
+def print_batch_results(results: Iterable[BatchResult]) -> BatchSummary:
+    """Print batch records as they arrive, then a summary line"""
+    summary = BatchSummary()
+    for result in results:
+        summary.add(result)
+        html_file = os.path.basename(result.input)
+        if result.status == 'error':
+            print(f"❌ {html_file}: Error: {result.error}")
+        else:
+            details = f"{result.status}, {result.duration:.2f}s"
+            if result.pages is not None:
+                details += f", {result.pages} page(s)"
+            if result.blocked:
+                details += f", {result.blocked} blocked URL(s)"
+            print(f"✅ {html_file} -> {os.path.basename(result.output)} ({details})")
+
+    print(
+        f"🎉 Batch conversion completed: {summary.succeeded}/{summary.total} files converted successfully")
+    print(f"   {summary.describe()}")
+    return summary
+
+
+def cost_window(text: str) -> Optional[int]:
+    """argparse type for --cost-window: a positive count, or 'all' for None"""
+    return None if text.lower() == 'all' else positive_int(text)
+
+
+def positive_int(text: str) -> int:
+    """argparse type for counts that must be at least 1"""
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid integer: {text}") from None
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+
+def main() -> Optional[int]:
     """Main function for command-line usage"""
     parser = argparse.ArgumentParser(description='Convert HTML files to PDF')
-    parser.add_argument('--html', type=str,
-                        help='Path to HTML file to convert')
-    parser.add_argument('--output', type=str, help='Output PDF file path')
+    parser.add_argument('--html', type=str, nargs='+',
+                        help='Path to HTML file(s) to convert, or - to read one document from stdin')
+    parser.add_argument('--output', type=str,
+                        help='Output PDF file path, or - to write the PDF to stdout')
+    parser.add_argument('--base-url', type=str,
+                        help='URL or path relative links of --html - resolve against '
+                        '(default: current directory)')
     parser.add_argument(
         '--batch', type=str, help='Directory containing HTML files for batch conversion')
+    parser.add_argument('--manifest', type=str, metavar='JOBS.jsonl',
+                        help='JSONL file with one conversion job per line')
+    parser.add_argument('--template', type=str, metavar='TEMPLATE',
+                        help='HTML template (Jinja2 if installed, else $name placeholders) rendered '
+                        'once per --data row; add --cache-stylesheets to parse its style blocks '
+                        'only once')
+    parser.add_argument('--data', type=str, metavar='ROWS.jsonl',
+                        help='JSONL file with one template data object per document')
+    parser.add_argument('--results', type=str, metavar='RESULTS.jsonl',
+                        help='Write one JSON record per converted document to this file')
     parser.add_argument('--output-dir', type=str,
                         default='./pdf_outputs', help='Output directory for PDFs')
+    parser.add_argument('--archive', type=str, metavar='ARCHIVE',
+                        help='Stream batch PDFs into a .zip or .tar[.gz|.bz2|.xz] archive instead '
+                        'of --output-dir, or - to write it to stdout')
+    parser.add_argument('--archive-format', choices=sorted(set(ARCHIVE_FORMATS.values())),
+                        help='Archive format (default: from the --archive extension)')
+    parser.add_argument('--jobs', type=positive_int, default=None,
+                        help='Worker processes for batch or multi-file conversion (default: CPU count)')
+    parser.add_argument('--no-warm-up', action='store_true',
+                        help='Do not pre-warm worker processes')
+    parser.add_argument('--job-timeout', type=float, metavar='SECONDS',
+                        help='Kill a conversion running longer than this and report it as failed')
+    parser.add_argument('--max-jobs-per-worker', type=positive_int, metavar='N',
+                        help='Restart a worker process after N conversions')
+    parser.add_argument('--max-worker-rss-mb', type=int, metavar='MB',
+                        help='Restart a worker process once its resident memory exceeds MB')
+    parser.add_argument('--worker-memory-limit-mb', type=int, metavar='MB',
+                        help='Hard address-space limit per worker process (Unix only)')
+    parser.add_argument('--no-cost-order', action='store_true',
+                        help='Dispatch batch files in discovery order instead of largest first')
+    parser.add_argument('--cost-window', type=cost_window, default=COST_WINDOW_PER_WORKER,
+                        metavar='N|all',
+                        help='Files per worker looked ahead when ordering largest first '
+                        f'(default: {COST_WINDOW_PER_WORKER}); "all" sorts the whole batch '
+                        'first, so a large file found late still starts early, but '
+                        'conversions only begin once discovery has finished')
+    parser.add_argument('--include', action='append', metavar='PATTERN',
+                        help='Glob of batch files to convert, repeatable '
+                        f'(default: {" ".join(DEFAULT_HTML_PATTERNS)})')
+    parser.add_argument('--exclude', action='append', metavar='PATTERN',
+                        help='Glob of batch files or directories to skip, repeatable')
+    parser.add_argument('--no-recursive', action='store_true',
+                        help='Only convert files directly inside the batch directory')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Skip batch files whose PDF is up to date with the batch manifest')
+    parser.add_argument('--stylesheet', action='append', metavar='CSS',
+                        help='Extra CSS file applied to every document, repeatable')
+    parser.add_argument('--cache-dir', type=str,
+                        help='Directory of a render cache reused across runs')
+    parser.add_argument('--cache-max-mb', type=int, default=1024,
+                        help='Render cache size limit in MB (default: 1024)')
+    parser.add_argument('--cache-hardlink', action='store_true',
+                        help='Hardlink cached PDFs into place instead of copying')
+    parser.add_argument('--url-cache-dir', type=str,
+                        help='Directory of an HTTP cache for remote fonts, stylesheets and images (WeasyPrint)')
+    parser.add_argument('--url-cache-max-age', type=int, default=24 * 60 * 60, metavar='SECONDS',
+                        help='Freshness of cached resources whose server sets no max-age (default: 86400)')
+    parser.add_argument('--offline', action='store_true',
+                        help='Replay remote resources from --url-cache-dir without network access')
+    parser.add_argument('--block-remote', action='store_true',
+                        help='Never fetch remote resources except from --allow-host hosts; '
+                        'blocked ones become transparent placeholders (WeasyPrint)')
+    parser.add_argument('--allow-host', action='append', metavar='PATTERN',
+                        help='Host glob remote resources may come from, repeatable '
+                        '(implies --block-remote)')
+    parser.add_argument('--map-url', action='append', metavar='PREFIX=PATH',
+                        help='Serve blocked URLs starting with PREFIX from a local file or '
+                        'directory, repeatable (implies --block-remote)')
+    parser.add_argument('--font-mirror', type=str, metavar='DIR',
+                        help='Serve Google Fonts stylesheets from local font files, one folder '
+                        'per family (WeasyPrint)')
+    parser.add_argument('--prefetch', action='store_true',
+                        help='Download each document\'s remote resources in parallel before rendering (WeasyPrint)')
+    parser.add_argument('--prefetch-workers', type=positive_int, default=8, metavar='N',
+                        help='Parallel downloads per process with --prefetch (default: 8)')
+    parser.add_argument('--resource-report', type=str, metavar='REPORT.json',
+                        help='Record every fetched resource and write a summary of the slowest '
+                        'and largest ones (WeasyPrint)')
+    parser.add_argument('--cache-stylesheets', action='store_true',
+                        help='Parse identical <style> blocks once per process; they then apply '
+                        'as user stylesheets, see StylesheetCache (WeasyPrint)')
+    parser.add_argument('--dedupe-inline-images', action='store_true',
+                        help='Decode data: URI images shared by several documents only once (WeasyPrint)')
+    parser.add_argument('--inline-image-dir', type=str,
+                        help='Directory for decoded inline images shared by workers and runs '
+                        '(implies --dedupe-inline-images)')
+    parser.add_argument('--max-dpi', type=int, metavar='DPI',
+                        help='Downsample images above DPI at their printed size (WeasyPrint)')
+    parser.add_argument('--jpeg-quality', type=int, metavar='1-95',
+                        help='Re-encode JPEG images at this quality (WeasyPrint)')
+    parser.add_argument('--profile', choices=list(OPTIMIZATION_PROFILES), default=DEFAULT_PROFILE,
+                        help='Optimization profile trading render time against PDF size: '
+                        + '; '.join(f"{name}: {profile.description}"
+                                    for name, profile in OPTIMIZATION_PROFILES.items()))
+    parser.add_argument('--compare-profiles', action='store_true',
+                        help='Convert the --html files or --batch directory in memory under every '
+                        'profile and report output size and render time')
+    parser.add_argument('--preview-pages', type=str, metavar='FIRST[-LAST]',
+                        help='Also write these pages of a single --html document as '
+                        '<name>-preview.pdf from the same layout (WeasyPrint)')
+    parser.add_argument('--page-metadata', action='store_true',
+                        help='Also write per-page sizes, bookmarks and links of a single --html '
+                        'document as <name>.pages.json (WeasyPrint)')
+    parser.add_argument('--thumbnail-width', type=int, metavar='PX',
+                        help='Also write PNG thumbnails of the preview pages, or of every page, '
+                        'as <name>-page<N>.png (WeasyPrint, requires pypdfium2)')
     parser.add_argument('--create-sample', action='store_true',
                         help='Create a sample HTML file for testing')
 
     args = parser.parse_args()
+    if args.output == '-' or args.archive == '-':
+        # The output owns stdout, so every status message goes to stderr
+        pdf_stream = sys.stdout.buffer
+        with contextlib.redirect_stdout(sys.stderr):
+            return _run_cli(args, pdf_stream)
+    return _run_cli(args)
+
+
+def read_html_input(html_path: str, base_url: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Read an HTML document given on the command line
+
+    Args:
+        html_path: Path to an HTML file (optionally gzipped), or - for stdin
+        base_url: URL or path relative links resolve against, by default
+            the file's location or, for stdin, the current directory
+
+    Returns:
+        Tuple of the HTML content and its base URL
+    """
+    if html_path == '-':
+        html_content = sys.stdin.buffer.read().decode('utf-8')
+        return html_content, base_url or os.path.join(os.getcwd(), '')
+    opener = gzip.open if html_path.lower().endswith('.gz') else open
+    with opener(html_path, 'rt', encoding='utf-8') as f:
+        return f.read(), base_url or os.path.abspath(html_path)
+
+
+def parse_page_range(text: str) -> Tuple[int, int]:
+    """Parse a 1-based 'FIRST' or 'FIRST-LAST' page range"""
+    first, separator, last = text.partition('-')
+    try:
+        page_range = (int(first), int(last if separator else first))
+    except ValueError:
+        raise ValueError(f"Invalid page range: {text}") from None
+    if not 1 <= page_range[0] <= page_range[1]:
+        raise ValueError(f"Invalid page range: {text}")
+    return page_range
+
+
+def write_artifacts(converter: HTMLToPDFConverter, html_path: str, output_pdf_path: str,
+                    base_url: Optional[str] = None, page_range: Optional[Tuple[int, int]] = None,
+                    page_metadata_file: bool = False,
+                    thumbnail_width: Optional[int] = None) -> List[str]:
+    """
+    Render a document once and write its PDF plus the requested sidecar files
+
+    Sidecars are named after ``output_pdf_path``: <name>-preview.pdf,
+    <name>.pages.json and <name>-page<N>.png.
+
+    Returns:
+        Paths of the files written
+    """
+    html_content, base_url = read_html_input(html_path, base_url)
+    artifacts = converter.render_artifacts(html_content, base_url, page_range=page_range,
+                                           thumbnail_width=thumbnail_width)
+    stem = os.path.splitext(output_pdf_path)[0]
+    outputs = [(output_pdf_path, artifacts.pdf)]
+    if artifacts.page_range_pdf is not None:
+        outputs.append((f"{stem}-preview.pdf", artifacts.page_range_pdf))
+    if page_metadata_file:
+        outputs.append((f"{stem}.pages.json",
+                        json.dumps(artifacts.pages, indent=2).encode('utf-8')))
+    first_page = page_range[0] if page_range else 1
+    for number, thumbnail in enumerate(artifacts.thumbnails, first_page):
+        outputs.append((f"{stem}-page{number}.png", thumbnail))
+
+    # Replace rather than rewrite, as the PDF may be hardlinked to a render cache entry
+    sink = DirectorySink(os.path.dirname(os.path.abspath(output_pdf_path)))
+    return [sink.add(os.path.basename(path), data) for path, data in outputs]
+
+
+def write_resource_report(report: ResourceReport, path: str):
+    """Write ``report`` as JSON to ``path`` and print its summary"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report.to_dict(), f, indent=2)
+    print(report.format_table())
+    print(f"   Full report: {path}")
+
+
+def _run_cli(args: argparse.Namespace, pdf_stream: Optional[BinaryIO] = None) -> Optional[int]:
+    """
+    Carry out the action selected on the command line
+
+    Returns:
+        Exit status: None on success, 1 if any conversion failed, 2 on usage errors
+    """
+    if args.archive and not (args.batch or args.manifest or args.template):
+        print("❌ --archive applies to --batch, --manifest and --template conversions")
+        return 2
+    if args.archive == '-' and not args.archive_format:
+        print("❌ --archive - requires --archive-format")
+        return 2
+    pool_options = dict(jobs=args.jobs, warm_up=not args.no_warm_up,
+                        job_timeout=args.job_timeout,
+                        max_jobs_per_worker=args.max_jobs_per_worker,
+                        max_worker_rss_mb=args.max_worker_rss_mb,
+                        worker_memory_limit_mb=args.worker_memory_limit_mb)
+    # Worker guards need worker processes even for a single job slot
+    use_pool = args.jobs != 1 or any(pool_options[key] is not None for key in (
+        'job_timeout', 'max_jobs_per_worker', 'max_worker_rss_mb', 'worker_memory_limit_mb'))
 
     # Initialize converter
-    converter = HTMLToPDFConverter(output_directory=args.output_dir)
+    render_cache = None
+    if args.cache_dir:
+        render_cache = RenderCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024,
+                                   link=args.cache_hardlink)
+    url_fetcher = None
+    inline_images = None
+    block_remote = args.block_remote or args.allow_host or args.map_url
+    dedupe_inline_images = args.dedupe_inline_images or args.inline_image_dir
+    if args.offline and not args.url_cache_dir:
+        print("❌ --offline requires --url-cache-dir")
+        return 2
+    if URLFetcher is None and (args.url_cache_dir or block_remote or args.font_mirror
+                               or args.prefetch or dedupe_inline_images or args.resource_report):
+        print("❌ --url-cache-dir, --block-remote, --font-mirror, --prefetch, "
+              "--dedupe-inline-images and --resource-report require a WeasyPrint "
+              "version with URLFetcher support")
+        return 2
+    if args.url_cache_dir:
+        url_fetcher = CachingURLFetcher(args.url_cache_dir, offline=args.offline,
+                                        max_age=args.url_cache_max_age)
+    if block_remote:
+        url_map = {}
+        for mapping in args.map_url or []:
+            prefix, sep, local_path = mapping.partition('=')
+            if not sep:
+                print(f"❌ --map-url expects PREFIX=PATH, got {mapping}")
+                return 2
+            url_map[prefix] = local_path
+        url_fetcher = RestrictedURLFetcher(args.allow_host, url_map, fallback=url_fetcher)
+    if args.font_mirror:
+        url_fetcher = LocalFontMirror(args.font_mirror, fallback=url_fetcher)
+    if args.prefetch:
+        url_fetcher = PrefetchingURLFetcher(url_fetcher, max_workers=args.prefetch_workers)
+    if dedupe_inline_images:
+        inline_images = InlineImageCache(args.inline_image_dir)
+    if bool(args.template) != bool(args.data):
+        print("❌ --template and --data must be used together")
+        return 2
+    # Opt-in even for templates: hoisting changes the cascade origin
+    stylesheet_cache = StylesheetCache() if args.cache_stylesheets else None
+    try:
+        converter = HTMLToPDFConverter(output_directory=args.output_dir,
+                                       stylesheets=args.stylesheet,
+                                       render_cache=render_cache,
+                                       url_fetcher=url_fetcher,
+                                       inline_images=inline_images,
+                                       max_dpi=args.max_dpi,
+                                       jpeg_quality=args.jpeg_quality,
+                                       stylesheet_cache=stylesheet_cache,
+                                       record_resources=bool(args.resource_report),
+                                       profile=args.profile)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
 
-    if args.create_sample:
+    if args.compare_profiles:
+        if args.html:
+            html_paths = args.html
+        elif args.batch:
+            html_paths = discover_html_files(args.batch, args.include, args.exclude,
+                                             not args.no_recursive)
+        else:
+            print("❌ --compare-profiles needs --html files or a --batch directory")
+            return 2
+        rows = compare_profiles(converter, html_paths)
+        print(f"📊 Optimization profiles ({PDF_METHOD}):")
+        print(format_profile_comparison(rows))
+
+    elif args.create_sample:
         # Create sample HTML file
         sample_file = create_sample_html_file("sample_report.html")
         print(f"📄 Sample HTML file created: {sample_file}")
@@ -443,38 +4539,119 @@ def main():
             print(f"🎉 Sample PDF generated: {pdf_path}")
         except Exception as e:
             print(f"❌ Failed to generate sample PDF: {e}")
+            return 1
 
-    elif args.html:
+    elif args.html and len(args.html) == 1:
         # Convert single HTML file
+        html_path = args.html[0]
+        if html_path == '-' and not args.output:
+            print("❌ --html - requires --output (use --output - to write to stdout)")
+            return 2
+        emit_artifacts = args.preview_pages or args.page_metadata or args.thumbnail_width
+        if emit_artifacts and pdf_stream is not None:
+            print("❌ --preview-pages, --page-metadata and --thumbnail-width need a PDF file output")
+            return 2
         try:
-            pdf_path = converter.convert_html_file_to_pdf(
-                args.html, args.output)
-            print(f"🎉 PDF generated successfully: {pdf_path}")
+            if emit_artifacts:
+                # One layout feeds the PDF and every sidecar file
+                page_range = parse_page_range(args.preview_pages) if args.preview_pages else None
+                paths = write_artifacts(
+                    converter, html_path,
+                    args.output or os.path.join(args.output_dir, pdf_filename_for(html_path)),
+                    args.base_url, page_range, args.page_metadata, args.thumbnail_width)
+                for path in paths:
+                    print(f"🎉 Generated: {path}")
+            elif pdf_stream is not None:
+                html_content, base_url = read_html_input(html_path, args.base_url)
+                converter.convert_html_to_stream(html_content, pdf_stream, base_url)
+                pdf_stream.flush()
+                print("🎉 PDF written to stdout")
+            elif html_path == '-':
+                html_content, base_url = read_html_input(html_path, args.base_url)
+                pdf_path = converter.convert_html_string_to_pdf(
+                    html_content, args.output, base_url)
+                print(f"🎉 PDF generated successfully: {pdf_path}")
+            else:
+                pdf_path = converter.convert_html_file_to_pdf(
+                    html_path, args.output)
+                print(f"🎉 PDF generated successfully: {pdf_path}")
         except Exception as e:
             print(f"❌ Conversion failed: {e}")
+            return 1
+        if args.resource_report:
+            resource_report = ResourceReport()
+            resource_report.add_records(html_path, converter.last_resources())
+            write_resource_report(resource_report, args.resource_report)
+
+    elif args.html:
+        # Convert several HTML files through a warm worker pool
+        if args.output:
+            print("❌ --output only applies to a single --html file")
+            return 2
+        if '-' in args.html:
+            print("❌ --html - reads a single document and cannot be combined with other files")
+            return 2
+        if args.resource_report:
+            print("❌ --resource-report applies to a single --html file and to --batch, "
+                  "--manifest and --template conversions")
+            return 2
+        with ConverterWorkerPool(converter, **pool_options) as pool:
+            futures = [(html_path, pool.submit_html_file(html_path))
+                       for html_path in args.html]
+            failed = 0
+            for html_path, future in futures:
+                try:
+                    print(f"🎉 PDF generated successfully: {future.result()}")
+                except Exception as e:
+                    print(f"❌ Conversion of {html_path} failed: {e}")
+                    failed += 1
+        if failed:
+            return 1
 
-    elif args.batch:
+    elif args.batch or args.manifest or args.template:
         # Batch convert HTML files
         try:
-            results = converter.batch_convert_html_files(
-                args.batch, args.output_dir)
-
-            success_count = sum(1 for v in results.values()
-                                if not v.startswith("Error:"))
-            total_count = len(results)
-
-            print(
-                f"🎉 Batch conversion completed: {success_count}/{total_count} files converted successfully")
-
-            for html_path, pdf_path in results.items():
-                if pdf_path.startswith("Error:"):
-                    print(f"❌ {os.path.basename(html_path)}: {pdf_path}")
+            batch_options = dict(largest_first=not args.no_cost_order,
+                                 cost_window=args.cost_window,
+                                 include=args.include, exclude=args.exclude,
+                                 recursive=not args.no_recursive,
+                                 incremental=args.incremental)
+            with contextlib.ExitStack() as stack:
+                pool = None
+                if use_pool:
+                    pool = stack.enter_context(ConverterWorkerPool(converter, **pool_options))
+                sink = None
+                if args.archive:
+                    sink = stack.enter_context(open_archive_sink(
+                        pdf_stream if args.archive == '-' else args.archive,
+                        args.archive_format))
+                if args.template:
+                    results = converter.iter_template_convert(
+                        args.template, args.data, args.output_dir, jobs=1, pool=pool, sink=sink)
+                elif args.manifest:
+                    results = converter.iter_manifest_convert(
+                        args.manifest, args.output_dir, jobs=1, pool=pool,
+                        largest_first=batch_options['largest_first'], sink=sink,
+                        cost_window=args.cost_window)
                 else:
-                    print(
-                        f"✅ {os.path.basename(html_path)} -> {os.path.basename(pdf_path)}")
+                    results = converter.iter_batch_convert(
+                        args.batch, args.output_dir, jobs=1, pool=pool, sink=sink,
+                        **batch_options)
+                if args.results:
+                    results_file = stack.enter_context(open(args.results, 'w', encoding='utf-8'))
+                    results = write_results_jsonl(results, results_file)
+                if args.resource_report:
+                    resource_report = ResourceReport()
+                    results = resource_report.track(results)
+                summary = print_batch_results(results)
+                if args.resource_report:
+                    write_resource_report(resource_report, args.resource_report)
+            if summary.status_counts['error']:
+                return 1
 
         except Exception as e:
             print(f"❌ Batch conversion failed: {e}")
+            return 1
     else:
         print("No action specified. Use --help for usage information.")
         print("\nQuick start:")
@@ -482,7 +4659,12 @@ def main():
         print("2. Convert HTML file: python html_to_pdf_converter.py --html sample_report.html")
         print(
             "3. Batch convert: python html_to_pdf_converter.py --batch /path/to/html/files")
+        print(
+            "4. Job manifest: python html_to_pdf_converter.py --manifest jobs.jsonl --results results.jsonl")
+        print(
+            "5. Template: python html_to_pdf_converter.py --template report.html.j2 --data rows.jsonl")
+        return 2
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
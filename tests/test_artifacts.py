@@ -0,0 +1,26 @@
+import pytest
+
+import html_to_pdf_converter
+from html_to_pdf_converter import HTMLToPDFConverter, parse_page_range
+
+
+@pytest.mark.parametrize("text, page_range", [
+    ("3", (3, 3)),
+    ("1-4", (1, 4)),
+    ("2-2", (2, 2)),
+])
+def test_parse_page_range(text, page_range):
+    assert parse_page_range(text) == page_range
+
+
+@pytest.mark.parametrize("text", ["", "0", "0-2", "4-2", "1-", "-3", "a-b", "1-2-3"])
+def test_invalid_page_ranges_are_rejected(text):
+    with pytest.raises(ValueError, match="Invalid page range"):
+        parse_page_range(text)
+
+
+@pytest.mark.skipif(html_to_pdf_converter.PDF_METHOD != 'weasyprint', reason="requires WeasyPrint")
+def test_render_artifacts_rejects_ranges_past_the_document(tmp_path):
+    converter = HTMLToPDFConverter(output_directory=str(tmp_path))
+    with pytest.raises(ValueError, match="after the last page"):
+        converter.render_artifacts("<p>One page</p>", page_range=(5, 6))
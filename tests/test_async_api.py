@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from html_to_pdf_converter import HTMLToPDFConverter
+
+
+class EchoConverter(HTMLToPDFConverter):
+    """Converter whose string conversions return their output path and base URL"""
+
+    def convert_html_string_to_pdf(self, html_content, output_pdf_path, base_url=None):
+        return f"{output_pdf_path}|{base_url}"
+
+
+@pytest.fixture
+def converter(tmp_path):
+    converter = EchoConverter(output_directory=str(tmp_path), max_concurrency=2)
+    yield converter
+    converter.close()
+
+
+def test_string_conversions_pass_the_base_url(converter):
+    async def convert():
+        return await asyncio.gather(
+            converter.aconvert_html_string_to_pdf('<p>A</p>', 'a.pdf', base_url='/srv/site/'),
+            converter.aconvert_html_string_to_pdf('<p>B</p>', 'b.pdf'))
+
+    assert asyncio.run(convert()) == ['a.pdf|/srv/site/', 'b.pdf|None']
+
+
+def test_cancelled_conversions_do_not_block_later_ones(converter):
+    async def convert():
+        task = asyncio.ensure_future(converter.aconvert_html_string_to_pdf('<p>A</p>', 'a.pdf'))
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await converter.aconvert_html_string_to_pdf('<p>B</p>', 'b.pdf')
+
+    assert asyncio.run(convert()) == 'b.pdf|None'
@@ -0,0 +1,72 @@
+import gzip
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import html_to_pdf_converter
+
+SCRIPT = os.path.abspath(html_to_pdf_converter.__file__)
+
+needs_backend = pytest.mark.skipif(not html_to_pdf_converter.PDF_GENERATION_AVAILABLE,
+                                   reason="requires a PDF backend")
+
+
+def run(tmp_path, *args, stdin=b""):
+    return subprocess.run([sys.executable, SCRIPT, *args], cwd=str(tmp_path), input=stdin,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=120)
+
+
+@pytest.mark.parametrize("args", [
+    (),
+    ("--html", "-"),
+    ("--html", "a.html", "--archive", "out.zip"),
+    ("--batch", ".", "--archive", "-"),
+    ("--template", "report.html"),
+    ("--jobs", "0", "--batch", "."),
+    ("--html", "a.html", "b.html", "--resource-report", "report.json"),
+])
+def test_usage_errors_exit_with_2(tmp_path, args):
+    assert run(tmp_path, *args).returncode == 2
+
+
+def test_missing_input_exits_with_1(tmp_path):
+    result = run(tmp_path, "--html", "missing.html")
+    assert result.returncode == 1
+    assert b"HTML file not found" in result.stdout
+
+
+@needs_backend
+def test_batch_with_a_failed_file_exits_with_1(tmp_path):
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "good.html").write_text("<p>Good</p>", encoding="utf-8")
+    (tmp_path / "in" / "bad.html.gz").write_bytes(b"not gzip")
+    result = run(tmp_path, "--batch", "in", "--jobs", "1")
+    assert result.returncode == 1
+    assert (tmp_path / "pdf_outputs" / "good.pdf").exists()
+
+    os.remove(tmp_path / "in" / "bad.html.gz")
+    (tmp_path / "in" / "fixed.html.gz").write_bytes(gzip.compress(b"<p>Fixed</p>"))
+    assert run(tmp_path, "--batch", "in", "--jobs", "1").returncode == 0
+
+
+@needs_backend
+def test_stdin_to_stdout(tmp_path):
+    result = run(tmp_path, "--html", "-", "--output", "-", stdin=b"<p>Piped</p>")
+    assert result.returncode == 0
+    assert result.stdout.startswith(b"%PDF")
+    # Status messages stay out of the PDF stream
+    assert b"PDF written to stdout" in result.stderr
+
+
+@pytest.mark.skipif(html_to_pdf_converter.PDF_METHOD != "weasyprint"
+                    or html_to_pdf_converter.URLFetcher is None,
+                    reason="requires WeasyPrint with URLFetcher support")
+def test_single_html_writes_the_resource_report(tmp_path):
+    (tmp_path / "a.html").write_text('<img src="data:image/png;base64,AAAA">', encoding="utf-8")
+    result = run(tmp_path, "--html", "a.html", "--resource-report", "report.json")
+    assert result.returncode == 0
+    report = json.loads((tmp_path / "report.json").read_text(encoding="utf-8"))
+    assert report["sources"] == {"inline": 1}
@@ -0,0 +1,53 @@
+import argparse
+
+import pytest
+
+from html_to_pdf_converter import cost_window, estimate_markup_cost, order_by_cost
+
+
+def by_weight(task):
+    return task[1]
+
+
+def names(tasks):
+    return [name for name, _ in tasks]
+
+
+TASKS = [('a', 1), ('b', 3), ('c', 2), ('d', 3), ('huge', 100)]
+
+
+def test_full_sort_puts_late_large_tasks_first():
+    # Ties keep their arrival order
+    assert names(order_by_cost(TASKS, cost=by_weight)) == ['huge', 'b', 'd', 'c', 'a']
+
+
+def test_window_releases_tasks_before_the_input_ends():
+    released = []
+    ordered = order_by_cost(iter(TASKS), window=2, cost=by_weight)
+    released.append(next(ordered))
+    assert names(released) == ['b']
+    # A large task arriving after the window has moved on starts late
+    assert names(ordered) == ['d', 'huge', 'c', 'a']
+
+
+def test_unreadable_files_run_last(tmp_path):
+    (tmp_path / "small.html").write_text("<p>Small</p>", encoding="utf-8")
+    tasks = [(str(tmp_path / "missing.html"), "missing.pdf"),
+             (str(tmp_path / "small.html"), "small.pdf")]
+    assert [pdf for _, pdf in order_by_cost(tasks)] == ["small.pdf", "missing.pdf"]
+
+
+def test_tables_and_external_resources_outweigh_plain_markup():
+    plain = b"<p>" + b"x" * 5000 + b"</p>"
+    assert estimate_markup_cost(b"<table><tr><td>1</td></tr></table>") > estimate_markup_cost(plain)
+    assert estimate_markup_cost(b'<img src="https://example.com/a.png">') > estimate_markup_cost(plain)
+    # Inline base64 weighs less than the same amount of markup
+    inline = b'<img src="data:image/png;base64,' + b"A" * 5000 + b'">'
+    assert estimate_markup_cost(inline) < estimate_markup_cost(b"<p>" + b"x" * 5040 + b"</p>")
+
+
+def test_cost_window_argument():
+    assert cost_window("all") is None
+    assert cost_window("4") == 4
+    with pytest.raises(argparse.ArgumentTypeError):
+        cost_window("0")
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from html_to_pdf_converter import HTMLToPDFConverter, discover_html_files, pdf_filename_for
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for path in ("a.html", "a.htm", "notes.txt", "page.XHTML", "old/2024.html.gz",
+                 "old/drafts/draft.html", "assets/logo.html"):
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("<p>Page</p>", encoding="utf-8")
+    return tmp_path
+
+
+def found(root, **options):
+    return sorted(os.path.relpath(path, root).replace(os.sep, "/")
+                  for path in discover_html_files(str(root), **options))
+
+
+def test_default_patterns_are_found_recursively(tree):
+    assert found(tree) == ["a.htm", "a.html", "assets/logo.html", "old/2024.html.gz",
+                           "old/drafts/draft.html", "page.XHTML"]
+    assert found(tree, recursive=False) == ["a.htm", "a.html", "page.XHTML"]
+
+
+def test_include_and_exclude_globs(tree):
+    assert found(tree, include=["*.htm"]) == ["a.htm"]
+    # Excluded directories are not descended into
+    assert found(tree, exclude=["assets", "old/drafts"]) == [
+        "a.htm", "a.html", "old/2024.html.gz", "page.XHTML"]
+    assert found(tree, exclude=["*.gz"]) == [
+        "a.htm", "a.html", "assets/logo.html", "old/drafts/draft.html", "page.XHTML"]
+
+
+@pytest.mark.parametrize("html_path, pdf_name", [
+    ("reports/a.html", "a.pdf"),
+    ("a.html.gz", "a.pdf"),
+    ("A.HTML.GZ", "A.pdf"),
+    ("v1.2.html", "v1.2.pdf"),
+])
+def test_pdf_filename_for(html_path, pdf_name):
+    assert pdf_filename_for(html_path) == pdf_name
+
+
+def test_colliding_names_keep_their_extension(tree, tmp_path):
+    converter = HTMLToPDFConverter(output_directory=str(tmp_path / "out"))
+    tasks = dict(converter._iter_batch_tasks(str(tree), "out"))
+    assert tasks[str(tree / "a.html")] == os.path.join("out", "a.html.pdf")
+    assert tasks[str(tree / "a.htm")] == os.path.join("out", "a.htm.pdf")
+    assert tasks[str(tree / "page.XHTML")] == os.path.join("out", "page.pdf")
+    assert tasks[str(tree / "old" / "2024.html.gz")] == os.path.join("out", "old", "2024.pdf")
@@ -0,0 +1,64 @@
+import pytest
+
+import html_to_pdf_converter
+from html_to_pdf_converter import RestrictedURLFetcher, SharedFontConfiguration
+
+if html_to_pdf_converter.URLFetcher is None:
+    pytest.skip("requires WeasyPrint with URLFetcher support", allow_module_level=True)
+
+RULE = {'font_family': 'Inter', 'src': [('external', 'https://fonts.example.com/inter.woff2')]}
+
+
+class FlakyFetcher(html_to_pdf_converter.URLFetcher):
+    """Fails the first ``failures`` fetches, then serves an empty font"""
+
+    def __init__(self, failures=0):
+        super().__init__()
+        self.failures = failures
+        self.calls = 0
+
+    def fetch(self, url, headers=None):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise OSError("Network is unreachable")
+        return html_to_pdf_converter.URLFetcherResponse(url, b'font', {}, 200)
+
+
+@pytest.fixture(autouse=True)
+def fetching_add_font_face(monkeypatch):
+    # Stands in for WeasyPrint's loader: try each source until one fetches
+    def add_font_face(self, rule_descriptors, url_fetcher):
+        for _, url in rule_descriptors['src']:
+            try:
+                url_fetcher(url)
+            except Exception:
+                continue
+            return 'face'
+        return None
+    monkeypatch.setattr(html_to_pdf_converter.FontConfiguration, 'add_font_face', add_font_face)
+
+
+def test_loaded_faces_are_reused():
+    config = SharedFontConfiguration()
+    fetcher = FlakyFetcher()
+    assert config.add_font_face(RULE, fetcher) == 'face'
+    assert config.add_font_face(RULE, fetcher) == 'face'
+    assert fetcher.calls == 1
+    assert config.stats() == {'faces': 1, 'hits': 1, 'misses': 1}
+
+
+def test_failed_faces_are_retried():
+    config = SharedFontConfiguration()
+    fetcher = FlakyFetcher(failures=1)
+    assert config.add_font_face(RULE, fetcher) is None
+    assert config.add_font_face(RULE, fetcher) == 'face'
+    assert config.failures == 1
+
+
+def test_faces_are_kept_per_url_policy():
+    config = SharedFontConfiguration()
+    config.add_font_face(RULE, FlakyFetcher())
+    # The face loaded without restrictions is not reused under an allowlist
+    restricted = RestrictedURLFetcher([], fallback=FlakyFetcher())
+    config.add_font_face(RULE, restricted)
+    assert config.stats() == {'faces': 2, 'hits': 0, 'misses': 2}
@@ -0,0 +1,67 @@
+import pytest
+
+import html_to_pdf_converter
+from html_to_pdf_converter import LocalFontMirror
+
+if html_to_pdf_converter.URLFetcher is None:
+    pytest.skip("requires WeasyPrint with URLFetcher support", allow_module_level=True)
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    for path in ("Inter/Inter-Regular.ttf", "Inter/Inter-Bold.woff2", "Inter/Inter-Bold.ttf",
+                 "Inter/700italic.otf", "Open_Sans/OpenSans-SemiBoldItalic.woff2",
+                 "Open_Sans/OpenSans-Condensed.ttf", "Open_Sans/LICENSE.txt"):
+        (tmp_path / path).parent.mkdir(exist_ok=True)
+        (tmp_path / path).write_bytes(b"font")
+    return LocalFontMirror(str(tmp_path))
+
+
+@pytest.mark.parametrize("token, face", [
+    ("Regular", (400, "normal")),
+    ("SemiBoldItalic", (600, "italic")),
+    ("Italic", (400, "italic")),
+    ("700italic", (700, "italic")),
+    ("300", (300, "normal")),
+    ("Condensed", None),
+])
+def test_style_names(token, face):
+    assert LocalFontMirror._parse_style(token) == face
+
+
+def test_scan_groups_files_by_family_and_face(mirror, tmp_path):
+    inter = mirror.families["inter"][1]
+    assert sorted(inter) == [(400, "normal"), (700, "italic"), (700, "normal")]
+    assert len(inter[(700, "normal")]) == 2
+    # Unrecognised styles and non-font files are skipped
+    assert mirror.families["open sans"] == (
+        "Open Sans", {(600, "italic"): [str(tmp_path / "Open_Sans" / "OpenSans-SemiBoldItalic.woff2")]})
+
+
+@pytest.mark.parametrize("url, families", [
+    ("https://fonts.googleapis.com/css2?family=Inter:wght@400;700&family=Open+Sans&display=swap",
+     ["Inter", "Open Sans"]),
+    ("https://fonts.googleapis.com/css?family=Inter:400,700|Open+Sans", ["Inter", "Open Sans"]),
+    ("https://fonts.googleapis.com/icon?family=Material+Icons", None),
+    ("https://example.com/css2?family=Inter", None),
+])
+def test_requested_families(mirror, url, families):
+    assert mirror.requested_families(url) == families
+
+
+def test_font_face_css_prefers_truetype(mirror, tmp_path):
+    css = mirror.font_face_css(["Inter"])
+    bold = next(line for line in css.splitlines() if "font-weight: 700" in line and "normal" in line)
+    assert bold.index("Inter-Bold.ttf") < bold.index("Inter-Bold.woff2")
+    assert "format('truetype')" in bold and "format('woff2')" in bold
+    assert css.count("@font-face") == 3
+
+
+def test_mirrored_stylesheets_are_served_locally(mirror):
+    response = mirror.fetch("https://fonts.googleapis.com/css2?family=Open+Sans:ital@1")
+    try:
+        css = response.read().decode("utf-8")
+    finally:
+        response.close()
+    assert "font-family: 'Open Sans'" in css
+    assert mirror.served == 1
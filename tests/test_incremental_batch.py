@@ -0,0 +1,95 @@
+import collections
+import os
+
+import pytest
+
+from html_to_pdf_converter import BatchManifest
+
+
+@pytest.fixture
+def document(tmp_path):
+    html_path = tmp_path / "report.html"
+    html_path.write_text("<p>Report</p>", encoding="utf-8")
+    pdf_path = tmp_path / "out" / "report.pdf"
+    pdf_path.parent.mkdir()
+    pdf_path.write_bytes(b"%PDF-1.4")
+    return str(html_path), str(pdf_path)
+
+
+def test_unknown_input_needs_converting(tmp_path, document):
+    manifest = BatchManifest(str(tmp_path / BatchManifest.FILENAME))
+    assert manifest.check(*document, "options") is not None
+
+
+def test_recorded_input_is_skipped(tmp_path, document):
+    manifest = BatchManifest(str(tmp_path / BatchManifest.FILENAME))
+    manifest.record(document[0], manifest.check(*document, "options"))
+    assert manifest.check(*document, "options") is None
+
+
+def test_changed_options_output_or_content_need_converting(tmp_path, document):
+    html_path, pdf_path = document
+    manifest = BatchManifest(str(tmp_path / BatchManifest.FILENAME))
+    manifest.record(html_path, manifest.check(html_path, pdf_path, "options"))
+
+    assert manifest.check(html_path, pdf_path, "other options") is not None
+    assert manifest.check(html_path, str(tmp_path / "elsewhere.pdf"), "options") is not None
+
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write("<p>Revised report</p>")
+    assert manifest.check(html_path, pdf_path, "options") is not None
+
+
+def test_missing_pdf_needs_converting(tmp_path, document):
+    html_path, pdf_path = document
+    manifest = BatchManifest(str(tmp_path / BatchManifest.FILENAME))
+    manifest.record(html_path, manifest.check(html_path, pdf_path, "options"))
+    os.remove(pdf_path)
+    assert manifest.check(html_path, pdf_path, "options") is not None
+
+
+def test_touched_identical_input_is_skipped_by_hash(tmp_path, document):
+    html_path, pdf_path = document
+    manifest = BatchManifest(str(tmp_path / BatchManifest.FILENAME))
+    manifest.record(html_path, manifest.check(html_path, pdf_path, "options"))
+    stat = os.stat(html_path)
+    os.utime(html_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert manifest.check(html_path, pdf_path, "options") is None
+    # The refreshed metadata lets the next check skip hashing
+    entry = manifest.entries[os.path.abspath(html_path)]
+    assert entry["mtime_ns"] == stat.st_mtime_ns + 10 ** 9
+
+
+def test_saved_manifest_is_reloaded(tmp_path, document):
+    path = str(tmp_path / BatchManifest.FILENAME)
+    manifest = BatchManifest(path)
+    manifest.record(document[0], manifest.check(*document, "options"))
+    manifest.save()
+    assert BatchManifest(path).check(*document, "options") is None
+
+
+def test_unreadable_manifest_is_ignored(tmp_path, document):
+    path = tmp_path / BatchManifest.FILENAME
+    path.write_text("{not json", encoding="utf-8")
+    assert BatchManifest(str(path)).check(*document, "options") is not None
+
+
+def test_filter_stale_skips_up_to_date_tasks(tmp_path, document):
+    html_path, pdf_path = document
+    stale_html = tmp_path / "new.html"
+    stale_html.write_text("<p>New</p>", encoding="utf-8")
+    stale_task = (str(stale_html), str(tmp_path / "out" / "new.pdf"))
+    manifest = BatchManifest(str(tmp_path / BatchManifest.FILENAME))
+    manifest.record(html_path, manifest.check(html_path, pdf_path, "options"))
+
+    skipped = collections.deque()
+    remaining = list(manifest.filter_stale([document, stale_task], "options", skipped))
+
+    assert remaining == [stale_task]
+    assert [(result.input, result.status) for result in skipped] == [(html_path, "skipped")]
+
+    # Only conversions marked as done are recorded
+    assert manifest.check(*stale_task, "options") is not None
+    manifest.mark_converted(stale_task[0])
+    assert os.path.abspath(stale_task[0]) in manifest.entries
@@ -0,0 +1,83 @@
+import base64
+import hashlib
+
+import pytest
+
+import html_to_pdf_converter
+from html_to_pdf_converter import InlineImageCache
+
+if html_to_pdf_converter.URLFetcher is None:
+    pytest.skip("requires WeasyPrint with URLFetcher support", allow_module_level=True)
+
+
+def image_keys(url):
+    # WeasyPrint's keys of an image and of its (downsampled) data
+    image_id = hashlib.md5(url.encode()).hexdigest()
+    return {url, f"{image_id}-source-150"}
+
+
+def test_local_images_are_kept_until_they_change(tmp_path):
+    logo = tmp_path / "logo.png"
+    logo.write_bytes(b"v1")
+    images = InlineImageCache()
+    cache = images.image_cache("options")
+    for url in (logo.as_uri(), "https://example.com/photo.png", "inline-image:" + "ab" * 32):
+        cache.update(dict.fromkeys(image_keys(url), b"image"))
+    cache.release()
+    assert set(cache) == image_keys(logo.as_uri()) | image_keys("inline-image:" + "ab" * 32)
+
+    assert images.image_cache("options") is cache
+    assert image_keys(logo.as_uri()) <= set(cache)
+    logo.write_bytes(b"v2, edited")
+    images.image_cache("options")
+    assert set(cache) == image_keys("inline-image:" + "ab" * 32)
+
+
+PAYLOAD = bytes(range(256)) * 8
+ENCODED = base64.b64encode(PAYLOAD).decode('ascii')
+
+
+def html_with(data, mime_type='image/png'):
+    return f'<img src="data:{mime_type};base64,{data}"><p>Report</p>'
+
+
+def inline_url(html):
+    return html.split('"')[1]
+
+
+def test_repeated_images_are_decoded_once():
+    images = InlineImageCache()
+    first = images.rewrite(html_with(ENCODED))
+    second = images.rewrite(html_with(ENCODED))
+    assert first == second
+    assert inline_url(first).startswith(InlineImageCache.SCHEME)
+    assert images.payload(inline_url(first)) == ('image/png', PAYLOAD)
+    assert images.stats() == {'hits': 1, 'misses': 1}
+
+
+@pytest.mark.parametrize('data', [
+    ENCODED.rstrip('='),
+    '\n'.join(ENCODED[i:i + 76] for i in range(0, len(ENCODED), 76)),
+    ' ' + ENCODED + '\n ',
+])
+def test_unpadded_and_wrapped_base64_is_decoded(data):
+    images = InlineImageCache()
+    html = images.rewrite(html_with(data))
+    assert images.payload(inline_url(html)) == ('image/png', PAYLOAD)
+
+
+@pytest.mark.parametrize('html', [
+    html_with('iVBORw0KGgo='),
+    html_with('A' * 2045),
+    f'<p>data:image/png;base64,{ENCODED} is not an attribute value</p>',
+])
+def test_small_invalid_and_unterminated_uris_are_left_alone(html):
+    assert InlineImageCache().rewrite(html) == html
+
+
+def test_decoded_images_are_shared_through_the_directory(tmp_path):
+    InlineImageCache(str(tmp_path)).rewrite(html_with(ENCODED))
+    images = InlineImageCache(str(tmp_path))
+    html = images.rewrite(html_with(ENCODED))
+    assert images.stats() == {'hits': 1, 'misses': 0}
+    assert images.payload(inline_url(html)) == ('image/png', PAYLOAD)
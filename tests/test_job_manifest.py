@@ -0,0 +1,75 @@
+import collections
+import json
+import os
+
+import pytest
+
+from html_to_pdf_converter import HTMLToPDFConverter
+
+
+@pytest.fixture
+def converter(tmp_path):
+    return HTMLToPDFConverter(output_directory=str(tmp_path / "out"))
+
+
+def parse(converter, manifest, jobs, output_directory="out"):
+    manifest.parent.mkdir(parents=True, exist_ok=True)
+    manifest.write_text("".join(line if isinstance(line, str) else json.dumps(line) + "\n"
+                                for line in jobs), encoding="utf-8")
+    invalid = collections.deque()
+    tasks = list(converter._iter_manifest_tasks(str(manifest), output_directory, invalid))
+    return tasks, list(invalid)
+
+
+def test_relative_paths_resolve_against_the_manifest(converter, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manifest = tmp_path / "jobs" / "jobs.jsonl"
+    tasks, _ = parse(converter, manifest, [
+        {"html": "a/report.html"},
+        {"html_string": "<p>Inline</p>", "base_url": "assets/", "id": "inline"},
+        {"html_string": "<p>Remote</p>", "base_url": "https://example.com/", "id": "remote"},
+    ])
+    assert tasks[0][0] == "a/report.html"
+    assert tasks[0][2]["html"] == str(tmp_path / "jobs" / "a" / "report.html")
+    assert tasks[1][2]["base_url"] == str(tmp_path / "jobs" / "assets") + os.sep
+    assert tasks[2][2]["base_url"] == "https://example.com/"
+
+
+def test_derived_names_do_not_collide(converter, tmp_path):
+    tasks, _ = parse(converter, tmp_path / "jobs.jsonl", [
+        {"html": "a/report.html"},
+        {"html": "b/report.html"},
+        {"html": "a/report.htm"},
+        {"html": "../elsewhere/report.html"},
+        {"html_string": "<p>1</p>", "id": "summary"},
+        {"html_string": "<p>2</p>", "id": "summary"},
+        {"html_string": "<p>3</p>", "output": "invoice.pdf"},
+        {"html": "invoice.html"},
+    ])
+    assert [pdf_path for _, pdf_path, _ in tasks] == [
+        os.path.join("out", "a", "report.pdf"),
+        os.path.join("out", "b", "report.pdf"),
+        os.path.join("out", "a", "report.htm.pdf"),
+        os.path.join("out", "report.pdf"),
+        os.path.join("out", "summary.pdf"),
+        os.path.join("out", "summary-2.pdf"),
+        os.path.join("out", "invoice.pdf"),
+        os.path.join("out", "invoice.html.pdf"),
+    ]
+
+
+def test_invalid_lines_become_error_records(converter, tmp_path):
+    tasks, invalid = parse(converter, tmp_path / "jobs.jsonl", [
+        "not json\n",
+        "\n",
+        {"html": "a.html", "html_string": "<p>Both</p>"},
+        {"html_string": "<p>Anonymous</p>"},
+        {"html": "a.html", "options": {"colour": "red"}},
+        {"html": "a.html", "options": {"max_dpi": 150}},
+    ])
+    assert [task[0] for task in tasks] == ["a.html"]
+    assert [record.input for record in invalid] == [
+        f"{tmp_path / 'jobs.jsonl'}:1", f"{tmp_path / 'jobs.jsonl'}:3",
+        f"{tmp_path / 'jobs.jsonl'}:4", "a.html"]
+    assert all(record.status == "error" for record in invalid)
+    assert "Unknown job option(s): colour" in invalid[-1].error
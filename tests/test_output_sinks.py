@@ -0,0 +1,86 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+import html_to_pdf_converter
+from html_to_pdf_converter import (DirectorySink, HTMLToPDFConverter, OutputSink, TarSink, ZipSink,
+                                   open_archive_sink)
+
+
+class UnseekableStream(io.RawIOBase):
+    """Write-only stream like a pipe to stdout"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+
+@pytest.mark.parametrize("name, member", [
+    ("a.pdf", "a.pdf"),
+    ("sub/./a.pdf", "sub/a.pdf"),
+    ("/abs/a.pdf", "abs/a.pdf"),
+])
+def test_member_names_are_relative(name, member):
+    assert OutputSink.member_name(name) == member
+
+
+@pytest.mark.parametrize("name", ["", "..", "../a.pdf", "sub/../../a.pdf"])
+def test_member_names_may_not_escape_the_archive(name):
+    with pytest.raises(ValueError):
+        OutputSink.member_name(name)
+
+
+def test_zip_sink_streams_to_an_unseekable_target():
+    stream = UnseekableStream()
+    with ZipSink(stream) as sink:
+        assert sink.add("reports/a.pdf", b"%PDF-a") == "reports/a.pdf"
+        sink.add("b.pdf", b"%PDF-b")
+    with zipfile.ZipFile(io.BytesIO(bytes(stream.data))) as archive:
+        assert archive.namelist() == ["reports/a.pdf", "b.pdf"]
+        assert archive.read("reports/a.pdf") == b"%PDF-a"
+        assert archive.getinfo("b.pdf").compress_type == zipfile.ZIP_STORED
+
+
+def test_tar_sink_compresses_members(tmp_path):
+    path = str(tmp_path / "out.tar.gz")
+    with open_archive_sink(path) as sink:
+        assert isinstance(sink, TarSink)
+        sink.add("a.pdf", b"%PDF-a")
+    with tarfile.open(path, "r:gz") as archive:
+        assert archive.getnames() == ["a.pdf"]
+        assert archive.extractfile("a.pdf").read() == b"%PDF-a"
+
+
+def test_directory_sink_writes_files(tmp_path):
+    path = DirectorySink(str(tmp_path)).add("sub/a.pdf", b"%PDF-a")
+    assert open(path, "rb").read() == b"%PDF-a"
+    assert [p.name for p in (tmp_path / "sub").iterdir()] == ["a.pdf"]
+
+
+def test_unknown_archive_formats_are_rejected(tmp_path):
+    assert isinstance(open_archive_sink(io.BytesIO(), "zip"), ZipSink)
+    with pytest.raises(ValueError, match="Unknown archive format"):
+        open_archive_sink(str(tmp_path / "out.rar"))
+
+
+@pytest.mark.skipif(not html_to_pdf_converter.PDF_GENERATION_AVAILABLE,
+                    reason="requires a PDF backend")
+def test_batch_writes_into_an_archive(tmp_path):
+    (tmp_path / "in" / "sub").mkdir(parents=True)
+    (tmp_path / "in" / "a.html").write_text("<p>A</p>", encoding="utf-8")
+    (tmp_path / "in" / "sub" / "b.html").write_text("<p>B</p>", encoding="utf-8")
+    buffer = io.BytesIO()
+    converter = HTMLToPDFConverter(output_directory=str(tmp_path / "out"))
+    with ZipSink(buffer) as sink:
+        results = list(converter.iter_batch_convert(str(tmp_path / "in"), jobs=1, sink=sink))
+    assert sorted(result.output for result in results) == ["a.pdf", "sub/b.pdf"]
+    with zipfile.ZipFile(io.BytesIO(buffer.getvalue())) as archive:
+        assert all(archive.read(name).startswith(b"%PDF") for name in archive.namelist())
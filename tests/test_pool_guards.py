@@ -0,0 +1,68 @@
+import os
+import time
+
+import pytest
+
+from html_to_pdf_converter import ConverterWorkerPool, HTMLToPDFConverter
+
+
+class ScriptedConverter(HTMLToPDFConverter):
+    """Converter whose string conversions sleep, crash or echo on request"""
+
+    def convert_html_string_to_pdf(self, html_content, output_pdf_path, base_url=None):
+        if html_content == 'crash':
+            os._exit(7)
+        if html_content.startswith('sleep '):
+            time.sleep(float(html_content.split()[1]))
+        return f"{output_pdf_path}@{os.getpid()}"
+
+
+class BrokenConverter(HTMLToPDFConverter):
+    """Converter that kills every worker process unpickling it"""
+
+    def __setstate__(self, state):
+        os._exit(3)
+
+
+@pytest.fixture
+def converter(tmp_path):
+    return ScriptedConverter(output_directory=str(tmp_path))
+
+
+def test_job_past_timeout_fails_and_pool_recovers(converter):
+    with ConverterWorkerPool(converter, jobs=1, warm_up=False, job_timeout=0.5) as pool:
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            pool.convert_html_string_to_pdf('sleep 30', 'slow.pdf')
+        assert time.monotonic() - started < 10
+        # A replacement worker serves the next job
+        assert pool.convert_html_string_to_pdf('ok', 'b.pdf').startswith('b.pdf@')
+
+
+def test_crashed_worker_fails_its_job_only(converter):
+    with ConverterWorkerPool(converter, jobs=1, warm_up=False) as pool:
+        crashed = pool.submit_html_string('crash', 'crash.pdf')
+        following = pool.submit_html_string('ok', 'c.pdf')
+        with pytest.raises(RuntimeError, match='exit code 7'):
+            crashed.result(timeout=30)
+        assert following.result(timeout=30).startswith('c.pdf@')
+
+
+def test_workers_are_recycled_after_max_jobs(converter):
+    with ConverterWorkerPool(converter, jobs=1, warm_up=False, max_jobs_per_worker=1) as pool:
+        first = pool.convert_html_string_to_pdf('ok', 'a.pdf').split('@')[1]
+        second = pool.convert_html_string_to_pdf('ok', 'b.pdf').split('@')[1]
+    assert first != second
+
+
+def test_workers_dying_during_start_up_fail_jobs(tmp_path):
+    pool = ConverterWorkerPool(BrokenConverter(output_directory=str(tmp_path)),
+                               jobs=2, warm_up=False)
+    try:
+        with pytest.raises(RuntimeError, match='exit code 3'):
+            pool.submit_html_string('ok', 'a.pdf').result(timeout=60)
+        # Once broken, later jobs fail straight away
+        with pytest.raises(RuntimeError, match='giving up'):
+            pool.submit_html_string('ok', 'b.pdf').result(timeout=10)
+    finally:
+        pool.close()
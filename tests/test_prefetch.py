@@ -0,0 +1,111 @@
+import http.server
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import html_to_pdf_converter
+from html_to_pdf_converter import CachingURLFetcher, PrefetchingURLFetcher
+
+if html_to_pdf_converter.URLFetcher is None:
+    pytest.skip("requires WeasyPrint with URLFetcher support", allow_module_level=True)
+
+
+class RedirectingHandler(http.server.BaseHTTPRequestHandler):
+    """Redirects /go/<name> to /to/<name>, which answers with <name>"""
+
+    def do_GET(self):
+        if self.path.startswith('/go/'):
+            self.send_response(302)
+            self.send_header('Location', '/to/' + self.path[len('/go/'):])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = self.path[len('/to/'):].encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def base_url():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RedirectingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def read(response):
+    try:
+        return response.read()
+    finally:
+        response.close()
+
+
+def test_redirect_state_is_kept_per_thread(tmp_path):
+    fetcher = CachingURLFetcher(str(tmp_path))
+    fetcher._request = 'main thread request'
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(fetcher._request))
+    thread.start()
+    thread.join()
+    assert seen == [None]
+    assert fetcher._request == 'main thread request'
+
+
+def test_concurrent_redirects_through_one_fetcher(tmp_path, base_url):
+    fetcher = CachingURLFetcher(str(tmp_path))
+    names = [f"resource-{index}" for index in range(40)]
+    with ThreadPoolExecutor(8) as executor:
+        bodies = list(executor.map(lambda name: read(fetcher.fetch(f"{base_url}/go/{name}")),
+                                   names))
+    assert bodies == [name.encode('utf-8') for name in names]
+
+
+def test_prefetched_responses_are_served_once(base_url):
+    fetcher = PrefetchingURLFetcher()
+    try:
+        fetcher.prefetch(f'<img src="{base_url}/to/logo">')
+        assert read(fetcher.fetch(f"{base_url}/to/logo")) == b'logo'
+        assert fetcher.stats() == {'prefetched': 1, 'hits': 1}
+    finally:
+        fetcher.close()
+
+
+def test_next_documents_downloads_survive_discard(base_url):
+    fetcher = PrefetchingURLFetcher()
+    try:
+        fetcher.prefetch_ahead(f'<img src="{base_url}/to/logo"><img src="{base_url}/to/next">')
+        fetcher.prefetch(f'<img src="{base_url}/to/logo"><img src="{base_url}/to/unused">')
+        assert read(fetcher.fetch(f"{base_url}/to/logo")) == b'logo'
+        fetcher.discard()
+        assert sorted(fetcher._pending) == [f"{base_url}/to/logo", f"{base_url}/to/next"]
+
+        fetcher.prefetch(f'<img src="{base_url}/to/logo"><img src="{base_url}/to/next">')
+        assert read(fetcher.fetch(f"{base_url}/to/logo")) == b'logo'
+        assert read(fetcher.fetch(f"{base_url}/to/next")) == b'next'
+        assert fetcher.stats() == {'prefetched': 3, 'hits': 3}
+    finally:
+        fetcher.close()
+
+
+def test_serial_batch_prefetches_the_next_job(tmp_path, monkeypatch):
+    for name in ('a', 'b', 'c'):
+        (tmp_path / f"{name}.html").write_text(f"<p>{name}</p>", encoding="utf-8")
+    converter = html_to_pdf_converter.HTMLToPDFConverter(
+        output_directory=str(tmp_path / "out"), url_fetcher=PrefetchingURLFetcher())
+    upcoming = []
+    monkeypatch.setattr(converter, 'prefetch_job',
+                        lambda method, html_path, pdf_path: upcoming.append(html_path))
+    monkeypatch.setattr(converter, '_convert_batch_job', lambda html_path, pdf_path: html_path)
+
+    converted = list(converter.iter_batch_convert(str(tmp_path), jobs=1))
+    assert sorted(os.path.basename(path) for path in converted) == ['a.html', 'b.html', 'c.html']
+    assert upcoming == converted[1:]
@@ -0,0 +1,121 @@
+import os
+
+import pytest
+
+import html_to_pdf_converter
+from html_to_pdf_converter import HTMLToPDFConverter, RenderCache, find_local_resources
+
+
+@pytest.fixture
+def site(tmp_path):
+    (tmp_path / "css").mkdir()
+    (tmp_path / "report.html").write_text(
+        '<link rel="stylesheet" href="css/report.css"><img src="logo.png?v=2"><p>Report</p>',
+        encoding="utf-8")
+    (tmp_path / "css" / "report.css").write_text(
+        '@import "base.css"; body { background: url(../paper.png) }', encoding="utf-8")
+    (tmp_path / "css" / "base.css").write_text("p { color: black }", encoding="utf-8")
+    (tmp_path / "logo.png").write_bytes(b"logo")
+    return tmp_path
+
+
+@pytest.fixture
+def converter(tmp_path):
+    return HTMLToPDFConverter(output_directory=str(tmp_path / "out"),
+                              render_cache=RenderCache(str(tmp_path / "cache")))
+
+
+def cache_key(converter, site):
+    html_path = site / "report.html"
+    return converter._render_cache_key(html_path.read_bytes(), str(html_path))
+
+
+def test_key_for_separates_parts():
+    assert RenderCache.key_for(b"ab", "c", "options") != RenderCache.key_for(b"a", "bc", "options")
+    assert RenderCache.key_for(b"a", None, "options") == RenderCache.key_for(b"a", None, "options")
+    assert RenderCache.key_for(b"a", None, "options") != RenderCache.key_for(b"a", None, "other")
+
+
+def test_local_resources_are_found_relative_to_the_document(site):
+    html = (site / "report.html").read_text(encoding="utf-8")
+    assert find_local_resources(html, str(site / "report.html")) == [
+        str(site / "css" / "report.css"), str(site / "logo.png")]
+    assert find_local_resources(html, (site / "report.html").as_uri()) == [
+        str(site / "css" / "report.css"), str(site / "logo.png")]
+    assert find_local_resources('<img src="https://example.com/a.png">', str(site)) == []
+
+
+def test_key_changes_with_linked_stylesheets_and_assets(converter, site):
+    key = cache_key(converter, site)
+    assert cache_key(converter, site) == key
+
+    # Imported from the linked stylesheet
+    (site / "css" / "base.css").write_text("p { color: red }", encoding="utf-8")
+    edited = cache_key(converter, site)
+    assert edited != key
+
+    # Referenced by the stylesheet, missing until now
+    (site / "paper.png").write_bytes(b"paper")
+    assert cache_key(converter, site) != edited
+
+
+def test_documents_without_relative_links_share_entries(converter):
+    assert (converter._render_cache_key(b"<p>Same</p>", "/a/report.html")
+            == converter._render_cache_key(b"<p>Same</p>", "/b/report.html"))
+
+
+def test_fetch_misses_then_hits_after_store(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"))
+    output = tmp_path / "out.pdf"
+    assert not cache.fetch("ab" * 32, str(output))
+    cache.store("ab" * 32, b"%PDF-cached")
+    assert cache.fetch("ab" * 32, str(output))
+    assert output.read_bytes() == b"%PDF-cached"
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_eviction_removes_least_recently_used_entries(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), max_bytes=250)
+    for index, key in enumerate(("aa" * 32, "bb" * 32)):
+        cache.store(key, b"x" * 100)
+        os.utime(cache._entry_path(key), (1000 + index, 1000 + index))
+    cache.store("cc" * 32, b"x" * 100)
+
+    assert not os.path.exists(cache._entry_path("aa" * 32))
+    assert os.path.exists(cache._entry_path("bb" * 32))
+    assert os.path.exists(cache._entry_path("cc" * 32))
+    assert cache.evictions == 1
+
+
+def test_stores_of_other_processes_are_counted_after_rescan(tmp_path):
+    mine = RenderCache(str(tmp_path / "cache"), max_bytes=250)
+    other = RenderCache(str(tmp_path / "cache"), max_bytes=250)
+    mine.store("aa" * 32, b"x" * 100)
+    other.store("bb" * 32, b"x" * 100)
+    other.store("cc" * 32, b"x" * 100)
+    assert other.evictions == 1
+
+    other.store("dd" * 32, b"x" * 100)
+    mine._scanned_at -= RenderCache.RESCAN_SECONDS
+    mine.store("ee" * 32, b"x" * 100)
+    assert mine.evictions == 1
+    assert mine._scan_size() <= 250
+
+
+@pytest.mark.skipif(not html_to_pdf_converter.PDF_GENERATION_AVAILABLE,
+                    reason="requires a PDF backend")
+def test_replacing_a_linked_output_keeps_the_entry(tmp_path):
+    cache = RenderCache(str(tmp_path / "cache"), link=True)
+    converter = HTMLToPDFConverter(output_directory=str(tmp_path / "out"), render_cache=cache)
+    output = str(tmp_path / "out" / "report.pdf")
+    converter.convert_html_string_to_pdf("<p>Cached</p>", output)
+    converter.convert_html_string_to_pdf("<p>Cached</p>", output)
+    entry = next(str(path) for path in (tmp_path / "cache").rglob("*.pdf"))
+    assert os.path.samefile(entry, output)
+    cached_pdf = open(entry, "rb").read()
+
+    # A render without the cache replaces the linked output
+    plain = HTMLToPDFConverter(output_directory=str(tmp_path / "out"))
+    plain.convert_html_string_to_pdf("<p>Different</p>", output)
+    assert not os.path.samefile(entry, output)
+    assert open(entry, "rb").read() == cached_pdf
@@ -0,0 +1,124 @@
+import http.server
+import io
+import threading
+
+import pytest
+
+import html_to_pdf_converter
+from html_to_pdf_converter import (BatchResult, CachingURLFetcher, HTMLToPDFConverter,
+                                   PrefetchingURLFetcher, ResourceRecorder, ResourceReport,
+                                   RestrictedURLFetcher, pop_fetch_origin)
+
+if html_to_pdf_converter.URLFetcher is None:
+    pytest.skip("requires WeasyPrint with URLFetcher support", allow_module_level=True)
+
+
+class AssetHandler(http.server.BaseHTTPRequestHandler):
+    """Serves any path as a cacheable stylesheet naming the path"""
+
+    def do_GET(self):
+        body = f"/* {self.path} */".encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/css')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'max-age=3600')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def base_url():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), AssetHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(fetcher, url):
+    response = fetcher.fetch(url)
+    try:
+        return response.read()
+    finally:
+        response.close()
+
+
+def origins(recorder):
+    return [(record['source'], record['cache']) for record in recorder.records]
+
+
+def test_sources_and_cache_status_of_each_fetch(tmp_path, base_url):
+    recorder = ResourceRecorder(CachingURLFetcher(str(tmp_path / "cache")))
+    fetch(recorder, f"{base_url}/a.css")
+    fetch(recorder, f"{base_url}/a.css")
+    fetch(recorder, "data:text/css,p{}")
+    assert origins(recorder) == [("network", "miss"), ("cache", "hit"), ("inline", None)]
+    assert recorder.records[0]["bytes"] == len(b"/* /a.css */")
+
+
+def test_blocked_urls_are_recorded_as_blocked():
+    recorder = ResourceRecorder(RestrictedURLFetcher())
+    fetch(recorder, "https://tracker.example.com/pixel.gif")
+    assert origins(recorder) == [("blocked", None)]
+
+
+def test_prefetched_urls_keep_their_cache_status(tmp_path, base_url):
+    prefetcher = PrefetchingURLFetcher(CachingURLFetcher(str(tmp_path / "cache")))
+    recorder = ResourceRecorder(prefetcher)
+    html = f'<link rel="stylesheet" href="{base_url}/a.css">'
+    try:
+        for _ in range(2):
+            prefetcher.prefetch(html)
+            fetch(recorder, f"{base_url}/a.css")
+            prefetcher.discard()
+    finally:
+        prefetcher.close()
+    assert origins(recorder) == [("prefetch", "miss"), ("prefetch", "hit")]
+
+
+def test_origins_are_reported_per_thread(tmp_path, base_url):
+    # A download on another thread must not be attributed to this fetch
+    caching = CachingURLFetcher(str(tmp_path / "cache"))
+    thread = threading.Thread(target=fetch, args=(caching, f"{base_url}/b.css"))
+    thread.start()
+    thread.join()
+    assert pop_fetch_origin() == (None, None)
+    recorder = ResourceRecorder(caching)
+    fetch(recorder, f"{base_url}/b.css")
+    assert origins(recorder) == [("cache", "hit")]
+
+
+@pytest.mark.skipif(html_to_pdf_converter.PDF_METHOD != "weasyprint",
+                    reason="requires WeasyPrint")
+def test_extra_stylesheet_fetches_are_recorded(tmp_path, base_url):
+    stylesheet = tmp_path / "extra.css"
+    stylesheet.write_text(f'@import url("{base_url}/imported.css");', encoding="utf-8")
+    converter = HTMLToPDFConverter(output_directory=str(tmp_path), stylesheets=[str(stylesheet)],
+                                   record_resources=True)
+    converter.convert_html_to_stream("<p>Report</p>", io.BytesIO())
+    assert [record["url"] for record in converter.last_resources()] == [
+        f"{base_url}/imported.css"]
+
+
+def test_report_totals_and_rankings():
+    report = ResourceReport(top=1)
+    records = [
+        {"url": "https://cdn.example.com/a.css", "seconds": 0.5, "bytes": 100,
+         "source": "network", "cache": "miss", "error": None},
+        {"url": "https://cdn.example.com/b.woff2", "seconds": 0.1, "bytes": 900,
+         "source": "cache", "cache": "hit", "error": None},
+    ]
+    report.add(BatchResult("a.html", "a.pdf", "converted", 1.0, 10, 1, None,
+                           resources=records))
+    report.add_records("b.html", [dict(records[0], error="URLError: down", seconds=0.2,
+                                       bytes=0)])
+    data = report.to_dict()
+    assert (data["fetches"], data["failures"], data["bytes"]) == (3, 1, 1000)
+    assert data["sources"] == {"network": 2, "cache": 1}
+    assert data["cache"] == {"miss": 2, "hit": 1}
+    assert data["hosts"]["cdn.example.com"]["fetches"] == 3
+    assert [entry["document"] for entry in data["slowest"]] == ["a.html"]
+    assert [entry["url"] for entry in data["largest"]] == ["https://cdn.example.com/b.woff2"]
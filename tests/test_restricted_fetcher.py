@@ -0,0 +1,61 @@
+import pytest
+
+import html_to_pdf_converter
+from html_to_pdf_converter import RestrictedURLFetcher
+
+if html_to_pdf_converter.URLFetcher is None:
+    pytest.skip("requires WeasyPrint with URLFetcher support", allow_module_level=True)
+
+
+def read(response):
+    try:
+        return response.read()
+    finally:
+        response.close()
+
+
+@pytest.mark.parametrize("url, allowed", [
+    ("https://assets.example.com/logo.png", True),
+    ("HTTP://CDN.TEST/a.css", True),
+    ("https://example.com/logo.png", False),
+    ("https://cdn.test.evil.com/a.css", False),
+    ("ftp://files.example.org/a.png", False),
+    ("file:///tmp/a.png", True),
+    ("data:image/png;base64,AAAA", True),
+])
+def test_is_allowed_matches_host_globs(url, allowed):
+    fetcher = RestrictedURLFetcher(["*.example.com", "cdn.test"])
+    assert fetcher.is_allowed(url) is allowed
+
+
+def test_empty_allowlist_blocks_every_remote_url():
+    fetcher = RestrictedURLFetcher()
+    assert not fetcher.is_allowed("https://localhost/a.css")
+    assert fetcher.is_allowed("file:///tmp/a.css")
+
+
+def test_blocked_urls_get_a_placeholder():
+    fetcher = RestrictedURLFetcher()
+    response = fetcher.fetch("https://tracker.example.com/pixel.gif")
+    assert response.headers["Content-Type"] == "image/png"
+    assert read(response) == html_to_pdf_converter.TRANSPARENT_PNG
+    assert fetcher.stats() == {"blocked": 1, "mapped": 0}
+
+
+def test_blocked_urls_are_served_from_the_url_map(tmp_path):
+    (tmp_path / "fonts").mkdir()
+    (tmp_path / "fonts" / "inter.woff2").write_bytes(b"font")
+    (tmp_path / "logo.png").write_bytes(b"logo")
+    fetcher = RestrictedURLFetcher(url_map={
+        "https://cdn.example.com/": str(tmp_path),
+        "https://cdn.example.com/static/fonts/": str(tmp_path / "fonts"),
+        "https://www.example.com/logo.png": str(tmp_path / "logo.png"),
+    })
+    # The longest matching prefix wins
+    assert read(fetcher.fetch("https://cdn.example.com/static/fonts/inter.woff2?v=2")) == b"font"
+    assert read(fetcher.fetch("https://www.example.com/logo.png")) == b"logo"
+    assert read(fetcher.fetch("https://cdn.example.com/logo.png")) == b"logo"
+    # Unmapped files fall back to the placeholder
+    assert read(fetcher.fetch("https://cdn.example.com/missing.png")) == (
+        html_to_pdf_converter.TRANSPARENT_PNG)
+    assert fetcher.stats() == {"blocked": 4, "mapped": 3}
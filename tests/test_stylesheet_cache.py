@@ -0,0 +1,38 @@
+import pytest
+
+import html_to_pdf_converter
+from html_to_pdf_converter import StylesheetCache
+
+
+@pytest.mark.parametrize('html', [
+    '<link rel="stylesheet" href="a.css"><style>p { color: red }</style>',
+    '<style media="print">p { color: red }</style>',
+    '<style type="text/less">p { color: red }</style>',
+    '<svg><style>circle { fill: red }</style></svg><style>p { color: red }</style>',
+    '<!-- <style>p { color: red }</style> --><style>a { color: red }</style>',
+    '<noscript><style>p { color: red }</style></noscript>',
+    '<template><style>p { color: red }</style></template>',
+])
+def test_documents_that_cannot_be_hoisted_are_left_alone(html):
+    cache = StylesheetCache()
+    assert cache.hoist(html, None, font_config=object()) == (html, [])
+    assert cache.stats()['bypassed'] == 1
+
+
+def test_documents_without_style_blocks_are_not_counted():
+    cache = StylesheetCache()
+    assert cache.hoist('<p>Plain</p>', None, font_config=object()) == ('<p>Plain</p>', [])
+    assert cache.stats() == {'hits': 0, 'misses': 0, 'bypassed': 0, 'time_saved': 0.0}
+
+
+@pytest.mark.skipif(html_to_pdf_converter.PDF_METHOD != 'weasyprint',
+                    reason="requires WeasyPrint")
+def test_identical_blocks_are_parsed_once():
+    cache = StylesheetCache()
+    font_config = html_to_pdf_converter.shared_font_config()
+    html = '<style type="text/css"><!-- p { color: red } --></style><p>Report</p>'
+    first_markup, first = cache.hoist(html, None, font_config)
+    second_markup, second = cache.hoist(html, None, font_config)
+    assert first_markup == second_markup == '<p>Report</p>'
+    assert first == second and len(first) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,62 @@
+import collections
+import json
+import os
+
+import pytest
+
+from html_to_pdf_converter import HTMLToPDFConverter, jinja2, load_template
+
+
+@pytest.fixture
+def converter(tmp_path):
+    return HTMLToPDFConverter(output_directory=str(tmp_path / "out"))
+
+
+def parse(converter, tmp_path, rows):
+    data = tmp_path / "rows.jsonl"
+    data.write_text("".join(row if isinstance(row, str) else json.dumps(row) + "\n"
+                            for row in rows), encoding="utf-8")
+    invalid = collections.deque()
+    tasks = list(converter._iter_template_tasks("templates/report.html.j2", str(data), "out",
+                                                invalid))
+    return tasks, list(invalid)
+
+
+def test_rows_are_named_by_output_id_or_line(converter, tmp_path):
+    tasks, invalid = parse(converter, tmp_path, [
+        {"output": "custom/a.pdf", "id": "ignored"},
+        {"id": "INV-7"},
+        {"id": 0},
+        {"name": "no id"},
+    ])
+    assert invalid == []
+    assert [(label, pdf_path) for label, pdf_path, _, _ in tasks] == [
+        ("ignored", os.path.join("out", "custom", "a.pdf")),
+        ("INV-7", os.path.join("out", "INV-7.pdf")),
+        ("0", os.path.join("out", "0.pdf")),
+        (f"{tmp_path / 'rows.jsonl'}:4", os.path.join("out", "report-4.pdf")),
+    ]
+
+
+@pytest.mark.parametrize("row, error", [
+    ("[1, 2]\n", "row must be a JSON object"),
+    ('{"output": 5}\n', "'output' must be a string"),
+    ('{"id": null}\n', "'id' must be a string or number"),
+    ('{"id": ""}\n', "'id' must not be empty"),
+    ('{"output": ""}\n', "'output' must not be empty"),
+])
+def test_invalid_rows_become_error_records(converter, tmp_path, row, error):
+    tasks, invalid = parse(converter, tmp_path, [row])
+    assert tasks == []
+    assert [record.status for record in invalid] == ["error"]
+    assert error in invalid[0].error
+
+
+def test_templates_escape_values_and_are_compiled_once(tmp_path):
+    template_path = tmp_path / "report.html"
+    source = "<p>{{ name }}</p>" if jinja2 is not None else "<p>$name</p>"
+    template_path.write_text(source, encoding="utf-8")
+    template = load_template(str(template_path))
+    assert template.render({"name": "<b>Acme & Co</b>"}) == "<p>&lt;b&gt;Acme &amp; Co&lt;/b&gt;</p>"
+    assert load_template(str(template_path)) is template
+    assert template.base_url == str(template_path)
@@ -0,0 +1,134 @@
+import http.server
+import pickle
+import threading
+import urllib.error
+
+import pytest
+
+import html_to_pdf_converter
+from html_to_pdf_converter import CachingURLFetcher
+
+pytestmark = pytest.mark.skipif(html_to_pdf_converter.URLFetcher is None,
+                                reason="requires WeasyPrint with URLFetcher support")
+
+ETAG = '"v1"'
+
+
+class ResourceHandler(http.server.BaseHTTPRequestHandler):
+    """Serves /style.css with an ETag and records every request"""
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('If-None-Match')))
+        if self.server.failing:
+            self.send_error(503)
+            return
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.send_header('ETag', ETAG)
+            self.send_header('Cache-Control', self.server.cache_control)
+            self.end_headers()
+            return
+        body = b'body { color: red }'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/css')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', ETAG)
+        self.send_header('Cache-Control', self.server.cache_control)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ResourceHandler)
+    server.requests = []
+    server.cache_control = 'max-age=0'
+    server.failing = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url_of(server, path='/style.css'):
+    return f"http://127.0.0.1:{server.server_port}{path}"
+
+
+def fetch_body(fetcher, url):
+    response = fetcher.fetch(url)
+    try:
+        return response.read()
+    finally:
+        response.close()
+
+
+def test_fresh_entry_is_served_without_request(tmp_path, server):
+    server.cache_control = 'max-age=3600'
+    fetcher = CachingURLFetcher(str(tmp_path))
+    assert fetch_body(fetcher, url_of(server)) == b'body { color: red }'
+    assert fetch_body(fetcher, url_of(server)) == b'body { color: red }'
+    assert len(server.requests) == 1
+    assert fetcher.stats()['hits'] == 1
+
+
+def test_stale_entry_is_revalidated_with_etag(tmp_path, server):
+    fetcher = CachingURLFetcher(str(tmp_path))
+    fetch_body(fetcher, url_of(server))
+    assert fetch_body(fetcher, url_of(server)) == b'body { color: red }'
+    assert server.requests == [('/style.css', None), ('/style.css', ETAG)]
+    assert fetcher.stats()['revalidations'] == 1
+
+
+def test_no_store_response_is_not_cached(tmp_path, server):
+    server.cache_control = 'no-store'
+    fetcher = CachingURLFetcher(str(tmp_path))
+    fetch_body(fetcher, url_of(server))
+    fetch_body(fetcher, url_of(server))
+    assert server.requests == [('/style.css', None), ('/style.css', None)]
+
+
+def test_offline_replay_uses_only_the_cache(tmp_path, server):
+    fetch_body(CachingURLFetcher(str(tmp_path)), url_of(server))
+    server.shutdown()
+
+    # Even entries past their max-age are replayed offline
+    offline = CachingURLFetcher(str(tmp_path), offline=True)
+    assert fetch_body(offline, url_of(server)) == b'body { color: red }'
+    with pytest.raises(ValueError, match='offline replay'):
+        offline.fetch(url_of(server, '/missing.css'))
+    assert len(server.requests) == 1
+
+
+def test_unreachable_server_serves_stale_entry(tmp_path, server):
+    fetcher = CachingURLFetcher(str(tmp_path), timeout=2)
+    url = url_of(server)
+    fetch_body(fetcher, url)
+    server.shutdown()
+    server.server_close()
+
+    assert fetch_body(fetcher, url) == b'body { color: red }'
+    assert fetcher.stats()['stale'] == 1
+
+
+def test_server_error_serves_stale_entry(tmp_path, server):
+    fetcher = CachingURLFetcher(str(tmp_path))
+    fetch_body(fetcher, url_of(server))
+    server.failing = True
+
+    assert fetch_body(fetcher, url_of(server)) == b'body { color: red }'
+    assert fetcher.stats()['stale'] == 1
+    # Without a stored entry the error goes through
+    with pytest.raises(urllib.error.HTTPError):
+        fetcher.fetch(url_of(server, '/other.css'))
+
+
+def test_fetcher_survives_pickling(tmp_path, server):
+    server.cache_control = 'max-age=3600'
+    fetch_body(CachingURLFetcher(str(tmp_path)), url_of(server))
+    copy = pickle.loads(pickle.dumps(CachingURLFetcher(str(tmp_path))))
+    assert fetch_body(copy, url_of(server)) == b'body { color: red }'
+    assert len(server.requests) == 1
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from html_to_pdf_converter import ConverterWorkerPool, HTMLToPDFConverter
+
+
+class EchoConverter(HTMLToPDFConverter):
+    """Converter whose string conversions return the output path and worker pid"""
+
+    def convert_html_string_to_pdf(self, html_content, output_pdf_path, base_url=None):
+        return f"{output_pdf_path}@{os.getpid()}"
+
+
+@pytest.fixture
+def converter(tmp_path):
+    return EchoConverter(output_directory=str(tmp_path))
+
+
+def test_jobs_run_in_worker_processes(converter):
+    with ConverterWorkerPool(converter, jobs=2, warm_up=False) as pool:
+        result = pool.convert_html_string_to_pdf('ok', 'a.pdf')
+    path, pid = result.split('@')
+    assert path == 'a.pdf'
+    assert int(pid) != os.getpid()
+
+
+def test_workers_start_on_demand(converter):
+    with ConverterWorkerPool(converter, jobs=4, warm_up=False) as pool:
+        assert pool._workers == []
+        pool.convert_html_string_to_pdf('ok', 'a.pdf')
+        assert len(pool._workers) == 1
+
+
+@pytest.mark.parametrize('jobs', [0, -1])
+def test_non_positive_jobs_are_rejected(converter, jobs):
+    with pytest.raises(ValueError):
+        ConverterWorkerPool(converter, jobs=jobs)
+
+
+def test_closed_pool_rejects_jobs(converter):
+    pool = ConverterWorkerPool(converter, jobs=1, warm_up=False)
+    pool.close()
+    with pytest.raises(RuntimeError):
+        pool.submit_html_string('ok', 'a.pdf')